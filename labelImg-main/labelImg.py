@@ -6,7 +6,9 @@ import os.path
 import platform
 import shutil
 import sys
+import threading
 import webbrowser as wb
+from collections import OrderedDict
 from functools import partial
 
 try:
@@ -39,14 +41,25 @@ from libs.labelDialog import LabelDialog
 from libs.colorDialog import ColorDialog
 from libs.labelFile import LabelFile, LabelFileError, LabelFileFormat
 from libs.toolBar import ToolBar
-from libs.pascal_voc_io import PascalVocReader
+from libs.pascal_voc_io import PascalVocReader, PascalVocParseError
 from libs.pascal_voc_io import XML_EXT
 from libs.yolo_io import YoloReader
 from libs.yolo_io import TXT_EXT
-from libs.create_ml_io import CreateMLReader
+from libs.create_ml_io import CreateMLReader, CreateMLStore
 from libs.create_ml_io import JSON_EXT
+from libs.sqlite_io import AnnotationDatabase, AnnotationDatabaseError, SQLiteReader, DB_EXT, database_path
 from libs.ustr import ustr
 from libs.hashableQListWidgetItem import HashableQListWidgetItem
+from libs.save_queue import SaveQueue, write_atomically
+from libs.image_cache import ImageCache, PREFETCH_COUNT, file_signature, load_image, load_image_data
+from libs.tiled_image import TiledImage, use_tiles
+from libs.file_list_model import FileListModel
+from libs.dir_scanner import DirScanner, MANIFEST_DIR, image_extensions, image_sort_key
+from libs.dir_watcher import DirWatcher
+from libs.annotation_index import AnnotationIndex, AnnotationIndexer
+from libs.image_source import ImageSourceError
+from libs.archive_source import ArchiveSource, ARCHIVE_EXTENSIONS, is_archive
+from libs.remote_source import RemoteSource, is_remote
 
 __appname__ = 'labelImg'
 
@@ -73,7 +86,8 @@ class WindowMixin(object):
 class MainWindow(QMainWindow, WindowMixin):
     FIT_WINDOW, FIT_WIDTH, MANUAL_ZOOM = list(range(3))
 
-    def __init__(self, default_filename=None, default_prefdef_class_file=None, default_save_dir=None):
+    def __init__(self, default_filename=None, default_prefdef_class_file=None, default_save_dir=None,
+                 label_colors_file=None):
         super(MainWindow, self).__init__()
         self.setWindowTitle(__appname__)
 
@@ -93,7 +107,21 @@ class MainWindow(QMainWindow, WindowMixin):
         self.label_file_format = settings.get(SETTING_LABEL_FILE_FORMAT, LabelFileFormat.PASCAL_VOC)
 
         # For loading all image under a directory
-        self.m_img_list = []
+        self.file_list_model = FileListModel(self)
+        self.file_list_model.color_of = self.annotation_color
+        self.dir_scanner = None
+        # Streams images added to or removed from the open directory, see start_dir_watch
+        self.dir_watcher = None
+        # Labelled/verified status of the listed images, see start_annotation_index
+        self.annotation_index = None
+        self.annotation_indexer = None
+        # Annotation path -> the images whose save to it is queued
+        self.saving_images = {}
+        # Image path -> why its source could not read it, see read_image
+        self.image_errors = {}
+        # Database path -> {image path: record} not written yet, one queued job writes them all
+        self.sqlite_saves = {}
+        self.sqlite_saves_lock = threading.Lock()
         self.dir_name = None
         self.label_hist = []
         self.last_open_dir = None
@@ -103,6 +131,17 @@ class MainWindow(QMainWindow, WindowMixin):
         # Whether we need to save or not.
         self.dirty = False
 
+        # Annotations are written on a worker thread
+        self.save_queue = SaveQueue(self)
+        self.save_queue.saved.connect(self.save_finished)
+        self.save_queue.saveFailed.connect(self.save_failed)
+
+        # Where the listed images come from when they are not local files, e.g. an archive
+        self.image_source = None
+
+        # Decoded images, the neighbours of the current one are decoded ahead of time
+        self.image_cache = ImageCache(loader=self.read_image, signature=self.image_signature, parent=self)
+
         self._no_selection_slot = False
         self._beginner = True
         self.screencast = "https://youtu.be/p0nR2YsCY_U"
@@ -115,11 +154,19 @@ class MainWindow(QMainWindow, WindowMixin):
         else:
             print("Not find:/data/predefined_classes.txt (optional)")
 
+        # Fixed label colors, so they stay the same across sessions
+        if label_colors_file and os.path.exists(label_colors_file):
+            load_label_palette(label_colors_file)
+        warm_label_colors(self.label_hist)
+
         # Main widgets and related state.
         self.label_dialog = LabelDialog(parent=self, list_item=self.label_hist)
 
         self.items_to_shapes = {}
         self.shapes_to_items = {}
+        # Shapes per label text, kept up to date with the label list so the filter
+        # combo box does not have to walk it.
+        self.label_shapes = {}
         self.prev_label_text = ''
 
         list_layout = QVBoxLayout()
@@ -169,11 +216,15 @@ class MainWindow(QMainWindow, WindowMixin):
         self.dock.setObjectName(get_str('labels'))
         self.dock.setWidget(label_list_container)
 
-        self.file_list_widget = QListWidget()
-        self.file_list_widget.itemDoubleClicked.connect(self.file_item_double_clicked)
+        self.file_list_view = QListView()
+        self.file_list_view.setModel(self.file_list_model)
+        # Lets the view lay out huge lists without measuring every row
+        self.file_list_view.setUniformItemSizes(True)
+        self.file_list_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.file_list_view.doubleClicked.connect(self.file_item_double_clicked)
         file_list_layout = QVBoxLayout()
         file_list_layout.setContentsMargins(0, 0, 0, 0)
-        file_list_layout.addWidget(self.file_list_widget)
+        file_list_layout.addWidget(self.file_list_view)
         file_list_container = QWidget()
         file_list_container.setLayout(file_list_layout)
         self.file_dock = QDockWidget(get_str('fileList'), self)
@@ -223,6 +274,12 @@ class MainWindow(QMainWindow, WindowMixin):
         open_dir = action(get_str('openDir'), self.open_dir_dialog,
                           'Ctrl+u', 'open', get_str('openDir'))
 
+        open_archive = action(get_str('openArchive'), self.open_archive_dialog,
+                              None, 'open', get_str('openArchiveDetail'))
+
+        open_remote = action(get_str('openRemote'), self.open_remote_dialog,
+                             None, 'open', get_str('openRemoteDetail'))
+
         change_save_dir = action(get_str('changeSaveDir'), self.change_save_dir_dialog,
                                  'Ctrl+r', 'open', get_str('changeSavedAnnotationDir'))
 
@@ -236,6 +293,9 @@ class MainWindow(QMainWindow, WindowMixin):
         open_prev_image = action(get_str('prevImg'), self.open_prev_image,
                                  'a', 'prev', get_str('prevImgDetail'))
 
+        open_next_unlabelled_image = action(get_str('nextUnlabelledImg'), self.open_next_unlabelled_image,
+                                            'Shift+D', 'next', get_str('nextUnlabelledImgDetail'))
+
         verify = action(get_str('verifyImg'), self.verify_image,
                         'space', 'verify', get_str('verifyImgDetail'))
 
@@ -252,6 +312,8 @@ class MainWindow(QMainWindow, WindowMixin):
                 return '&YOLO', 'format_yolo'
             elif format == LabelFileFormat.CREATE_ML:
                 return '&CreateML', 'format_createml'
+            elif format == LabelFileFormat.SQLITE:
+                return '&SQLite', 'format_sqlite'
 
         save_format = action(get_format_meta(self.label_file_format)[0],
                              self.change_format, 'Ctrl+Y',
@@ -425,14 +487,20 @@ class MainWindow(QMainWindow, WindowMixin):
         self.display_label_option.setCheckable(True)
         self.display_label_option.setChecked(settings.get(SETTING_PAINT_LABEL, False))
         self.display_label_option.triggered.connect(self.toggle_paint_labels_option)
+        # Keep the file list in sync with images added to or removed from the open directory
+        self.watch_dir_option = QAction(get_str('watchDir'), self)
+        self.watch_dir_option.setCheckable(True)
+        self.watch_dir_option.setChecked(settings.get(SETTING_WATCH_DIR, False))
+        self.watch_dir_option.triggered.connect(self.toggle_dir_watch)
 
         add_actions(self.menus.file,
-                    (open, open_dir, change_save_dir, open_annotation, copy_prev_bounding, self.menus.recentFiles, save, save_format, save_as, close, reset_all, delete_image, quit))
+                    (open, open_dir, open_archive, open_remote, change_save_dir, open_annotation, copy_prev_bounding, open_next_unlabelled_image, self.menus.recentFiles, save, save_format, save_as, close, reset_all, delete_image, quit))
         add_actions(self.menus.help, (help_default, show_info, show_shortcut))
         add_actions(self.menus.view, (
             self.auto_saving,
             self.single_class_mode,
             self.display_label_option,
+            self.watch_dir_option,
             labels, advanced_mode, None,
             hide_all, show_all, None,
             zoom_in, zoom_out, zoom_org, None,
@@ -460,6 +528,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.statusBar().showMessage('%s started.' % __appname__)
         self.statusBar().show()
+        self.progress_label = QLabel()
+        self.statusBar().addPermanentWidget(self.progress_label)
 
         # Application state.
         self.image = QImage()
@@ -522,6 +592,10 @@ class MainWindow(QMainWindow, WindowMixin):
         # Since loading the file may take some time, make sure it runs in the background.
         if self.file_path and os.path.isdir(self.file_path):
             self.queue_event(partial(self.import_dir_images, self.file_path or ""))
+        elif self.file_path and is_archive(self.file_path):
+            self.queue_event(partial(self.import_archive, self.file_path))
+        elif self.file_path and is_remote(self.file_path):
+            self.queue_event(partial(self.import_remote, self.file_path))
         elif self.file_path:
             self.queue_event(partial(self.load_file, self.file_path or ""))
 
@@ -568,12 +642,20 @@ class MainWindow(QMainWindow, WindowMixin):
             self.label_file_format = LabelFileFormat.CREATE_ML
             LabelFile.suffix = JSON_EXT
 
+        elif save_format == FORMAT_SQLITE:
+            self.actions.save_format.setText(FORMAT_SQLITE)
+            self.actions.save_format.setIcon(new_icon("format_sqlite"))
+            self.label_file_format = LabelFileFormat.SQLITE
+            LabelFile.suffix = DB_EXT
+
     def change_format(self):
         if self.label_file_format == LabelFileFormat.PASCAL_VOC:
             self.set_format(FORMAT_YOLO)
         elif self.label_file_format == LabelFileFormat.YOLO:
             self.set_format(FORMAT_CREATEML)
         elif self.label_file_format == LabelFileFormat.CREATE_ML:
+            self.set_format(FORMAT_SQLITE)
+        elif self.label_file_format == LabelFileFormat.SQLITE:
             self.set_format(FORMAT_PASCALVOC)
         else:
             raise ValueError('Unknown label file format.')
@@ -643,6 +725,7 @@ class MainWindow(QMainWindow, WindowMixin):
     def reset_state(self):
         self.items_to_shapes.clear()
         self.shapes_to_items.clear()
+        self.label_shapes.clear()
         self.label_list.clear()
         self.file_path = None
         self.image_data = None
@@ -762,9 +845,13 @@ class MainWindow(QMainWindow, WindowMixin):
             self.set_dirty()
             self.update_combo_box()
 
+    @property
+    def m_img_list(self):
+        return self.file_list_model.paths
+
     # Tzutalin 20160906 : Add file list and dock to move faster
-    def file_item_double_clicked(self, item=None):
-        self.cur_img_idx = self.m_img_list.index(ustr(item.text()))
+    def file_item_double_clicked(self, index=None):
+        self.cur_img_idx = index.row()
         filename = self.m_img_list[self.cur_img_idx]
         if filename:
             self.load_file(filename)
@@ -812,7 +899,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.actions.shapeLineColor.setEnabled(selected)
         self.actions.shapeFillColor.setEnabled(selected)
 
-    def add_label(self, shape):
+    def _create_label_item(self, shape):
         shape.paint_label = self.display_label_option.isChecked()
         item = HashableQListWidgetItem(shape.label)
         item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
@@ -820,7 +907,31 @@ class MainWindow(QMainWindow, WindowMixin):
         item.setBackground(generate_color_by_text(shape.label))
         self.items_to_shapes[item] = shape
         self.shapes_to_items[shape] = item
-        self.label_list.addItem(item)
+        self._index_label(shape, shape.label)
+        return item
+
+    def add_label(self, shape):
+        self.label_list.addItem(self._create_label_item(shape))
+        for action in self.actions.onShapesPresent:
+            action.setEnabled(True)
+        self.update_combo_box()
+
+    def add_labels(self, shapes):
+        """
+        Add list items for many shapes at once. The list is filled with its signals
+        blocked and the combo box is rebuilt once at the end.
+        """
+        if not shapes:
+            self.update_combo_box()
+            return
+        blocked = self.label_list.blockSignals(True)
+        self.label_list.setUpdatesEnabled(False)
+        try:
+            for shape in shapes:
+                self.label_list.addItem(self._create_label_item(shape))
+        finally:
+            self.label_list.setUpdatesEnabled(True)
+            self.label_list.blockSignals(blocked)
         for action in self.actions.onShapesPresent:
             action.setEnabled(True)
         self.update_combo_box()
@@ -833,8 +944,19 @@ class MainWindow(QMainWindow, WindowMixin):
         self.label_list.takeItem(self.label_list.row(item))
         del self.shapes_to_items[shape]
         del self.items_to_shapes[item]
+        self._unindex_label(shape, shape.label)
         self.update_combo_box()
 
+    def _index_label(self, shape, label):
+        self.label_shapes.setdefault(label, set()).add(shape)
+
+    def _unindex_label(self, shape, label):
+        shapes = self.label_shapes.get(label)
+        if shapes is not None:
+            shapes.discard(shape)
+            if not shapes:
+                del self.label_shapes[label]
+
     def load_labels(self, shapes):
         s = []
         for label, points, line_color, fill_color, difficult in shapes:
@@ -861,15 +983,12 @@ class MainWindow(QMainWindow, WindowMixin):
             else:
                 shape.fill_color = generate_color_by_text(label)
 
-            self.add_label(shape)
-        self.update_combo_box()
+        self.add_labels(s)
         self.canvas.load_shapes(s)
 
     def update_combo_box(self):
         # Get the unique labels and add them to the Combobox.
-        items_text_list = [str(self.label_list.item(i).text()) for i in range(self.label_list.count())]
-
-        unique_text_list = list(set(items_text_list))
+        unique_text_list = [str(text) for text in self.label_shapes]
         # Add a null row for showing all the labels
         unique_text_list.append("")
         unique_text_list.sort()
@@ -891,31 +1010,85 @@ class MainWindow(QMainWindow, WindowMixin):
                         difficult=s.difficult)
 
         shapes = [format_shape(shape) for shape in self.canvas.shapes]
+        # Snapshot everything the writer needs, the GUI keeps changing while it runs
+        label_file = LabelFile()
+        label_file.verified = self.label_file.verified
+        image_path = self.file_path
+        image_data = QImage(self.image_data) if isinstance(self.image_data, QImage) else self.image_data
+        line_color = self.line_color.getRgb()
+        fill_color = self.fill_color.getRgb()
         # Can add different annotation formats here
-        try:
-            if self.label_file_format == LabelFileFormat.PASCAL_VOC:
-                if annotation_file_path[-4:].lower() != ".xml":
-                    annotation_file_path += XML_EXT
-                self.label_file.save_pascal_voc_format(annotation_file_path, shapes, self.file_path, self.image_data,
-                                                       self.line_color.getRgb(), self.fill_color.getRgb())
-            elif self.label_file_format == LabelFileFormat.YOLO:
-                if annotation_file_path[-4:].lower() != ".txt":
-                    annotation_file_path += TXT_EXT
-                self.label_file.save_yolo_format(annotation_file_path, shapes, self.file_path, self.image_data, self.label_hist,
-                                                 self.line_color.getRgb(), self.fill_color.getRgb())
-            elif self.label_file_format == LabelFileFormat.CREATE_ML:
-                if annotation_file_path[-5:].lower() != ".json":
-                    annotation_file_path += JSON_EXT
-                self.label_file.save_create_ml_format(annotation_file_path, shapes, self.file_path, self.image_data,
-                                                      self.label_hist, self.line_color.getRgb(), self.fill_color.getRgb())
+        if self.label_file_format == LabelFileFormat.PASCAL_VOC:
+            if annotation_file_path[-4:].lower() != ".xml":
+                annotation_file_path += XML_EXT
+
+            def write():
+                write_atomically(annotation_file_path, lambda tmp_path: label_file.save_pascal_voc_format(
+                    tmp_path, shapes, image_path, image_data, line_color, fill_color))
+        elif self.label_file_format == LabelFileFormat.YOLO:
+            if annotation_file_path[-4:].lower() != ".txt":
+                annotation_file_path += TXT_EXT
+            for shape in shapes:
+                if shape['label'] not in self.label_hist:
+                    self.label_hist.append(shape['label'])
+            class_list = list(self.label_hist)
+
+            def write():
+                write_atomically(annotation_file_path, lambda tmp_path: label_file.save_yolo_format(
+                    tmp_path, shapes, image_path, image_data, class_list, line_color, fill_color))
+        elif self.label_file_format == LabelFileFormat.CREATE_ML:
+            if annotation_file_path[-5:].lower() != ".json":
+                annotation_file_path += JSON_EXT
+            class_list = list(self.label_hist)
+
+            # The dataset store journals its writes, no temporary file needed
+            def write():
+                label_file.save_create_ml_format(annotation_file_path, shapes, image_path, image_data,
+                                                 class_list, line_color, fill_color)
+        elif self.label_file_format == LabelFileFormat.SQLITE:
+            # One database per annotation directory unless one was picked, the image is a record in it
+            if annotation_file_path[-3:].lower() == DB_EXT:
+                db_path = annotation_file_path
             else:
-                self.label_file.save(annotation_file_path, shapes, self.file_path, self.image_data,
-                                     self.line_color.getRgb(), self.fill_color.getRgb())
-            print('Image:{0} -> Annotation:{1}'.format(self.file_path, annotation_file_path))
-            return True
-        except LabelFileError as e:
-            self.error_message(u'Error saving label data', u'<b>%s</b>' % e)
+                db_path = database_path(os.path.dirname(annotation_file_path))
+            annotation_file_path = db_path
+            # Saves of other images to the same database are queued under the same
+            # key, so the job writes every record still pending instead of the last one
+            with self.sqlite_saves_lock:
+                self.sqlite_saves.setdefault(db_path, OrderedDict())[image_path] = (label_file, shapes, image_data)
+
+            # Each save is a transaction, no temporary file needed
+            def write():
+                with self.sqlite_saves_lock:
+                    records = self.sqlite_saves.pop(db_path, {})
+                for record_image_path, (record_label_file, record_shapes, record_image_data) in records.items():
+                    record_label_file.save_sqlite_format(db_path, record_shapes, record_image_path, record_image_data)
+        else:
+            self.error_message(u'Error saving label data', u'<b>Unknown annotation format</b>')
             return False
+        # A newer save of the same file replaces a pending one
+        self.saving_images.setdefault(os.path.abspath(annotation_file_path), set()).add(image_path)
+        self.save_queue.put(os.path.abspath(annotation_file_path), write)
+        print('Image:{0} -> Annotation:{1}'.format(image_path, annotation_file_path))
+        return True
+
+    def save_finished(self, annotation_file_path):
+        self.statusBar().showMessage('Saved to  %s' % annotation_file_path)
+        self.statusBar().show()
+        image_paths = self.saving_images.pop(annotation_file_path, ())
+        if self.annotation_index is not None:
+            changed = [image_path for image_path in image_paths if self.annotation_index.update(image_path)]
+            if changed:
+                self.file_list_model.refresh(changed)
+                self.update_progress()
+
+    def save_failed(self, annotation_file_path, message):
+        image_paths = self.saving_images.pop(annotation_file_path, ())
+        if self.file_path in image_paths:
+            # The edits were marked saved when queued, keep them from being discarded
+            self.set_dirty()
+        self.error_message(u'Error saving label data', u'<p>%s</p><b>%s</b>' % (annotation_file_path, message))
+        self.status("Error saving %s" % annotation_file_path)
 
     def copy_selected_shape(self):
         self.add_label(self.canvas.copy_selected_shape())
@@ -924,13 +1097,26 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def combo_selection_changed(self, index):
         text = self.combo_box.cb.itemText(index)
-        for i in range(self.label_list.count()):
-            if text == "":
-                self.label_list.item(i).setCheckState(2)
-            elif text != self.label_list.item(i).text():
-                self.label_list.item(i).setCheckState(0)
-            else:
-                self.label_list.item(i).setCheckState(2)
+        for label, shapes in self.label_shapes.items():
+            self.set_shapes_visible(shapes, text == "" or text == label)
+
+    def set_shapes_visible(self, shapes, visible):
+        """
+        Check or uncheck the list items of shapes without a label_item_changed and
+        canvas repaint per item, then schedule one canvas update.
+        """
+        state = Qt.Checked if visible else Qt.Unchecked
+        changed = [shape for shape in shapes if self.canvas.isVisible(shape) != visible or
+                   self.shapes_to_items[shape].checkState() != state]
+        if not changed:
+            return
+        blocked = self.label_list.blockSignals(True)
+        try:
+            for shape in changed:
+                self.shapes_to_items[shape].setCheckState(state)
+        finally:
+            self.label_list.blockSignals(blocked)
+        self.canvas.set_shapes_visible(changed, visible)
 
     def default_label_combo_selection_changed(self, index):
         self.default_label=self.label_hist[index]
@@ -948,6 +1134,8 @@ class MainWindow(QMainWindow, WindowMixin):
         shape = self.items_to_shapes[item]
         label = item.text()
         if label != shape.label:
+            self._unindex_label(shape, shape.label)
+            self._index_label(shape, label)
             shape.label = item.text()
             shape.line_color = generate_color_by_text(shape.label)
             self.set_dirty()
@@ -1087,8 +1275,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.set_light(self.light_widget.value() + increment)
 
     def toggle_polygons(self, value):
-        for item, shape in self.items_to_shapes.items():
-            item.setCheckState(Qt.Checked if value else Qt.Unchecked)
+        self.set_shapes_visible(list(self.shapes_to_items), value)
 
     def load_file(self, file_path=None):
         """Load the specified file, or the last opened file if None."""
@@ -1104,16 +1291,19 @@ class MainWindow(QMainWindow, WindowMixin):
         unicode_file_path = os.path.abspath(unicode_file_path)
         # Tzutalin 20160906 : Add file list and dock to move faster
         # Highlight the file item
-        if unicode_file_path and self.file_list_widget.count() > 0:
-            if unicode_file_path in self.m_img_list:
-                index = self.m_img_list.index(unicode_file_path)
-                file_widget_item = self.file_list_widget.item(index)
-                file_widget_item.setSelected(True)
+        if unicode_file_path and self.file_list_model.rowCount() > 0:
+            row = self.file_list_model.row_of(unicode_file_path)
+            if row is not None:
+                self.cur_img_idx = row
+                self.file_list_view.setCurrentIndex(self.file_list_model.index(row))
             else:
-                self.file_list_widget.clear()
-                self.m_img_list.clear()
+                self.stop_dir_scan()
+                self.stop_dir_watch()
+                self.file_list_model.clear()
+                self.img_count = 0
+                self.close_image_source()
 
-        if unicode_file_path and os.path.exists(unicode_file_path):
+        if unicode_file_path and self.image_exists(unicode_file_path):
             if LabelFile.is_label_file(unicode_file_path):
                 try:
                     self.label_file = LabelFile(unicode_file_path)
@@ -1132,30 +1322,37 @@ class MainWindow(QMainWindow, WindowMixin):
             else:
                 # Load image:
                 # read data first and store for saving into label file.
-                self.image_data = read(unicode_file_path, None)
+                # Huge images are decoded tile by tile as they are viewed
+                self.image_data = None
+                if self.image_source_for(unicode_file_path) is None:
+                    self.image_data = TiledImage.open(unicode_file_path)
+                self.image_data = self.image_data or self.image_cache.get(unicode_file_path)
                 self.label_file = None
                 self.canvas.verified = False
 
-            if isinstance(self.image_data, QImage):
+            if isinstance(self.image_data, (QImage, TiledImage)):
                 image = self.image_data
             else:
                 image = QImage.fromData(self.image_data)
             if image.isNull():
+                reason = self.image_errors.pop(unicode_file_path, None)
                 self.error_message(u'Error opening file',
+                                   (u"<p><b>%s</b></p>" % reason if reason else u"") +
                                    u"<p>Make sure <i>%s</i> is a valid image file." % unicode_file_path)
                 self.status("Error reading %s" % unicode_file_path)
                 return False
             self.status("Loaded %s" % os.path.basename(unicode_file_path))
             self.image = image
             self.file_path = unicode_file_path
-            self.canvas.load_pixmap(QPixmap.fromImage(image))
+            self.canvas.load_pixmap(image if isinstance(image, TiledImage) else QPixmap.fromImage(image))
             if self.label_file:
                 self.load_labels(self.label_file.shapes)
             self.set_clean()
             self.canvas.setEnabled(True)
             self.adjust_scale(initial=True)
             self.paint_canvas()
-            self.add_recent_file(self.file_path)
+            if self.image_source_for(self.file_path) is None:
+                self.add_recent_file(self.file_path)
             self.toggle_actions(True)
             self.show_bounding_box_from_annotation_file(self.file_path)
 
@@ -1168,9 +1365,55 @@ class MainWindow(QMainWindow, WindowMixin):
                 self.label_list.item(self.label_list.count() - 1).setSelected(True)
 
             self.canvas.setFocus(True)
+            if self.file_list_model.row_of(unicode_file_path) is not None:
+                self.prefetch_images(self.cur_img_idx)
             return True
         return False
 
+    def image_source_for(self, path):
+        """The source that serves path, or None for a local file."""
+        source = self.image_source
+        if source is not None and source.owns(path):
+            return source
+        return None
+
+    def image_exists(self, path):
+        source = self.image_source_for(path)
+        return source.exists(path) if source is not None else os.path.exists(path)
+
+    def read_image(self, path):
+        # Image cache loader, runs on its worker thread too
+        source = self.image_source_for(path)
+        if source is None:
+            return load_image(path)
+        try:
+            data = source.read(path)
+        except ImageSourceError as e:
+            # Reported by load_file, this may run on a worker thread
+            self.image_errors[path] = ustr(e)
+            return QImage()
+        self.image_errors.pop(path, None)
+        return load_image_data(data)
+
+    def image_signature(self, path):
+        source = self.image_source_for(path)
+        if source is None:
+            return file_signature(path)
+        return source.signature(path)
+
+    def prefetch_images(self, index):
+        # Next images first, that is where the user is most likely going
+        paths = []
+        for offset in range(1, PREFETCH_COUNT + 1):
+            for i in (index + offset, index - offset):
+                if 0 <= i < len(self.m_img_list):
+                    path = self.m_img_list[i]
+                    if self.image_source_for(path) is not None or not use_tiles(path):
+                        paths.append(path)
+        if self.image_source is not None:
+            self.image_source.prefetch([path for path in paths if self.image_source.owns(path)])
+        self.image_cache.prefetch(paths)
+
     def counter_str(self):
         """
         Converts image counter to string representation.
@@ -1183,29 +1426,64 @@ class MainWindow(QMainWindow, WindowMixin):
             xml_path = os.path.join(self.default_save_dir, basename + XML_EXT)
             txt_path = os.path.join(self.default_save_dir, basename + TXT_EXT)
             json_path = os.path.join(self.default_save_dir, basename + JSON_EXT)
+            db_path = database_path(self.default_save_dir)
+            self.wait_for_saves(xml_path, txt_path, json_path, db_path)
 
             """Annotation file priority:
-            PascalXML > YOLO
+            SQLite in SQLite mode > PascalXML > YOLO > CreateML > SQLite
             """
+            sqlite_mode = self.label_file_format == LabelFileFormat.SQLITE
+            if sqlite_mode and self.load_sqlite_by_filename(db_path, file_path):
+                return
             if os.path.isfile(xml_path):
                 self.load_pascal_xml_by_filename(xml_path)
             elif os.path.isfile(txt_path):
                 self.load_yolo_txt_by_filename(txt_path)
             elif os.path.isfile(json_path):
                 self.load_create_ml_json_by_filename(json_path, file_path)
+            elif sqlite_mode or not self.load_sqlite_by_filename(db_path, file_path):
+                if self.image_source_for(file_path) is not None:
+                    self.load_annotation_from_source(file_path)
 
         else:
             xml_path = os.path.splitext(file_path)[0] + XML_EXT
             txt_path = os.path.splitext(file_path)[0] + TXT_EXT
             json_path = os.path.splitext(file_path)[0] + JSON_EXT
+            db_path = database_path(os.path.dirname(file_path))
+            self.wait_for_saves(xml_path, txt_path, json_path, db_path)
 
+            # The database only wins in SQLite mode, an older record must not hide newer files
+            sqlite_mode = self.label_file_format == LabelFileFormat.SQLITE
+            if sqlite_mode and self.load_sqlite_by_filename(db_path, file_path):
+                return
             if os.path.isfile(xml_path):
                 self.load_pascal_xml_by_filename(xml_path)
             elif os.path.isfile(txt_path):
                 self.load_yolo_txt_by_filename(txt_path)
             elif os.path.isfile(json_path):
                 self.load_create_ml_json_by_filename(json_path, file_path)
-            
+            elif not sqlite_mode:
+                self.load_sqlite_by_filename(db_path, file_path)
+
+    def load_annotation_from_source(self, file_path):
+        """Load the annotation shipped next to file_path in its source, e.g. in the same archive."""
+        source = self.image_source_for(file_path)
+        stem = os.path.splitext(file_path)[0]
+        if source.exists(stem + XML_EXT):
+            self.load_pascal_xml_by_filename(source.local_copy(stem + XML_EXT))
+        elif source.exists(stem + TXT_EXT):
+            # The YOLO reader looks for classes.txt next to the annotation
+            source.local_copy(os.path.join(os.path.dirname(file_path), 'classes.txt'))
+            self.load_yolo_txt_by_filename(source.local_copy(stem + TXT_EXT))
+        else:
+            json_path = os.path.join(os.path.dirname(file_path), 'annotations' + JSON_EXT)
+            if source.exists(json_path):
+                self.load_create_ml_json_by_filename(source.local_copy(json_path), file_path)
+
+    def wait_for_saves(self, *annotation_paths):
+        # Do not read a file the save queue is still writing
+        for path in annotation_paths:
+            self.save_queue.wait(os.path.abspath(ustr(path)))
 
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull()\
@@ -1273,25 +1551,152 @@ class MainWindow(QMainWindow, WindowMixin):
         settings[SETTING_SINGLE_CLASS] = self.single_class_mode.isChecked()
         settings[SETTING_PAINT_LABEL] = self.display_label_option.isChecked()
         settings[SETTING_DRAW_SQUARE] = self.draw_squares_option.isChecked()
+        settings[SETTING_WATCH_DIR] = self.watch_dir_option.isChecked()
         settings[SETTING_LABEL_FILE_FORMAT] = self.label_file_format
         settings.save()
+        self.stop_dir_scan()
+        self.stop_dir_watch()
+        self.stop_annotation_index()
+        if self.annotation_index is not None:
+            self.annotation_index.save()
+        self.save_queue.wait()
+        CreateMLStore.close_all()
+        AnnotationDatabase.close_all()
+        self.image_cache.clear()
+        self.close_image_source()
 
     def load_recent(self, filename):
         if self.may_continue():
             self.load_file(filename)
 
-    def scan_all_images(self, folder_path):
-        extensions = ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
-        images = []
+    def start_dir_scan(self, dir_path):
+        self.stop_dir_scan()
+        self.stop_dir_watch()
+        self.stop_annotation_index()
+        self.annotation_index = None
+        self.update_progress()
+        self.dir_scanner = DirScanner(dir_path, image_extensions(), MANIFEST_DIR, parent=self)
+        self.dir_scanner.batchFound.connect(self.add_scanned_images)
+        self.dir_scanner.scanFinished.connect(self.dir_scan_finished)
+        self.dir_scanner.start()
+        self.status("Scanning %s" % dir_path)
+
+    def start_dir_watch(self, directories=()):
+        self.stop_dir_watch()
+        if self.dir_name is None:
+            return
+        self.dir_watcher = DirWatcher(self.dir_name, image_extensions(), self.m_img_list, directories, parent=self)
+        self.dir_watcher.imagesAdded.connect(self.watched_images_added)
+        self.dir_watcher.imagesRemoved.connect(self.watched_images_removed)
+
+    def stop_dir_watch(self):
+        if self.dir_watcher is not None:
+            self.dir_watcher.close()
+            self.dir_watcher.deleteLater()
+            self.dir_watcher = None
+
+    def toggle_dir_watch(self, enabled):
+        if not enabled:
+            self.stop_dir_watch()
+        elif self.dir_watcher is None and self.dir_scanner is None and self.dir_name is not None \
+                and self.image_source is None:
+            # Files that changed while nothing watched are only picked up by a new scan
+            self.start_dir_watch()
+
+    def watched_images_added(self, paths):
+        if self.sender() is not self.dir_watcher:
+            return
+        added = self.add_image_files(paths)
+        if added:
+            self.status("%d new images in %s" % (len(added), self.dir_name))
+            if self.file_path is None:
+                self.open_next_image()
+
+    def watched_images_removed(self, paths):
+        if self.sender() is not self.dir_watcher:
+            return
+        # The image on the canvas stays open, it can still be saved elsewhere
+        self.remove_image_files(paths)
+
+    def stop_dir_scan(self):
+        if self.dir_scanner is not None:
+            self.dir_scanner.cancel()
+            self.dir_scanner.wait()
+            self.dir_scanner = None
+
+    def add_scanned_images(self, images):
+        # Batches of a cancelled scan may still be queued
+        if self.sender() is not self.dir_scanner:
+            return
+        self.file_list_model.extend(images)
+        self.img_count = len(self.m_img_list)
+        self.status("Scanning %s: %d images" % (self.dir_name, self.img_count))
+        if self.file_path is None:
+            self.open_next_image()
 
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relative_path = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relative_path))
-                    images.append(path)
-        natural_sort(images, key=lambda x: x.lower())
-        return images
+    def dir_scan_finished(self, images):
+        if self.sender() is not self.dir_scanner:
+            return
+        directories = self.dir_scanner.directories
+        self.dir_scanner = None
+        # The complete list is sorted across batches, so positions may have moved
+        self.file_list_model.set_paths(images, is_sorted=True)
+        self.img_count = len(images)
+        self.start_annotation_index()
+        if self.watch_dir_option.isChecked():
+            self.start_dir_watch(directories)
+        self.status("Found %d images in %s" % (self.img_count, self.dir_name))
+        if self.file_path is None:
+            self.open_next_image()
+        elif self.file_list_model.row_of(self.file_path) is not None:
+            self.cur_img_idx = self.file_list_model.row_of(self.file_path)
+            self.file_list_view.setCurrentIndex(self.file_list_model.index(self.cur_img_idx))
+
+    def start_annotation_index(self):
+        self.stop_annotation_index()
+        if self.dir_name is None or not self.m_img_list:
+            self.annotation_index = None
+            self.update_progress()
+            return
+        # Show the saved statuses right away, then bring them up to date in the background.
+        # The images of a source live under its root, dir_name is then its url or archive path
+        image_dir = self.image_source.root if self.image_source is not None else self.dir_name
+        self.annotation_index = AnnotationIndex(image_dir, self.default_save_dir)
+        if self.annotation_index.load():
+            self.file_list_model.refresh(self.m_img_list)
+        self.update_progress()
+        self.annotation_indexer = AnnotationIndexer(self.annotation_index, self.m_img_list, parent=self)
+        self.annotation_indexer.statusChanged.connect(self.annotation_status_changed)
+        self.annotation_indexer.start()
+
+    def stop_annotation_index(self):
+        if self.annotation_indexer is not None:
+            self.annotation_indexer.cancel()
+            self.annotation_indexer.wait()
+            self.annotation_indexer = None
+
+    def annotation_status_changed(self, image_paths):
+        if self.sender() is not self.annotation_indexer:
+            return
+        self.file_list_model.refresh(image_paths)
+        self.update_progress()
+
+    def annotation_color(self, image_path):
+        status = self.annotation_index.get(image_path) if self.annotation_index is not None else None
+        if status is None:
+            return None
+        if status.verified:
+            return QColor(0, 110, 0)
+        if status.box_count == 0:
+            return QColor(Qt.gray)
+        return QColor(0, 0, 190)
+
+    def update_progress(self):
+        if self.annotation_index is None or not self.img_count:
+            self.progress_label.setText('')
+            return
+        self.progress_label.setText('Labelled %d / %d, verified %d' % (
+            self.annotation_index.labelled_count, self.img_count, self.annotation_index.verified_count))
 
     def change_save_dir_dialog(self, _value=False):
         if self.default_save_dir is not None:
@@ -1305,6 +1710,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
         if dir_path is not None and len(dir_path) > 1:
             self.default_save_dir = dir_path
+            if self.dir_scanner is None:
+                self.start_annotation_index()
 
         self.show_bounding_box_from_annotation_file(self.file_path)
 
@@ -1365,16 +1772,115 @@ class MainWindow(QMainWindow, WindowMixin):
         if not self.may_continue() or not dir_path:
             return
 
+        self.save_queue.wait()
+        CreateMLStore.close_all()
+        AnnotationDatabase.close_all()
+        self.image_cache.clear()
+        self.close_image_source()
         self.last_open_dir = dir_path
         self.dir_name = dir_path
         self.file_path = None
-        self.file_list_widget.clear()
-        self.m_img_list = self.scan_all_images(dir_path)
-        self.img_count = len(self.m_img_list)
+        self.file_list_model.clear()
+        self.img_count = 0
+        self.cur_img_idx = 0
+        self.start_dir_scan(dir_path)
+
+    def open_archive_dialog(self, _value=False):
+        if not self.may_continue():
+            return
+        path = self.last_open_dir if self.last_open_dir and os.path.exists(self.last_open_dir) else '.'
+        filters = "Archives (%s)" % ' '.join('*%s' % ext for ext in ARCHIVE_EXTENSIONS)
+        archive_path, _ = QFileDialog.getOpenFileName(self, '%s - Open Archive' % __appname__, path, filters)
+        if archive_path:
+            self.import_archive(ustr(archive_path))
+
+    def import_archive(self, archive_path):
+        """
+        List the images inside a zip or tar archive without extracting it. Annotations
+        are saved to a directory next to the archive unless a save dir is set.
+        """
+        if not self.may_continue() or not archive_path:
+            return
+        archive_path = os.path.abspath(archive_path)
+        source = self.open_image_source(ArchiveSource, archive_path, MANIFEST_DIR)
+        if source is not None:
+            self.last_open_dir = os.path.dirname(archive_path)
+            self.import_image_source(source, archive_path)
+
+    def open_remote_dialog(self, _value=False):
+        if not self.may_continue():
+            return
+        get_str = self.string_bundle.get_string
+        last_url = self.dir_name if is_remote(self.dir_name or '') else ''
+        url, ok = QInputDialog.getText(self, '%s - %s' % (__appname__, get_str('openRemote')),
+                                       get_str('openRemoteDetail'), text=last_url)
+        if ok and url:
+            self.import_remote(ustr(url).strip())
+
+    def import_remote(self, url):
+        """
+        List the images of an S3 compatible bucket or of a .txt manifest on an HTTP
+        server. They are downloaded as they are viewed or prefetched.
+        """
+        if not self.may_continue() or not url:
+            return
+        source = self.open_image_source(RemoteSource, url, MANIFEST_DIR)
+        if source is not None:
+            self.import_image_source(source, url)
+
+    def open_image_source(self, source_class, *args):
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            return source_class(*args)
+        except ImageSourceError as e:
+            self.error_message(u'Error opening %s' % args[0], u'<p>%s</p>' % e)
+            return None
+        finally:
+            QApplication.restoreOverrideCursor()
+
+    def import_image_source(self, source, name):
+        """
+        Make the images of source the image list. Annotations are saved to the
+        source's labels_dir unless a save dir is set, the user is asked otherwise.
+        """
+        save_dir = self.default_save_dir
+        # A save dir picked for the previous source does not carry over to this one
+        if self.image_source is not None and save_dir == self.image_source.labels_dir:
+            save_dir = None
+        save_dir = save_dir or source.labels_dir or ustr(QFileDialog.getExistingDirectory(
+            self, '%s - Save annotations to the directory' % __appname__, self.last_open_dir or '.',
+            QFileDialog.ShowDirsOnly | QFileDialog.DontResolveSymlinks))
+        if not save_dir:
+            source.close()
+            return
+
+        self.save_queue.wait()
+        CreateMLStore.close_all()
+        AnnotationDatabase.close_all()
+        self.image_cache.clear()
+        self.stop_dir_scan()
+        self.stop_dir_watch()
+        self.close_image_source()
+        self.image_source = source
+        self.dir_name = name
+        self.file_path = None
+        self.cur_img_idx = 0
+        self.default_save_dir = save_dir
+        if not os.path.isdir(save_dir):
+            os.makedirs(save_dir)
+        images = source.list_images(image_extensions())
+        images.sort(key=image_sort_key)
+        self.file_list_model.set_paths(images, is_sorted=True)
+        self.img_count = len(images)
+        self.start_annotation_index()
+        self.status("Found %d images in %s, saving to %s" % (self.img_count, name, save_dir))
         self.open_next_image()
-        for imgPath in self.m_img_list:
-            item = QListWidgetItem(imgPath)
-            self.file_list_widget.addItem(item)
+
+    def close_image_source(self):
+        if self.image_source is not None:
+            self.image_cache.clear()
+            self.image_source.close()
+            self.image_source = None
 
     def verify_image(self, _value=False):
         # Proceeding next image without dialog if having any label
@@ -1394,17 +1900,20 @@ class MainWindow(QMainWindow, WindowMixin):
             self.paint_canvas()
             self.save_file()
 
-    def open_prev_image(self, _value=False):
-        # Proceeding prev image without dialog if having any label
+    def may_switch_image(self):
+        # Proceeding to another image without dialog if having any label
         if self.auto_saving.isChecked():
             if self.default_save_dir is not None:
                 if self.dirty is True:
                     self.save_file()
             else:
                 self.change_save_dir_dialog()
-                return
+                return False
 
-        if not self.may_continue():
+        return self.may_continue()
+
+    def open_prev_image(self, _value=False):
+        if not self.may_switch_image():
             return
 
         if self.img_count <= 0:
@@ -1420,16 +1929,7 @@ class MainWindow(QMainWindow, WindowMixin):
                 self.load_file(filename)
 
     def open_next_image(self, _value=False):
-        # Proceeding next image without dialog if having any label
-        if self.auto_saving.isChecked():
-            if self.default_save_dir is not None:
-                if self.dirty is True:
-                    self.save_file()
-            else:
-                self.change_save_dir_dialog()
-                return
-
-        if not self.may_continue():
+        if not self.may_switch_image():
             return
 
         if self.img_count <= 0:
@@ -1450,6 +1950,23 @@ class MainWindow(QMainWindow, WindowMixin):
         if filename:
             self.load_file(filename)
 
+    def open_next_unlabelled_image(self, _value=False):
+        if self.annotation_index is None or not self.m_img_list:
+            return
+        start = self.cur_img_idx + 1 if self.file_path is not None else 0
+        for index in range(start, self.img_count):
+            status = self.annotation_index.get(self.m_img_list[index])
+            if status is None or status.box_count == 0:
+                break
+        else:
+            self.status('No unlabelled image after this one')
+            return
+
+        if not self.may_switch_image():
+            return
+        self.cur_img_idx = index
+        self.load_file(self.m_img_list[index])
+
     def open_file(self, _value=False):
         if not self.may_continue():
             return
@@ -1481,7 +1998,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def save_file_as(self, _value=False):
         assert not self.image.isNull(), "cannot save empty image"
-        self._save_file(self.save_file_dialog())
+        # The picked database keeps its name, records inside it are keyed by image
+        self._save_file(self.save_file_dialog(remove_ext=self.label_file_format != LabelFileFormat.SQLITE))
 
     def save_file_dialog(self, remove_ext=True):
         caption = '%s - Choose File' % __appname__
@@ -1504,8 +2022,6 @@ class MainWindow(QMainWindow, WindowMixin):
     def _save_file(self, annotation_file_path):
         if annotation_file_path and self.save_labels(annotation_file_path):
             self.set_clean()
-            self.statusBar().showMessage('Saved to  %s' % annotation_file_path)
-            self.statusBar().show()
 
     def close_file(self, _value=False):
         if not self.may_continue():
@@ -1519,10 +2035,13 @@ class MainWindow(QMainWindow, WindowMixin):
     def delete_image(self):
         delete_path = self.file_path
         if delete_path is not None:
+            if self.image_source_for(delete_path) is not None:
+                self.status("%s is read only" % self.image_source.root)
+                return
             idx = self.cur_img_idx
             if os.path.exists(delete_path):
                 os.remove(delete_path)
-            self.import_dir_images(self.last_open_dir)
+            self.remove_image_files([delete_path])
             if self.img_count > 0:
                 self.cur_img_idx = min(idx, self.img_count - 1)
                 filename = self.m_img_list[self.cur_img_idx]
@@ -1530,6 +2049,35 @@ class MainWindow(QMainWindow, WindowMixin):
             else:
                 self.close_file()
 
+    def add_image_files(self, paths):
+        """List new images at their sorted positions, without rescanning the directory."""
+        added = self.file_list_model.insert_paths(paths)
+        self.image_files_changed(added)
+        return added
+
+    def remove_image_files(self, paths):
+        """Drop images from the list, e.g. after they were deleted."""
+        removed = self.file_list_model.remove_paths(paths)
+        self.image_files_changed(removed)
+        return removed
+
+    def image_files_changed(self, paths):
+        if not paths:
+            return
+        self.img_count = len(self.m_img_list)
+        if self.file_path is not None:
+            row = self.file_list_model.row_of(self.file_path)
+            if row is not None:
+                self.cur_img_idx = row
+                self.file_list_view.setCurrentIndex(self.file_list_model.index(row))
+        if self.annotation_index is not None:
+            for path in paths:
+                if self.file_list_model.row_of(path) is None:
+                    self.annotation_index.forget(path)
+                else:
+                    self.annotation_index.update(path)
+        self.update_progress()
+
     def reset_all(self):
         self.settings.reset()
         self.close()
@@ -1624,7 +2172,13 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.set_format(FORMAT_PASCALVOC)
 
-        t_voc_parse_reader = PascalVocReader(xml_path)
+        try:
+            t_voc_parse_reader = PascalVocReader(xml_path)
+        except PascalVocParseError as e:
+            self.error_message(u'Error reading annotation file',
+                               u'<p>Make sure <i>%s</i> is a valid Pascal VOC file.</p><p>%s</p>' % (xml_path, e))
+            self.status("Error reading %s" % xml_path)
+            return
         shapes = t_voc_parse_reader.get_shapes()
         self.load_labels(shapes)
         self.canvas.verified = t_voc_parse_reader.verified
@@ -1655,9 +2209,27 @@ class MainWindow(QMainWindow, WindowMixin):
         self.load_labels(shapes)
         self.canvas.verified = create_ml_parse_reader.verified
 
+    def load_sqlite_by_filename(self, db_path, file_path):
+        """Load the record of file_path from the database at db_path, return False if it has none."""
+        if self.file_path is None or not os.path.isfile(db_path):
+            return False
+        try:
+            sqlite_reader = SQLiteReader(db_path, file_path)
+        except AnnotationDatabaseError as e:
+            self.error_message(u'Error reading annotation database', u'<p>%s</p>' % e)
+            self.status("Error reading %s" % db_path)
+            return False
+        if not sqlite_reader.found:
+            return False
+
+        self.set_format(FORMAT_SQLITE)
+        self.load_labels(sqlite_reader.get_shapes())
+        self.canvas.verified = sqlite_reader.verified
+        return True
+
     def copy_previous_bounding_boxes(self):
-        current_index = self.m_img_list.index(self.file_path)
-        if current_index - 1 >= 0:
+        current_index = self.file_list_model.row_of(self.file_path)
+        if current_index is not None and current_index - 1 >= 0:
             prev_file_path = self.m_img_list[current_index - 1]
             self.show_bounding_box_from_annotation_file(prev_file_path)
             self.save_file()
@@ -1673,15 +2245,6 @@ def inverted(color):
     return QColor(*[255 - v for v in color.getRgb()])
 
 
-def read(filename, default=None):
-    try:
-        reader = QImageReader(filename)
-        reader.setAutoTransform(True)
-        return reader.read()
-    except:
-        return default
-
-
 def get_main_app(argv=None):
     """
     Standard boilerplate Qt application code.
@@ -1689,7 +2252,8 @@ def get_main_app(argv=None):
     """
     if not argv:
         argv = []
-    app = QApplication(argv)
+    # Reuse a running application, e.g. between tests: Qt allows only one
+    app = QApplication.instance() or QApplication(argv)
     app.setApplicationName(__appname__)
     app.setWindowIcon(new_icon("app"))
     # Tzutalin 201705+: Accept extra agruments to change predefined class file
@@ -1699,16 +2263,21 @@ def get_main_app(argv=None):
                            default=os.path.join(os.path.dirname(__file__), "data", "predefined_classes.txt"),
                            nargs="?")
     argparser.add_argument("save_dir", nargs="?")
+    argparser.add_argument("--label-colors",
+                           default=os.path.join(os.path.dirname(__file__), "data", "label_colors.txt"),
+                           help="file of fixed label colors, one 'label #rrggbb' per line")
     args = argparser.parse_args(argv[1:])
 
     args.image_dir = args.image_dir and os.path.normpath(args.image_dir)
     args.class_file = args.class_file and os.path.normpath(args.class_file)
     args.save_dir = args.save_dir and os.path.normpath(args.save_dir)
+    args.label_colors = args.label_colors and os.path.normpath(args.label_colors)
 
-    # Usage : labelImg.py image classFile saveDir
+    # Usage : labelImg.py image classFile saveDir [--label-colors file]
     win = MainWindow(args.image_dir,
                      args.class_file,
-                     args.save_dir)
+                     args.save_dir,
+                     args.label_colors)
     win.show()
     return app, win
 
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+try:
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QThread, pyqtSignal
+
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_SQLITE
+from libs.create_ml_io import CreateMLStore, JSON_EXT, JOURNAL_EXT, load_create_ml_index
+from libs.dir_scanner import MANIFEST_DIR
+from libs.pascal_voc_io import PascalVocParseError, XML_EXT, parse_voc_file
+from libs.sqlite_io import AnnotationDatabase, AnnotationDatabaseError, DATABASE_FILE, load_database_statuses
+from libs.yolo_io import TXT_EXT
+
+INDEX_VERSION = 1
+BATCH_SIZE = 1000
+
+# Same priority as MainWindow.show_bounding_box_from_annotation_file, after the database
+ANNOTATION_EXTENSIONS = ((FORMAT_PASCALVOC, XML_EXT), (FORMAT_YOLO, TXT_EXT), (FORMAT_CREATEML, JSON_EXT))
+
+AnnotationStatus = namedtuple('AnnotationStatus', ['format', 'box_count', 'verified', 'mtime'])
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _read_status(annotation_format, annotation_path, image_path, mtime):
+    if annotation_format == FORMAT_PASCALVOC:
+        verified, boxes = parse_voc_file(annotation_path)
+        return AnnotationStatus(annotation_format, len(boxes), verified, mtime)
+    if annotation_format == FORMAT_YOLO:
+        with open(annotation_path, 'r') as bnd_box_file:
+            box_count = sum(1 for line in bnd_box_file if line.strip())
+        return AnnotationStatus(annotation_format, box_count, False, mtime)
+    store = CreateMLStore.get_open(annotation_path)
+    if store is not None:
+        image = store.get(os.path.basename(image_path))
+    else:
+        image = load_create_ml_index(annotation_path).get(os.path.basename(image_path))
+    if image is None:
+        return None
+    return AnnotationStatus(annotation_format, len(image['annotations']), image.get('verified', False), mtime)
+
+
+class AnnotationIndex(object):
+    """
+    Annotation status of every image of a directory: format, box count, verified
+    flag and the mtime of the annotation file, so the GUI can tell labelled from
+    unlabelled images without opening them. Saved under ~/.labelImgCache and
+    refreshed by mtime, so only changed annotation files are parsed again.
+    """
+
+    def __init__(self, image_dir, save_dir=None, index_dir=MANIFEST_DIR):
+        self.image_dir = os.path.abspath(image_dir)
+        self.save_dir = os.path.abspath(save_dir) if save_dir else None
+        self.index_dir = index_dir
+        self.labelled_count = 0
+        self.verified_count = 0
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self):
+        key = '%s\0%s' % (self.image_dir, self.save_dir or '')
+        digest = hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+        return os.path.join(self.index_dir, 'status-%s.json' % digest)
+
+    def annotation_paths(self, image_path):
+        base = os.path.splitext(image_path)[0]
+        if self.save_dir:
+            base = os.path.join(self.save_dir, os.path.basename(base))
+        # The database holds the whole directory, the image is a record in it
+        paths = [(FORMAT_SQLITE, os.path.join(os.path.dirname(base), DATABASE_FILE))]
+        return paths + [(annotation_format, base + ext) for annotation_format, ext in ANNOTATION_EXTENSIONS]
+
+    def get(self, image_path):
+        """AnnotationStatus of image_path, or None if it has no annotation file."""
+        return self._statuses.get(image_path)
+
+    def __len__(self):
+        return len(self._statuses)
+
+    def _set(self, image_path, status):
+        # Caller holds the lock
+        old = self._statuses.pop(image_path, None)
+        if old is not None:
+            self.labelled_count -= old.box_count > 0
+            self.verified_count -= bool(old.verified)
+        if status is not None:
+            self._statuses[image_path] = status
+            self.labelled_count += status.box_count > 0
+            self.verified_count += bool(status.verified)
+
+    def update(self, image_path, listing=None):
+        """
+        Re-read the status of image_path if its annotation file changed.
+        listing maps a directory to the names it contains, to avoid a stat per missing file.
+        Return True if the status changed.
+        """
+        found = None
+        for annotation_format, annotation_path in self.annotation_paths(image_path):
+            if listing is not None:
+                directory, name = os.path.split(annotation_path)
+                if name not in listing(directory):
+                    continue
+            mtime = _file_mtime(annotation_path)
+            if mtime is None:
+                continue
+            if annotation_format == FORMAT_SQLITE:
+                database_status = self._database_status(annotation_path, image_path, bulk=listing is not None)
+                if database_status is None:
+                    continue
+                # Any save changes the database, compare the record itself
+                status = AnnotationStatus(FORMAT_SQLITE, database_status[0], database_status[1], mtime)
+                with self._lock:
+                    old = self._statuses.get(image_path)
+                    if old is not None and old[:3] == status[:3]:
+                        return False
+                    self._set(image_path, status)
+                return True
+            if annotation_format == FORMAT_CREATEML:
+                # Saves to an open dataset go to its journal first
+                mtime = max(mtime, _file_mtime(annotation_path + JOURNAL_EXT) or 0)
+            found = annotation_format, annotation_path, mtime
+            break
+
+        old = self._statuses.get(image_path)
+        if found is None:
+            status = None
+        elif old is not None and old.format == found[0] and old.mtime == found[2]:
+            return False
+        else:
+            try:
+                status = _read_status(found[0], found[1], image_path, found[2])
+            except (PascalVocParseError, OSError, ValueError, KeyError):
+                status = None
+        with self._lock:
+            if old == status:
+                return False
+            self._set(image_path, status)
+        return True
+
+    @staticmethod
+    def _database_status(db_path, image_path, bulk):
+        # A refresh of many images reads every record of the database in one query
+        filename = os.path.basename(image_path)
+        try:
+            if bulk:
+                return load_database_statuses(db_path).get(filename)
+            return AnnotationDatabase.open(db_path).status(filename)
+        except (AnnotationDatabaseError, sqlite3.Error, OSError):
+            return None
+
+    def forget(self, image_path):
+        """Drop image_path, e.g. after it was removed from the list."""
+        with self._lock:
+            self._set(image_path, None)
+
+    def refresh(self, image_paths, should_stop=None, on_changed=None):
+        """
+        Bring the statuses of image_paths up to date and forget images no longer listed.
+        on_changed receives batches of image paths whose status changed.
+        """
+        listed = set(image_paths)
+        with self._lock:
+            for image_path in [path for path in self._statuses if path not in listed]:
+                self._set(image_path, None)
+
+        listings = {}
+
+        def listing(directory):
+            names = listings.get(directory)
+            if names is None:
+                try:
+                    names = listings[directory] = frozenset(os.listdir(directory))
+                except OSError:
+                    names = listings[directory] = frozenset()
+            return names
+
+        changed = []
+        for image_path in image_paths:
+            if should_stop is not None and should_stop():
+                return False
+            if self.update(image_path, listing):
+                changed.append(image_path)
+                if on_changed is not None and len(changed) >= BATCH_SIZE:
+                    on_changed(changed)
+                    changed = []
+        if on_changed is not None and changed:
+            on_changed(changed)
+        return True
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION or data.get('image_dir') != self.image_dir \
+                    or data.get('save_dir') != self.save_dir:
+                return False
+            statuses = dict((os.path.normpath(os.path.join(self.image_dir, rel_path)), AnnotationStatus(*status))
+                            for rel_path, status in data['images'].items())
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        with self._lock:
+            self._statuses = {}
+            self.labelled_count = self.verified_count = 0
+            for image_path, status in statuses.items():
+                self._set(image_path, status)
+        return True
+
+    def save(self):
+        with self._lock:
+            images = dict((os.path.relpath(image_path, self.image_dir), list(status))
+                          for image_path, status in self._statuses.items())
+        data = {'version': INDEX_VERSION, 'image_dir': self.image_dir, 'save_dir': self.save_dir, 'images': images}
+        try:
+            if not os.path.isdir(self.index_dir):
+                os.makedirs(self.index_dir)
+            with open(self.index_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(self.index_path + '.tmp', self.index_path)
+        except OSError:
+            # The index is only a cache
+            pass
+
+
+class AnnotationIndexer(QThread):
+    """
+    Refreshes an AnnotationIndex in the background and saves it when done.
+    statusChanged delivers batches of image paths whose status changed.
+    """
+    statusChanged = pyqtSignal(list)
+
+    def __init__(self, index, image_paths, parent=None):
+        super(AnnotationIndexer, self).__init__(parent)
+        self.index = index
+        self.image_paths = list(image_paths)
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        if self.index.refresh(self.image_paths, lambda: self._cancelled, self.statusChanged.emit):
+            self.index.save()
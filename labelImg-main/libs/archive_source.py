@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import hashlib
+import json
+import os
+import struct
+import tarfile
+import threading
+import zipfile
+import zlib
+
+from libs.image_source import ImageSource, ImageSourceError, member_name
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar')
+INDEX_VERSION = 1
+
+_ZIP_LOCAL_HEADER = b'PK\x03\x04'
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def archive_labels_dir(archive_path):
+    """Where annotations of the images in archive_path go unless a save dir is set."""
+    return os.path.splitext(os.path.abspath(archive_path))[0] + '_labels'
+
+
+def _zip_members(archive_path):
+    members = {}
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            name = member_name(info.filename)
+            if name is None or info.filename.endswith('/'):
+                continue
+            method = info.compress_type if not info.flag_bits & 0x1 else -1
+            members[name] = [info.header_offset, method, info.compress_size, info.file_size]
+    return members
+
+
+def _tar_members(archive_path):
+    members = {}
+    try:
+        # Only an uncompressed tar can be read at an offset
+        archive = tarfile.open(archive_path, 'r:')
+    except tarfile.ReadError:
+        raise ImageSourceError('%s is compressed; random access needs a plain .tar or a .zip' % archive_path)
+    with archive:
+        for info in archive:
+            name = member_name(info.name)
+            if name is None or not info.isreg() or getattr(info, 'sparse', None):
+                continue
+            members[name] = [info.offset_data, zipfile.ZIP_STORED, info.size, info.size]
+    return members
+
+
+def index_path(archive_path, index_dir):
+    digest = hashlib.sha1(os.path.abspath(archive_path).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(index_dir, 'archive-%s.json' % digest)
+
+
+def load_index(archive_path, index_dir):
+    """The member index saved for archive_path, or None if there is none or the archive changed."""
+    stat = os.stat(archive_path)
+    try:
+        with open(index_path(archive_path, index_dir), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != INDEX_VERSION or index.get('archive') != os.path.abspath(archive_path) \
+                or index.get('size') != stat.st_size or index.get('mtime') != stat.st_mtime_ns:
+            return None
+        return index['members']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_index(archive_path, index_dir, members):
+    stat = os.stat(archive_path)
+    index = {
+        'version': INDEX_VERSION,
+        'archive': os.path.abspath(archive_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'members': members,
+    }
+    target = index_path(archive_path, index_dir)
+    try:
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        with open(target + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(target + '.tmp', target)
+    except OSError:
+        # The index is only a cache
+        pass
+
+
+class ArchiveSource(ImageSource):
+    """
+    The members of a .zip or plain .tar archive, without extracting it. The
+    member index, with the offset of every member, is built once from the
+    archive's central directory or headers and kept in index_dir, so opening
+    the archive again does not read them. Members are then read with positional
+    reads at their offset, which is safe from several threads.
+    """
+
+    def __init__(self, archive_path, index_dir=None):
+        super(ArchiveSource, self).__init__(archive_path, index_dir)
+        self.labels_dir = archive_labels_dir(self.root)
+        if not os.path.isfile(self.root):
+            raise ImageSourceError('%s is not a file' % archive_path)
+        self.is_zip = zipfile.is_zipfile(self.root)
+        if not self.is_zip and not tarfile.is_tarfile(self.root):
+            raise ImageSourceError('%s is not a zip or tar archive' % archive_path)
+        self.members = index_dir and load_index(self.root, index_dir)
+        if self.members is None:
+            try:
+                self.members = _zip_members(self.root) if self.is_zip else _tar_members(self.root)
+            except (zipfile.BadZipfile, tarfile.TarError, OSError) as e:
+                raise ImageSourceError('Cannot read %s: %s' % (archive_path, e))
+            if index_dir:
+                save_index(self.root, index_dir, self.members)
+        self._stat = os.stat(self.root)
+        self._fd = os.open(self.root, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        self._lock = threading.Lock()
+
+    def _name(self, path):
+        if not self.owns(path):
+            return None
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def path_of(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def list_images(self, extensions):
+        return [self.path_of(name) for name in self.members if os.path.splitext(name)[1].lower() in extensions]
+
+    def exists(self, path):
+        return self._name(path) in self.members
+
+    def signature(self, path):
+        name = self._name(path)
+        if name not in self.members:
+            return None
+        return self._stat.st_mtime_ns, self._stat.st_size, self.members[name][0]
+
+    def _pread(self, size, offset):
+        if self._fd is None:
+            raise ImageSourceError('%s is closed' % self.root)
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+        with self._lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, size)
+
+    def read(self, path):
+        name = self._name(path)
+        member = self.members.get(name)
+        if member is None:
+            raise ImageSourceError('%s is not in %s' % (name, self.root))
+        offset, method, compressed_size, size = member
+        try:
+            if self.is_zip:
+                header = self._pread(_ZIP_LOCAL_HEADER_SIZE, offset)
+                if len(header) != _ZIP_LOCAL_HEADER_SIZE or header[:4] != _ZIP_LOCAL_HEADER:
+                    raise ImageSourceError('Bad local header for %s in %s' % (name, self.root))
+                name_size, extra_size = struct.unpack('<HH', header[26:30])
+                offset += _ZIP_LOCAL_HEADER_SIZE + name_size + extra_size
+            if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                # Rare methods and encrypted members go through zipfile
+                with self._lock, zipfile.ZipFile(self.root) as archive:
+                    return archive.read(name)
+            data = self._pread(compressed_size, offset)
+            if method == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+        except (OSError, zlib.error, zipfile.BadZipfile, RuntimeError, KeyError) as e:
+            raise ImageSourceError('Cannot read %s from %s: %s' % (name, self.root, e))
+        if len(data) != size:
+            raise ImageSourceError('Truncated %s in %s' % (name, self.root))
+        return data
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -10,6 +10,8 @@ except ImportError:
 # from PyQt4.QtOpenGL import *
 
 from libs.shape import Shape
+from libs.spatial_index import GridIndex
+from libs.tiled_image import TiledImage
 from libs.utils import distance
 
 CURSOR_DEFAULT = Qt.ArrowCursor
@@ -51,7 +53,14 @@ class Canvas(QWidget):
         self.overlay_color = None
         self.label_font_size = 8
         self.pixmap = QPixmap()
+        # Brightness adjusted pixmap, keyed by (pixmap.cacheKey(), overlay rgba)
+        self._overlay_key = None
+        self._overlay_pixmap = None
         self.visible = {}
+        # Grid over the shapes' bounding rects for hit-testing, see shapes_near
+        self._shape_index = None
+        self._shape_index_key = None
+        self._shape_order = {}
         self._hide_background = False
         self.hide_background = False
         self.h_shape = None
@@ -121,6 +130,7 @@ class Canvas(QWidget):
         # Polygon drawing.
         if self.drawing():
             self.override_cursor(CURSOR_DRAW)
+            dirty = self.crosshair_region(self.prev_point) + self.shapes_region(self.current, self.line)
             if self.current:
                 # Display annotation width and height while drawing
                 current_width = abs(self.current[0].x() - pos.x())
@@ -161,26 +171,28 @@ class Canvas(QWidget):
                 self.current.highlight_clear()
             else:
                 self.prev_point = pos
-            self.repaint()
+            self.update(dirty + self.crosshair_region(self.prev_point) + self.shapes_region(self.current, self.line))
             return
 
         # Polygon copy moving.
         if Qt.RightButton & ev.buttons():
             if self.selected_shape_copy and self.prev_point:
                 self.override_cursor(CURSOR_MOVE)
+                dirty = self.shapes_region(self.selected_shape_copy)
                 self.bounded_move_shape(self.selected_shape_copy, pos)
-                self.repaint()
+                self.update(dirty + self.shapes_region(self.selected_shape_copy))
             elif self.selected_shape:
                 self.selected_shape_copy = self.selected_shape.copy()
-                self.repaint()
+                self.update(self.shapes_region(self.selected_shape_copy))
             return
 
         # Polygon/Vertex moving.
         if Qt.LeftButton & ev.buttons():
             if self.selected_vertex():
+                dirty = self.shapes_region(self.h_shape)
                 self.bounded_move_vertex(pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.update(dirty + self.shapes_region(self.h_shape))
 
                 # Display annotation width and height while moving vertex
                 point1 = self.h_shape[1]
@@ -191,9 +203,10 @@ class Canvas(QWidget):
                         'Width: %d, Height: %d / X: %d; Y: %d' % (current_width, current_height, pos.x(), pos.y()))
             elif self.selected_shape and self.prev_point:
                 self.override_cursor(CURSOR_MOVE)
+                dirty = self.shapes_region(self.selected_shape)
                 self.bounded_move_shape(self.selected_shape, pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.update(dirty + self.shapes_region(self.selected_shape))
 
                 # Display annotation width and height while moving shape
                 point1 = self.selected_shape[1]
@@ -215,8 +228,8 @@ class Canvas(QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         self.setToolTip("Image")
-        priority_list = self.shapes + ([self.selected_shape] if self.selected_shape else [])
-        for shape in reversed([s for s in priority_list if self.isVisible(s)]):
+        previous = self.h_shape
+        for shape in self.shapes_near(pos, self.epsilon):
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
             index = shape.nearest_vertex(pos, self.epsilon)
@@ -228,7 +241,7 @@ class Canvas(QWidget):
                 self.override_cursor(CURSOR_POINT)
                 self.setToolTip("Click & drag to move point")
                 self.setStatusTip(self.toolTip())
-                self.update()
+                self.update(self.shapes_region(previous, shape))
                 break
             elif shape.contains_point(pos):
                 if self.selected_vertex():
@@ -238,7 +251,7 @@ class Canvas(QWidget):
                     "Click & drag to move shape '%s'" % shape.label)
                 self.setStatusTip(self.toolTip())
                 self.override_cursor(CURSOR_GRAB)
-                self.update()
+                self.update(self.shapes_region(previous, shape))
 
                 # Display annotation width and height while hovering inside
                 point1 = self.h_shape[1]
@@ -251,7 +264,7 @@ class Canvas(QWidget):
         else:  # Nothing found, clear highlights, reset state.
             if self.h_shape:
                 self.h_shape.highlight_clear()
-                self.update()
+                self.update(self.shapes_region(self.h_shape))
             self.h_vertex, self.h_shape = None, None
             self.override_cursor(CURSOR_DEFAULT)
 
@@ -309,6 +322,7 @@ class Canvas(QWidget):
             self.repaint()
         else:
             self.selected_shape.points = [p for p in shape.points]
+            self.update_shape_index(self.selected_shape)
         self.selected_shape_copy = None
 
     def hide_background_shapes(self, value):
@@ -368,13 +382,50 @@ class Canvas(QWidget):
             shape.highlight_vertex(index, shape.MOVE_VERTEX)
             self.select_shape(shape)
             return self.h_vertex
-        for shape in reversed(self.shapes):
-            if self.isVisible(shape) and shape.contains_point(point):
+        for shape in self.shapes_near(point):
+            if shape.contains_point(point):
                 self.select_shape(shape)
                 self.calculate_offsets(shape, point)
                 return self.selected_shape
         return None
 
+    def invalidate_shape_index(self):
+        self._shape_index = None
+
+    def shape_index(self):
+        # Rebuilt when the shape list changes; moved shapes are updated in place
+        key = (id(self.shapes), len(self.shapes))
+        if self._shape_index is None or self._shape_index_key != key:
+            self._shape_index = GridIndex()
+            self._shape_index_key = key
+            self._shape_order = {}
+            for i, shape in enumerate(self.shapes):
+                self._shape_order[shape] = i
+                self._index_shape(shape)
+        return self._shape_index
+
+    def _index_shape(self, shape):
+        if shape.points:
+            rect = shape.bounding_rect()
+            self._shape_index.insert(shape, rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def update_shape_index(self, shape):
+        if self._shape_index is not None and shape in self._shape_index:
+            self._index_shape(shape)
+
+    def shapes_near(self, point, margin=0):
+        """
+        Visible shapes whose bounding rect is within margin of point, in hit-testing
+        priority: the selected shape, then the others from the top down.
+        """
+        index = self.shape_index()
+        candidates = index.query(point.x() - margin, point.y() - margin, point.x() + margin, point.y() + margin)
+        shapes = sorted(candidates, key=self._shape_order.get, reverse=True)
+        if self.selected_shape in candidates:
+            shapes.remove(self.selected_shape)
+            shapes.insert(0, self.selected_shape)
+        return [shape for shape in shapes if self.isVisible(shape)]
+
     def calculate_offsets(self, shape, point):
         rect = shape.bounding_rect()
         x1 = rect.x() - point.x()
@@ -432,6 +483,7 @@ class Canvas(QWidget):
             right_shift = QPointF(0, shift_pos.y())
         shape.move_vertex_by(right_index, right_shift)
         shape.move_vertex_by(left_index, left_shift)
+        self.update_shape_index(shape)
 
     def bounded_move_shape(self, shape, pos):
         if self.out_of_pixmap(pos):
@@ -451,6 +503,7 @@ class Canvas(QWidget):
         dp = pos - self.prev_point
         if dp:
             shape.move_by(dp)
+            self.update_shape_index(shape)
             self.prev_point = pos
             return True
         return False
@@ -468,6 +521,7 @@ class Canvas(QWidget):
             shape = self.selected_shape
             self.un_highlight(shape)
             self.shapes.remove(self.selected_shape)
+            self.invalidate_shape_index()
             self.selected_shape = None
             self.update()
             return shape
@@ -505,19 +559,34 @@ class Canvas(QWidget):
         p.scale(self.scale, self.scale)
         p.translate(self.offset_to_center())
 
-        temp = self.pixmap
-        if self.overlay_color:
-            temp = QPixmap(self.pixmap)
-            painter = QPainter(temp)
-            painter.setCompositionMode(painter.CompositionMode_Overlay)
-            painter.fillRect(temp.rect(), self.overlay_color)
-            painter.end()
-
-        p.drawPixmap(0, 0, temp)
+        # The part of the image under the update region. Qt clips painting to the
+        # region, so anything outside of it can be skipped.
+        exposed = QRectF(self.transform_pos(QPointF(event.rect().topLeft())),
+                         self.transform_pos(QPointF(event.rect().bottomRight() + QPoint(1, 1))))
+        partial = not exposed.contains(QRectF(self.pixmap.rect()))
+        if isinstance(self.pixmap, TiledImage):
+            # Only the exposed part, at the resolution the zoom needs
+            exposed = exposed.intersected(QRectF(self.pixmap.rect()))
+            self.pixmap.paint(p, exposed, self.scale)
+            if self.overlay_color:
+                p.setCompositionMode(QPainter.CompositionMode_Overlay)
+                p.fillRect(exposed, self.overlay_color)
+                p.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        else:
+            pixmap = self.overlay_pixmap() if self.overlay_color else self.pixmap
+            if partial:
+                # A pixel of slack keeps smooth scaling at the edges of the source
+                # rect out of the clipped area.
+                source = QRectF(exposed.toAlignedRect().adjusted(-1, -1, 1, 1)).intersected(QRectF(pixmap.rect()))
+                p.drawPixmap(source, pixmap, source)
+            else:
+                p.drawPixmap(0, 0, pixmap)
         Shape.scale = self.scale
         Shape.label_font_size = self.label_font_size
         for shape in self.shapes:
             if (shape.selected or not self._hide_background) and self.isVisible(shape):
+                if partial and not shape.paint_rect().intersects(exposed):
+                    continue
                 shape.fill = shape.selected or shape == self.h_shape
                 shape.paint(p)
         if self.current:
@@ -554,6 +623,44 @@ class Canvas(QWidget):
 
         p.end()
 
+    def widget_rect(self, rect):
+        """Convert a rect in image coordinates to the widget pixels it covers."""
+        offset = self.offset_to_center()
+        widget = QRectF((rect.topLeft() + offset) * self.scale, (rect.bottomRight() + offset) * self.scale)
+        # Antialiasing may touch the pixel next to the edge
+        return widget.toAlignedRect().adjusted(-1, -1, 1, 1)
+
+    def shapes_region(self, *shapes):
+        """The widget area the given shapes are painted on, None entries are skipped."""
+        region = QRegion()
+        for shape in shapes:
+            if shape is not None and shape.points:
+                region += self.widget_rect(shape.paint_rect())
+        return region
+
+    def crosshair_region(self, point):
+        """The two lines of the drawing crosshair through point."""
+        if point.isNull() or not self.pixmap:
+            return QRegion()
+        line_width = 1.0 / self.scale
+        region = QRegion(self.widget_rect(QRectF(int(point.x()) - line_width, 0,
+                                                 2 * line_width, self.pixmap.height())))
+        return region + self.widget_rect(QRectF(0, int(point.y()) - line_width,
+                                                self.pixmap.width(), 2 * line_width))
+
+    def overlay_pixmap(self):
+        """The pixmap with the brightness overlay applied, composed once per pixmap and color."""
+        key = (self.pixmap.cacheKey(), self.overlay_color.rgba())
+        if key != self._overlay_key:
+            temp = QPixmap(self.pixmap)
+            painter = QPainter(temp)
+            painter.setCompositionMode(painter.CompositionMode_Overlay)
+            painter.fillRect(temp.rect(), self.overlay_color)
+            painter.end()
+            self._overlay_key = key
+            self._overlay_pixmap = temp
+        return self._overlay_pixmap
+
     def transform_pos(self, point):
         """Convert from widget-logical coordinates to painter-logical coordinates."""
         return point / self.scale - self.offset_to_center()
@@ -645,31 +752,11 @@ class Canvas(QWidget):
             self.move_one_pixel('Down')
 
     def move_one_pixel(self, direction):
-        # print(self.selectedShape.points)
-        if direction == 'Left' and not self.move_out_of_bound(QPointF(-1.0, 0)):
-            # print("move Left one pixel")
-            self.selected_shape.points[0] += QPointF(-1.0, 0)
-            self.selected_shape.points[1] += QPointF(-1.0, 0)
-            self.selected_shape.points[2] += QPointF(-1.0, 0)
-            self.selected_shape.points[3] += QPointF(-1.0, 0)
-        elif direction == 'Right' and not self.move_out_of_bound(QPointF(1.0, 0)):
-            # print("move Right one pixel")
-            self.selected_shape.points[0] += QPointF(1.0, 0)
-            self.selected_shape.points[1] += QPointF(1.0, 0)
-            self.selected_shape.points[2] += QPointF(1.0, 0)
-            self.selected_shape.points[3] += QPointF(1.0, 0)
-        elif direction == 'Up' and not self.move_out_of_bound(QPointF(0, -1.0)):
-            # print("move Up one pixel")
-            self.selected_shape.points[0] += QPointF(0, -1.0)
-            self.selected_shape.points[1] += QPointF(0, -1.0)
-            self.selected_shape.points[2] += QPointF(0, -1.0)
-            self.selected_shape.points[3] += QPointF(0, -1.0)
-        elif direction == 'Down' and not self.move_out_of_bound(QPointF(0, 1.0)):
-            # print("move Down one pixel")
-            self.selected_shape.points[0] += QPointF(0, 1.0)
-            self.selected_shape.points[1] += QPointF(0, 1.0)
-            self.selected_shape.points[2] += QPointF(0, 1.0)
-            self.selected_shape.points[3] += QPointF(0, 1.0)
+        step = {'Left': QPointF(-1.0, 0), 'Right': QPointF(1.0, 0),
+                'Up': QPointF(0, -1.0), 'Down': QPointF(0, 1.0)}[direction]
+        if not self.move_out_of_bound(step):
+            self.selected_shape.move_by(step)
+        self.update_shape_index(self.selected_shape)
         self.shapeMoved.emit()
         self.repaint()
 
@@ -706,12 +793,24 @@ class Canvas(QWidget):
         self.update()
 
     def load_pixmap(self, pixmap):
+        self.release_pixmap()
         self.pixmap = pixmap
+        if isinstance(pixmap, TiledImage):
+            pixmap.tileReady.connect(self.update)
         self.shapes = []
         self.repaint()
 
+    def release_pixmap(self):
+        if isinstance(self.pixmap, TiledImage):
+            self.pixmap.tileReady.disconnect(self.update)
+            self.pixmap.close()
+        self.pixmap = None
+        self._overlay_key = None
+        self._overlay_pixmap = None
+
     def load_shapes(self, shapes):
         self.shapes = list(shapes)
+        self.invalidate_shape_index()
         self.current = None
         self.repaint()
 
@@ -719,6 +818,11 @@ class Canvas(QWidget):
         self.visible[shape] = value
         self.repaint()
 
+    def set_shapes_visible(self, shapes, value):
+        for shape in shapes:
+            self.visible[shape] = value
+        self.update()
+
     def current_cursor(self):
         cursor = QApplication.overrideCursor()
         if cursor is not None:
@@ -741,7 +845,7 @@ class Canvas(QWidget):
         self.selected_shape_copy = None
 
         self.restore_cursor()
-        self.pixmap = None
+        self.release_pixmap()
         self.update()
 
     def set_drawing_shape_to_square(self, status):
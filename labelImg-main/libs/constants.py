@@ -15,6 +15,8 @@ SETTING_SINGLE_CLASS = 'singleclass'
 FORMAT_PASCALVOC='PascalVOC'
 FORMAT_YOLO='YOLO'
 FORMAT_CREATEML='CreateML'
+FORMAT_SQLITE='SQLite'
 SETTING_DRAW_SQUARE = 'draw/square'
 SETTING_LABEL_FILE_FORMAT= 'labelFileFormat'
+SETTING_WATCH_DIR = 'watchDir'
 DEFAULT_ENCODING = 'utf-8'
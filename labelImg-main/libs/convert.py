@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Headless conversion of annotations between Pascal VOC, YOLO, CreateML and the
+SQLite annotation database.
+
+It only relies on the libs/*_io.py readers and writers and reads image sizes
+from file headers, so it runs on machines without Qt or a display:
+
+    labelimg-convert IMAGE_DIR --from voc --to yolo [--src DIR] [--dst DIR]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_SQLITE
+from libs.create_ml_io import CreateMLWriter, CreateMLStore, JSON_EXT, load_create_ml_index
+from libs.image_size import get_image_size
+from libs.pascal_voc_io import PascalVocWriter, PascalVocParseError, XML_EXT, parse_voc_file
+from libs.sqlite_io import AnnotationDatabase, AnnotationDatabaseError, DB_EXT, database_path
+from libs.yolo_io import YOLOWriter, TXT_EXT, CLASSES_FILE, load_classes, parse_yolo_lines, save_classes
+
+FORMATS = {
+    'voc': FORMAT_PASCALVOC,
+    'yolo': FORMAT_YOLO,
+    'createml': FORMAT_CREATEML,
+    'sqlite': FORMAT_SQLITE,
+}
+FORMAT_EXT = {
+    FORMAT_PASCALVOC: XML_EXT,
+    FORMAT_YOLO: TXT_EXT,
+    FORMAT_CREATEML: JSON_EXT,
+    FORMAT_SQLITE: DB_EXT,
+}
+IMAGE_EXTENSIONS = frozenset(['.bmp', '.gif', '.jpeg', '.jpg', '.pbm', '.pgm', '.png', '.ppm',
+                              '.tif', '.tiff', '.webp'])
+SERIAL_THRESHOLD = 64
+
+
+class ConvertError(Exception):
+    pass
+
+
+def find_images(image_dir):
+    images = []
+    for root, dirs, files in os.walk(image_dir):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS:
+                images.append(os.path.abspath(os.path.join(root, file)))
+    images.sort(key=lambda path: path.lower())
+    return images
+
+
+def annotation_path(image_path, annotation_dir, ext):
+    """Same layout as the GUI: next to the image, or flat inside the annotation dir."""
+    base = os.path.splitext(image_path)[0]
+    if annotation_dir:
+        return os.path.join(annotation_dir, os.path.basename(base) + ext)
+    return base + ext
+
+
+def database_file(image_path, annotation_dir):
+    """The database holding image_path: annotation_dir if it names one, else annotations.db in the directory."""
+    if annotation_dir and annotation_dir.lower().endswith(DB_EXT):
+        return annotation_dir
+    return database_path(annotation_dir or os.path.dirname(image_path))
+
+
+def image_shape(image_path):
+    size = get_image_size(image_path)
+    if size is None:
+        # Formats without a header probe fall back to Qt, which does not need a display
+        try:
+            from PyQt5.QtGui import QImageIOHandler, QImageReader
+        except ImportError:
+            raise ConvertError('cannot read the size of %s' % image_path)
+        reader = QImageReader(image_path)
+        if not reader.canRead():
+            raise ConvertError('cannot read the size of %s' % image_path)
+        qsize = reader.size()
+        size = [qsize.height(), qsize.width(), 3]
+        # The GUI labels images the way they are shown, turned by their orientation tag
+        if reader.transformation() & QImageIOHandler.TransformationRotate90:
+            size[0], size[1] = size[1], size[0]
+    return size
+
+
+def read_annotation(image_path, src_format, src, classes=None):
+    """
+        Return (verified, boxes) for one image or None if it has no annotation.
+        Boxes are (label, x_min, y_min, x_max, y_max, difficult) tuples in pixels.
+    """
+    if src_format == FORMAT_SQLITE:
+        source_file = database_file(image_path, src)
+    elif src_format == FORMAT_CREATEML and src and src.lower().endswith(JSON_EXT):
+        source_file = src
+    else:
+        source_file = annotation_path(image_path, src, FORMAT_EXT[src_format])
+    if not os.path.isfile(source_file):
+        return None
+
+    if src_format == FORMAT_PASCALVOC:
+        return parse_voc_file(source_file)
+
+    if src_format == FORMAT_SQLITE:
+        record = AnnotationDatabase.open(source_file).get(os.path.basename(image_path))
+        return None if record is None else record[:2]
+
+    if src_format == FORMAT_YOLO:
+        if classes is None:
+            classes = load_classes(os.path.join(os.path.dirname(source_file), CLASSES_FILE))[0]
+        with open(source_file, 'r') as bnd_box_file:
+            text = bnd_box_file.read()
+        boxes = [(classes[class_index], x_min, y_min, x_max, y_max, False)
+                 for class_index, x_min, y_min, x_max, y_max
+                 in parse_yolo_lines(text, image_shape(image_path))]
+        return False, boxes
+
+    image = load_create_ml_index(source_file).get(os.path.basename(image_path))
+    if image is None:
+        return None
+    boxes = []
+    for shape in image['annotations']:
+        coordinates = shape['coordinates']
+        x_min = coordinates['x'] - coordinates['width'] / 2
+        y_min = coordinates['y'] - coordinates['height'] / 2
+        boxes.append((shape['label'], x_min, y_min,
+                      x_min + coordinates['width'], y_min + coordinates['height'], False))
+    return image.get('verified', False), boxes
+
+
+def _bnd_box(box):
+    # Same rounding and clamping as LabelFile.convert_points_to_bnd_box
+    label, x_min, y_min, x_max, y_max, difficult = box
+    return int(max(x_min, 1)), int(max(y_min, 1)), int(x_max), int(y_max), label, int(difficult)
+
+
+def _create_ml_writer(image_path, size, verified, boxes, output_file):
+    shapes = [{'label': label, 'points': [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]}
+              for label, x_min, y_min, x_max, y_max, difficult in boxes]
+    writer = CreateMLWriter(os.path.basename(os.path.dirname(image_path)), os.path.basename(image_path),
+                            size, shapes, output_file, local_img_path=image_path)
+    writer.verified = verified
+    return writer
+
+
+def write_annotation(image_path, size, verified, boxes, dst_format, dst, classes=None):
+    target_file = annotation_path(image_path, dst, FORMAT_EXT[dst_format])
+    if dst_format == FORMAT_CREATEML:
+        _create_ml_writer(image_path, size, verified, boxes, target_file).write()
+        return target_file
+
+    folder_name = os.path.basename(os.path.dirname(image_path))
+    if dst_format == FORMAT_PASCALVOC:
+        writer = PascalVocWriter(folder_name, os.path.basename(image_path), size, local_img_path=image_path)
+    else:
+        writer = YOLOWriter(folder_name, os.path.basename(image_path), size, local_img_path=image_path)
+    writer.verified = verified
+    for box in boxes:
+        writer.add_bnd_box(*_bnd_box(box))
+    if dst_format == FORMAT_PASCALVOC:
+        writer.save(target_file=target_file)
+    else:
+        writer.save(class_list=list(classes), target_file=target_file)
+    return target_file
+
+
+def _stored_size(image_path, src):
+    record = AnnotationDatabase.open(database_file(image_path, src)).get(os.path.basename(image_path))
+    return record[2] if record is not None else None
+
+
+def _read_job(job):
+    image_path, src_format, src, classes, need_size = job
+    try:
+        annotation = read_annotation(image_path, src_format, src, classes)
+        if annotation is None:
+            return image_path, None, None, None
+        size = None
+        if need_size:
+            # The database knows the size, no need to open the image
+            size = (src_format == FORMAT_SQLITE and _stored_size(image_path, src)) or image_shape(image_path)
+        return image_path, size, annotation, None
+    except (ConvertError, PascalVocParseError, AnnotationDatabaseError, sqlite3.Error, OSError, ValueError,
+            KeyError, IndexError) as e:
+        return image_path, None, None, str(e) or repr(e)
+
+
+def _write_job(job):
+    image_path, size, (verified, boxes), dst_format, dst, classes = job
+    try:
+        write_annotation(image_path, size, verified, boxes, dst_format, dst, classes)
+        return image_path, None
+    except (OSError, ValueError) as e:
+        return image_path, str(e)
+
+
+def _map(function, jobs, max_workers):
+    if max_workers == 1 or len(jobs) <= SERIAL_THRESHOLD:
+        return [function(job) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+    workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(1, min(256, len(jobs) // (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, jobs, chunksize=chunk_size))
+
+
+def convert_dataset(image_dir, src_format, dst_format, src=None, dst=None, classes=None, max_workers=None):
+    """
+        Convert the annotations of every image under image_dir from src_format to dst_format.
+        src and dst are annotation directories (None means next to the images); for CreateML
+        they may also name a single dataset .json file, for SQLite a .db file (by default each
+        directory has its own annotations.db). classes fixes the YOLO class order.
+        Return a dict with the converted and skipped image counts and a list of (path, error).
+    """
+    images = find_images(image_dir)
+    src_classes = None
+    if src_format == FORMAT_YOLO and src:
+        src_classes = load_classes(os.path.join(src, CLASSES_FILE))[0]
+    elif src_format == FORMAT_SQLITE and src and os.path.isfile(database_file(None, src)):
+        # Keep the class ids of the database
+        src_classes = AnnotationDatabase.open(database_file(None, src)).classes()
+    if src_format == FORMAT_SQLITE:
+        # Records come from one file, cheaper than starting processes
+        max_workers = 1
+    need_size = dst_format != FORMAT_CREATEML
+    read_results = _map(_read_job, [(path, src_format, src, src_classes, need_size) for path in images],
+                        max_workers)
+
+    converted = []
+    errors = []
+    for image_path, size, annotation, error in read_results:
+        if error is not None:
+            errors.append((image_path, error))
+        elif annotation is not None:
+            converted.append((image_path, size, annotation))
+    skipped = len(images) - len(converted) - len(errors)
+
+    class_list = list(classes or src_classes or [])
+    if dst_format == FORMAT_YOLO:
+        known = set(class_list)
+        for image_path, size, (verified, boxes) in converted:
+            for box in boxes:
+                if box[0] not in known:
+                    known.add(box[0])
+                    class_list.append(box[0])
+        target_dirs = set([dst]) if dst else set(os.path.dirname(path) for path, _, _ in converted)
+        for target_dir in target_dirs:
+            if not os.path.isdir(target_dir):
+                os.makedirs(target_dir)
+            save_classes(os.path.join(target_dir, CLASSES_FILE), class_list)
+    elif dst and not (dst_format == FORMAT_CREATEML and dst.lower().endswith(JSON_EXT)) \
+            and not (dst_format == FORMAT_SQLITE and dst.lower().endswith(DB_EXT)):
+        if not os.path.isdir(dst):
+            os.makedirs(dst)
+
+    if dst_format == FORMAT_CREATEML and dst and dst.lower().endswith(JSON_EXT):
+        # One dataset file: collect every entry and write it once
+        store = CreateMLStore(dst)
+        for image_path, size, (verified, boxes) in converted:
+            writer = _create_ml_writer(image_path, size, verified, boxes, dst)
+            store.put(writer.image_dict(), journal=False)
+        store.compact()
+    elif dst_format == FORMAT_SQLITE:
+        # One transaction per database
+        records = {}
+        for image_path, size, (verified, boxes) in converted:
+            records.setdefault(database_file(image_path, dst), []).append(
+                (os.path.basename(image_path), boxes, verified, size,
+                 os.path.basename(os.path.dirname(image_path)), image_path))
+        for db_path, database_records in records.items():
+            try:
+                AnnotationDatabase.open(db_path).put_many(database_records)
+            except (AnnotationDatabaseError, sqlite3.Error) as e:
+                failed = set(record[5] for record in database_records)
+                errors.extend((path, str(e)) for path in sorted(failed))
+                converted = [c for c in converted if c[0] not in failed]
+    else:
+        write_results = _map(_write_job, [(path, size, annotation, dst_format, dst, class_list)
+                                          for path, size, annotation in converted], max_workers)
+        failed = set()
+        for image_path, error in write_results:
+            if error is not None:
+                errors.append((image_path, error))
+                failed.add(image_path)
+        converted = [c for c in converted if c[0] not in failed]
+
+    return {'converted': len(converted), 'skipped': skipped, 'errors': errors}
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        prog='labelimg-convert',
+        description='Convert labelImg annotations between Pascal VOC, YOLO, CreateML and SQLite.')
+    argparser.add_argument('image_dir', help='directory with the images, searched recursively')
+    argparser.add_argument('--from', dest='src_format', choices=sorted(FORMATS), required=True)
+    argparser.add_argument('--to', dest='dst_format', choices=sorted(FORMATS), required=True)
+    argparser.add_argument('--src', help='annotation directory to read from, a CreateML dataset .json or '
+                                         'an SQLite .db (default: next to the images)')
+    argparser.add_argument('--dst', help='annotation directory to write to, a CreateML dataset .json or '
+                                         'an SQLite .db (default: next to the images)')
+    argparser.add_argument('--classes', help='file with one class per line, fixes the YOLO class order')
+    argparser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    args = argparser.parse_args(argv)
+
+    classes = None
+    if args.classes:
+        with open(args.classes, 'r', encoding='utf-8') as f:
+            classes = [line.strip() for line in f if line.strip()]
+
+    result = convert_dataset(args.image_dir, FORMATS[args.src_format], FORMATS[args.dst_format],
+                             src=args.src, dst=args.dst, classes=classes, max_workers=args.workers)
+    for image_path, error in result['errors']:
+        print('%s: %s' % (image_path, error), file=sys.stderr)
+    print('Converted %d, skipped %d (no annotation), failed %d' %
+          (result['converted'], result['skipped'], len(result['errors'])))
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,134 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 import json
-from pathlib import Path
+import threading
+from collections import OrderedDict
 
 from libs.constants import DEFAULT_ENCODING
 import os
 
 JSON_EXT = '.json'
+JOURNAL_EXT = '.journal'
 ENCODE_METHOD = DEFAULT_ENCODING
 
 
+def _read_journal(journal_file):
+    """Image entries appended to journal_file, up to a torn write at its tail."""
+    images = []
+    with open(journal_file, 'r', encoding=ENCODE_METHOD) as file:
+        for line in file:
+            try:
+                images.append(json.loads(line))
+            except ValueError:
+                break
+    return images
+
+
+class CreateMLStore(object):
+    """
+        A CreateML dataset file kept in memory with an image -> index map.
+        Updates are appended to a sidecar journal (one JSON object per line)
+        and folded into the dataset file atomically by compact().
+        At most max_open_stores are kept open by open(), the least recently used
+        one is closed first.
+    """
+    _open_stores = OrderedDict()
+    _open_lock = threading.Lock()
+    max_open_stores = 8
+    min_compact_entries = 1000
+
+    @classmethod
+    def open(cls, output_file):
+        key = os.path.abspath(output_file)
+        with cls._open_lock:
+            store = cls._open_stores.get(key)
+            if store is None:
+                store = cls._open_stores[key] = cls(output_file)
+            cls._open_stores.move_to_end(key)
+            evicted = []
+            while len(cls._open_stores) > cls.max_open_stores:
+                evicted.append(cls._open_stores.popitem(last=False)[1])
+        for old_store in evicted:
+            old_store.close()
+        return store
+
+    @classmethod
+    def get_open(cls, output_file):
+        return cls._open_stores.get(os.path.abspath(output_file))
+
+    @classmethod
+    def close_all(cls):
+        for store in list(cls._open_stores.values()):
+            store.close()
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.journal_file = output_file + JOURNAL_EXT
+        self.images = []
+        self.index = {}
+        self.journal_entries = 0
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.output_file):
+            with open(self.output_file, 'r', encoding=ENCODE_METHOD) as file:
+                self.images = json.load(file)
+        self.index = dict((image['image'], i) for i, image in enumerate(self.images))
+        if os.path.isfile(self.journal_file):
+            # A journal left behind means the last session did not compact,
+            # replay it and fold it in right away so new entries start clean.
+            for image in _read_journal(self.journal_file):
+                self.put(image, journal=False)
+            self.compact()
+
+    def get(self, image_name):
+        i = self.index.get(image_name)
+        return None if i is None else self.images[i]
+
+    def put(self, image_dict, journal=True):
+        i = self.index.get(image_dict['image'])
+        if i is None:
+            self.index[image_dict['image']] = len(self.images)
+            self.images.append(image_dict)
+        else:
+            self.images[i] = image_dict
+        self.dirty = True
+        if not journal:
+            return
+        if not os.path.isfile(self.output_file):
+            # Create the dataset file right away so it can be found before the store is closed
+            self.compact()
+            return
+        with open(self.journal_file, 'a', encoding=ENCODE_METHOD) as file:
+            file.write(json.dumps(image_dict) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.journal_entries += 1
+        if self.journal_entries > max(self.min_compact_entries, len(self.images)):
+            self.compact()
+
+    def compact(self):
+        if self.dirty:
+            tmp_file = self.output_file + '.tmp'
+            with open(tmp_file, 'w', encoding=ENCODE_METHOD) as file:
+                file.write(json.dumps(self.images))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_file, self.output_file)
+            self.dirty = False
+        if os.path.isfile(self.journal_file):
+            os.remove(self.journal_file)
+        self.journal_entries = 0
+
+    def close(self):
+        self.compact()
+        key = os.path.abspath(self.output_file)
+        with self._open_lock:
+            if self._open_stores.get(key) is self:
+                del self._open_stores[key]
+
+
 class CreateMLWriter:
     def __init__(self, folder_name, filename, img_size, shapes, output_file, database_src='Unknown', local_img_path=None):
         self.folder_name = folder_name
@@ -22,14 +141,7 @@ class CreateMLWriter:
         self.shapes = shapes
         self.output_file = output_file
 
-    def write(self):
-        if os.path.isfile(self.output_file):
-            with open(self.output_file, "r") as file:
-                input_data = file.read()
-                output_dict = json.loads(input_data)
-        else:
-            output_dict = []
-
+    def image_dict(self):
         output_image_dict = {
             "image": self.filename,
             "verified": self.verified,
@@ -56,19 +168,19 @@ class CreateMLWriter:
                 }
             }
             output_image_dict["annotations"].append(shape_dict)
+        return output_image_dict
 
-        # check if image already in output
-        exists = False
-        for i in range(0, len(output_dict)):
-            if output_dict[i]["image"] == output_image_dict["image"]:
-                exists = True
-                output_dict[i] = output_image_dict
-                break
-
-        if not exists:
-            output_dict.append(output_image_dict)
+    def write(self):
+        output_image_dict = self.image_dict()
 
-        Path(self.output_file).write_text(json.dumps(output_dict), ENCODE_METHOD)
+        # An open store journals the update, otherwise rewrite the file atomically
+        store = CreateMLStore.get_open(self.output_file)
+        if store is not None:
+            store.put(output_image_dict)
+        else:
+            store = CreateMLStore(self.output_file)
+            store.put(output_image_dict, journal=False)
+            store.compact()
 
     def calculate_coordinates(self, x1, x2, y1, y2):
         if x1 < x2:
@@ -93,6 +205,48 @@ class CreateMLWriter:
         return height, width, x, y
 
 
+_index_cache = OrderedDict()
+INDEX_CACHE_SIZE = 32
+
+
+def load_create_ml_index(json_path):
+    """
+        Return {image filename: image entry} for a CreateML file, with the updates
+        of a journal not compacted yet. The file is decoded once and the index is
+        cached until the mtime or size of the file or its journal changes.
+    """
+    key = os.path.abspath(json_path)
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    try:
+        journal_stat = os.stat(key + JOURNAL_EXT)
+        signature += (journal_stat.st_mtime_ns, journal_stat.st_size)
+    except OSError:
+        journal_stat = None
+    cached = _index_cache.get(key)
+    if cached is not None and cached[0] == signature:
+        _index_cache.move_to_end(key)
+        return cached[1]
+
+    with open(key, 'r', encoding=ENCODE_METHOD) as file:
+        images = json.load(file)
+    index = dict((image["image"], image) for image in images)
+    if journal_stat is not None:
+        index.update((image["image"], image) for image in _read_journal(key + JOURNAL_EXT))
+    _index_cache[key] = (signature, index)
+    if len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def is_shared_dataset(json_path, image_name):
+    """True if the CreateML file json_path holds entries of images other than image_name."""
+    try:
+        return any(name != image_name for name in load_create_ml_index(json_path))
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
 class CreateMLReader:
     def __init__(self, json_path, file_path):
         self.json_path = json_path
@@ -105,21 +259,19 @@ class CreateMLReader:
             print("JSON decoding failed")
 
     def parse_json(self):
-        with open(self.json_path, "r") as file:
-            input_data = file.read()
-
-        # Returns a list
-        output_list = json.loads(input_data)
-
-        if output_list:
-            self.verified = output_list[0].get("verified", False)
+        store = CreateMLStore.get_open(self.json_path)
+        if store is None and os.path.isfile(self.json_path + JOURNAL_EXT):
+            store = CreateMLStore.open(self.json_path)
+        if store is not None:
+            image = store.get(self.filename)
+        else:
+            image = load_create_ml_index(self.json_path).get(self.filename)
 
-        if len(self.shapes) > 0:
-            self.shapes = []
-        for image in output_list:
-            if image["image"] == self.filename:
-                for shape in image["annotations"]:
-                    self.add_shape(shape["label"], shape["coordinates"])
+        self.shapes = []
+        if image is not None:
+            self.verified = image.get("verified", False)
+            for shape in image["annotations"]:
+                self.add_shape(shape["label"], shape["coordinates"])
 
     def add_shape(self, label, bnd_box):
         x_min = bnd_box["x"] - (bnd_box["width"] / 2)
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    from PyQt5.QtCore import QThread, pyqtSignal
+    from PyQt5.QtGui import QImageReader
+except ImportError:
+    from PyQt4.QtCore import QThread, pyqtSignal
+    from PyQt4.QtGui import QImageReader
+
+from libs.utils import natural_sort_key
+
+MANIFEST_DIR = os.path.join(os.path.expanduser('~'), '.labelImgCache')
+MANIFEST_VERSION = 1
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+FIRST_BATCH_SIZE = 500
+
+
+def image_extensions():
+    """Lower case extensions, with the dot, of the formats Qt can read."""
+    return frozenset('.%s' % fmt.data().decode('ascii').lower() for fmt in QImageReader.supportedImageFormats())
+
+
+def image_sort_key(path):
+    return natural_sort_key(path.lower())
+
+
+def scan_dir(path, extensions):
+    """
+    List one directory: (path, image paths, sub directories, mtime), with a None
+    mtime if it could not be read.
+    """
+    files = []
+    dirs = []
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Like os.walk, do not descend into symlinked directories
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                    continue
+                name = entry.name
+                dot = name.rfind('.')
+                if dot >= 0 and name[dot:].lower() in extensions:
+                    files.append(entry.path)
+    except OSError:
+        # Unreadable directories are skipped, as os.walk does
+        return path, [], [], None
+    return path, files, dirs, mtime
+
+
+def walk_images(folder, extensions, dir_mtimes=None, max_workers=None):
+    """
+    Yield lists of the image paths under folder, one list per directory, listing
+    directories in parallel. The mtime of every directory read is stored in dir_mtimes.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or SCAN_WORKERS) as executor:
+        pending = set([executor.submit(scan_dir, os.path.abspath(folder), extensions)])
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, files, dirs, mtime = future.result()
+                if mtime is not None and dir_mtimes is not None:
+                    dir_mtimes[path] = mtime
+                for sub_dir in dirs:
+                    pending.add(executor.submit(scan_dir, sub_dir, extensions))
+                if files:
+                    yield files
+
+
+def manifest_path(folder, manifest_dir=MANIFEST_DIR):
+    digest = hashlib.sha1(os.path.abspath(folder).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(manifest_dir, digest + '.json')
+
+
+def load_manifest(folder, extensions, manifest_dir=MANIFEST_DIR, dir_mtimes=None):
+    """
+    Return the sorted image list saved for folder, or None if there is none or any
+    directory of the tree changed since: adding, removing or renaming an entry
+    updates the mtime of the directory holding it. The mtimes of the directories
+    are stored in dir_mtimes.
+    """
+    folder = os.path.abspath(folder)
+    try:
+        with open(manifest_path(folder, manifest_dir), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('root') != folder \
+                or manifest.get('extensions') != sorted(extensions):
+            return None
+        mtimes = {}
+        for rel_path, mtime in manifest['dirs'].items():
+            path = os.path.normpath(os.path.join(folder, rel_path))
+            if os.stat(path).st_mtime_ns != mtime:
+                return None
+            mtimes[path] = mtime
+        if dir_mtimes is not None:
+            dir_mtimes.update(mtimes)
+        return [os.path.join(folder, rel_path) for rel_path in manifest['images']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_manifest(folder, extensions, dir_mtimes, images, manifest_dir=MANIFEST_DIR):
+    folder = os.path.abspath(folder)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'root': folder,
+        'extensions': sorted(extensions),
+        'dirs': dict((os.path.relpath(path, folder), mtime) for path, mtime in dir_mtimes.items()),
+        'images': [os.path.relpath(path, folder) for path in images],
+    }
+    target = manifest_path(folder, manifest_dir)
+    try:
+        if not os.path.isdir(manifest_dir):
+            os.makedirs(manifest_dir)
+        with open(target + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(target + '.tmp', target)
+    except OSError:
+        # The manifest is only a cache
+        pass
+
+
+def scan_images(folder, extensions, manifest_dir=None, max_workers=None):
+    """Return the naturally sorted absolute paths of all images under folder."""
+    if manifest_dir:
+        images = load_manifest(folder, extensions, manifest_dir)
+        if images is not None:
+            return images
+    dir_mtimes = {}
+    images = [path for files in walk_images(folder, extensions, dir_mtimes, max_workers) for path in files]
+    images.sort(key=image_sort_key)
+    if manifest_dir:
+        save_manifest(folder, extensions, dir_mtimes, images, manifest_dir)
+    return images
+
+
+class DirScanner(QThread):
+    """
+    Scans a directory tree for images in the background. batchFound delivers sorted
+    batches of growing size while the scan runs, scanFinished the whole sorted list.
+    By then, directories holds every directory of the tree.
+    """
+    batchFound = pyqtSignal(list)
+    scanFinished = pyqtSignal(list)
+
+    def __init__(self, folder, extensions, manifest_dir=None, parent=None):
+        super(DirScanner, self).__init__(parent)
+        self.folder = os.path.abspath(folder)
+        self.extensions = extensions
+        self.manifest_dir = manifest_dir
+        self.directories = []
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        dir_mtimes = {}
+        if self.manifest_dir:
+            images = load_manifest(self.folder, self.extensions, self.manifest_dir, dir_mtimes)
+            if images is not None:
+                self.directories = sorted(dir_mtimes)
+                self.scanFinished.emit(images)
+                return
+
+        keyed = []
+        batch = []
+        batch_size = FIRST_BATCH_SIZE
+        for files in walk_images(self.folder, self.extensions, dir_mtimes):
+            if self._cancelled:
+                return
+            # Each key is computed once, the final sort reuses them
+            batch.extend((image_sort_key(path), path) for path in files)
+            if len(batch) >= batch_size:
+                batch.sort()
+                keyed.extend(batch)
+                self.batchFound.emit([path for _, path in batch])
+                batch = []
+                batch_size *= 2
+        if self._cancelled:
+            return
+        keyed.extend(batch)
+        # The list is made of sorted runs, which sort() merges cheaply
+        keyed.sort()
+        images = [path for _, path in keyed]
+        if self.manifest_dir:
+            save_manifest(self.folder, self.extensions, dir_mtimes, images, self.manifest_dir)
+        self.directories = sorted(dir_mtimes)
+        self.scanFinished.emit(images)
@@ -0,0 +1,122 @@
+import os
+
+try:
+    from PyQt5.QtCore import QElapsedTimer, QFileSystemWatcher, QObject, QTimer, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QElapsedTimer, QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from libs.dir_scanner import image_sort_key, scan_dir
+
+# Changes are collected until the tree has been quiet for DEBOUNCE_MS, but are
+# delivered at least every MAX_DELAY_MS while a burst goes on.
+DEBOUNCE_MS = 300
+MAX_DELAY_MS = 2000
+
+
+class DirWatcher(QObject):
+    """
+    Keeps track of the images under a directory tree after it was scanned. The
+    directories are watched with QFileSystemWatcher (inotify on Linux), and a
+    changed directory is listed again to find which images appeared or went away.
+    Changes are debounced, so a burst of new files arrives as a few sorted lists
+    through imagesAdded and imagesRemoved.
+    """
+    imagesAdded = pyqtSignal(list)
+    imagesRemoved = pyqtSignal(list)
+
+    def __init__(self, folder, extensions, images, directories=(), parent=None):
+        super(DirWatcher, self).__init__(parent)
+        self.folder = os.path.abspath(folder)
+        self.extensions = extensions
+        # Directory -> image paths directly inside it
+        self._files = {}
+        for path in images:
+            self._files.setdefault(os.path.dirname(path), set()).add(path)
+        directories = set(directories) | set(self._files)
+        directories.add(self.folder)
+        # Parents of the directories holding images are part of the tree too
+        for directory in list(directories):
+            while directory.startswith(self.folder + os.sep):
+                directory = os.path.dirname(directory)
+                directories.add(directory)
+        for directory in directories:
+            self._files.setdefault(directory, set())
+
+        self._changed = set()
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._directory_changed)
+        self._watch(directories)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self._pending_since = QElapsedTimer()
+
+    def _watch(self, directories):
+        if directories:
+            # Directories beyond the inotify watch limit are not added, which
+            # only means changes in them are not picked up.
+            self._watcher.addPaths(sorted(directories))
+
+    @property
+    def directories(self):
+        return sorted(self._files)
+
+    def _directory_changed(self, directory):
+        if not self._changed:
+            self._pending_since.start()
+        self._changed.add(directory)
+        if self._pending_since.elapsed() >= MAX_DELAY_MS:
+            self._timer.start(0)
+        else:
+            self._timer.start(DEBOUNCE_MS)
+
+    def flush(self):
+        """List the changed directories again and emit the differences."""
+        self._timer.stop()
+        changed, self._changed = self._changed, set()
+        added = []
+        removed = []
+        while changed:
+            directory = changed.pop()
+            _, files, sub_dirs, mtime = scan_dir(directory, self.extensions)
+            if mtime is None:
+                removed.extend(self._forget_tree(directory))
+                continue
+            files = set(files)
+            known = self._files.setdefault(directory, set())
+            added.extend(files - known)
+            removed.extend(known - files)
+            self._files[directory] = files
+
+            known_dirs = set(d for d in self._files if os.path.dirname(d) == directory)
+            for sub_dir in known_dirs - set(sub_dirs):
+                removed.extend(self._forget_tree(sub_dir))
+            new_dirs = set(sub_dirs) - known_dirs
+            if new_dirs:
+                # New directories may already hold files, list them like changed ones
+                for sub_dir in new_dirs:
+                    self._files[sub_dir] = set()
+                self._watch(new_dirs)
+                changed.update(new_dirs)
+        if removed:
+            removed.sort(key=image_sort_key)
+            self.imagesRemoved.emit(removed)
+        if added:
+            added.sort(key=image_sort_key)
+            self.imagesAdded.emit(added)
+
+    def _forget_tree(self, directory):
+        prefix = directory + os.sep
+        removed = []
+        for known in [d for d in self._files if d == directory or d.startswith(prefix)]:
+            removed.extend(self._files.pop(known))
+            self._watcher.removePath(known)
+        return removed
+
+    def close(self):
+        self._timer.stop()
+        self._changed = set()
+        directories = self._watcher.directories()
+        if directories:
+            self._watcher.removePaths(directories)
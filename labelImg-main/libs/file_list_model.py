@@ -0,0 +1,217 @@
+from bisect import bisect_left
+
+try:
+    from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+except ImportError:
+    from PyQt4.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from libs.dir_scanner import image_sort_key
+
+# Above this many rows, insert_paths and remove_paths rebuild the list and reset
+# the model instead of signalling every row
+BULK_EDIT_ROWS = 32
+
+
+class FileListModel(QAbstractListModel):
+    """
+    Image paths for the file dock. The view asks for the rows it shows only, so no
+    per-item widget state is created.
+    While a scan streams in unsorted batches a path -> row dict finds rows in O(1).
+    Once the list is sorted by image_sort_key, rows are found by binary search
+    over the sort keys, kept in a list next to the paths so none is computed
+    again. insert, remove and rename then do not have to renumber the rows after
+    the one they touch.
+    color_of(path) may return a QColor for the text of a row.
+    """
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self._paths = []
+        self._rows = {}
+        # Sort keys of _paths while the list is sorted, else None
+        self._keys = None
+        self.color_of = None
+
+    @property
+    def paths(self):
+        """The backing list, read only."""
+        return self._paths
+
+    @property
+    def is_sorted(self):
+        return self._rows is None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self._paths[index.row()]
+        if role == Qt.ForegroundRole and self.color_of is not None:
+            return self.color_of(self._paths[index.row()])
+        return None
+
+    def refresh(self, paths):
+        """Repaint the rows of paths, e.g. after their color changed."""
+        rows = [row for row in (self.row_of(path) for path in paths) if row is not None]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+
+    def _insert_position(self, key):
+        """First row whose sort key is not lower than key."""
+        return bisect_left(self._keys, key)
+
+    def row_of(self, path):
+        """Row of path, or None if it is not in the list."""
+        if self._rows is not None:
+            return self._rows.get(path)
+        key = image_sort_key(path)
+        row = self._insert_position(key)
+        # Paths that only differ in case share a key
+        while row < len(self._paths) and self._keys[row] == key:
+            if self._paths[row] == path:
+                return row
+            row += 1
+        return None
+
+    def path_at(self, row):
+        return self._paths[row]
+
+    def set_paths(self, paths, is_sorted=False):
+        """
+        Replace the list. Pass is_sorted if paths are already in image_sort_key
+        order, which enables the binary search.
+        """
+        paths = list(paths)
+        self._reset(paths, [image_sort_key(path) for path in paths] if is_sorted else None)
+
+    def _reset(self, paths, keys):
+        """Replace the list by paths, sorted with their sort keys or unsorted if keys is None."""
+        self.beginResetModel()
+        self._paths = paths
+        self._keys = keys
+        if keys is None:
+            self._rows = dict((path, row) for row, path in enumerate(self._paths))
+        else:
+            self._rows = None
+        self.endResetModel()
+
+    def extend(self, paths):
+        if not paths:
+            return
+        keys = None
+        if self._rows is None:
+            keyed = sorted((image_sort_key(path), path) for path in paths)
+            keys = [key for key, _ in keyed]
+            paths = [path for _, path in keyed]
+            if self._paths and keys[0] < self._keys[-1]:
+                # Out of order batches, e.g. from a running scan, fall back to the dict
+                self._rows = dict((path, row) for row, path in enumerate(self._paths))
+                self._keys = keys = None
+        first = len(self._paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        if self._rows is not None:
+            for row, path in enumerate(paths, first):
+                self._rows[path] = row
+        else:
+            self._keys.extend(keys)
+        self._paths.extend(paths)
+        self.endInsertRows()
+
+    def insert(self, path):
+        """
+        Add path at its sorted position, or at the end if the list is not sorted.
+        Returns its row. A path that is already listed is not added twice.
+        """
+        row = self.row_of(path)
+        if row is not None:
+            return row
+        if self._rows is None:
+            key = image_sort_key(path)
+            row = self._insert_position(key)
+            # Equal keys are ordered by path, like the (key, path) sort of the scanner
+            while row < len(self._paths) and self._keys[row] == key and self._paths[row] < path:
+                row += 1
+        else:
+            row = len(self._paths)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._paths.insert(row, path)
+        if self._rows is not None:
+            self._rows[path] = row
+        else:
+            self._keys.insert(row, key)
+        self.endInsertRows()
+        return row
+
+    def insert_paths(self, paths):
+        """insert for many paths at once, e.g. a burst of new files. Returns those added."""
+        keyed = sorted((image_sort_key(path), path) for path in set(paths) if self.row_of(path) is None)
+        paths = [path for _, path in keyed]
+        if not paths:
+            return []
+        if self._rows is not None or not self._paths or keyed[0][0] > self._keys[-1]:
+            self.extend(paths)
+        elif len(paths) <= BULK_EDIT_ROWS:
+            for path in paths:
+                self.insert(path)
+        else:
+            # Splice the new paths in at their positions, only their keys are computed
+            merged, merged_keys = [], []
+            start = 0
+            for key, path in keyed:
+                row = self._insert_position(key)
+                merged.extend(self._paths[start:row])
+                merged_keys.extend(self._keys[start:row])
+                merged.append(path)
+                merged_keys.append(key)
+                start = row
+            merged.extend(self._paths[start:])
+            merged_keys.extend(self._keys[start:])
+            self._reset(merged, merged_keys)
+        return paths
+
+    def remove_paths(self, paths):
+        """remove for many paths at once. Returns those that were listed."""
+        rows = set(row for row in (self.row_of(path) for path in set(paths)) if row is not None)
+        removed = [self._paths[row] for row in sorted(rows)]
+        if len(rows) <= BULK_EDIT_ROWS:
+            for path in removed:
+                self.remove(path)
+        else:
+            kept = [row for row in range(len(self._paths)) if row not in rows]
+            self._reset([self._paths[row] for row in kept],
+                        None if self._keys is None else [self._keys[row] for row in kept])
+        return removed
+
+    def remove(self, path):
+        """Remove path and return its former row, or None if it was not listed."""
+        row = self.row_of(path)
+        if row is None:
+            return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._paths[row]
+        if self._rows is not None:
+            del self._rows[path]
+            for i in range(row, len(self._paths)):
+                self._rows[self._paths[i]] = i
+        else:
+            del self._keys[row]
+        self.endRemoveRows()
+        return row
+
+    def rename(self, old_path, new_path):
+        """Move the row of old_path to where new_path belongs. Returns the new row."""
+        if self._rows is not None and old_path in self._rows:
+            # Unsorted lists keep the position
+            row = self._rows.pop(old_path)
+            self._paths[row] = new_path
+            self._rows[new_path] = row
+            self.dataChanged.emit(self.index(row), self.index(row))
+            return row
+        self.remove(old_path)
+        return self.insert(new_path)
+
+    def clear(self):
+        self.set_paths([], is_sorted=True)
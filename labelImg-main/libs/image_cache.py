@@ -0,0 +1,142 @@
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtCore import QBuffer, QByteArray, QObject
+    from PyQt5.QtGui import QImage, QImageReader
+except ImportError:
+    from PyQt4.QtCore import QBuffer, QByteArray, QObject
+    from PyQt4.QtGui import QImage, QImageReader
+
+CACHE_BYTES = 512 * 1024 * 1024
+PREFETCH_COUNT = 3
+
+
+def load_image(file_path):
+    """Decode an image file, applying its EXIF orientation. Return a null QImage on failure."""
+    reader = QImageReader(file_path)
+    reader.setAutoTransform(True)
+    return reader.read()
+
+
+def load_image_data(data):
+    """Decode an image from its encoded bytes, like load_image."""
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QBuffer.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.setAutoTransform(True)
+    return reader.read()
+
+
+def image_bytes(image):
+    if hasattr(image, 'sizeInBytes'):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+def file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ImageCache(QObject):
+    """
+    LRU cache of decoded QImages bounded by their size in bytes. A worker thread
+    decodes the images around the current one ahead of time, so stepping to the
+    next or previous image does not wait for the decoder.
+    loader(path) -> QImage does the decoding, it must be safe to call from a thread.
+    signature(path) tells when a cached image is stale, None means it is not cached.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES, loader=load_image, parent=None, signature=file_signature):
+        super(ImageCache, self).__init__(parent)
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.signature = signature
+        self.total_bytes = 0
+        self._images = OrderedDict()
+        self._queue = []
+        self._loading = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='labelImg-image-cache')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __contains__(self, file_path):
+        with self._condition:
+            return file_path in self._images
+
+    def get(self, file_path):
+        """Return the decoded image, from the cache or decoded right now."""
+        with self._condition:
+            # Do not decode twice what the worker is busy with
+            while self._loading == file_path:
+                self._condition.wait()
+            signature = self.signature(file_path)
+            entry = self._images.get(file_path)
+            if entry is not None and entry[0] == signature:
+                self._images.move_to_end(file_path)
+                return entry[1]
+        image = self.loader(file_path)
+        with self._condition:
+            self._insert(file_path, signature, image)
+        return image
+
+    def prefetch(self, file_paths):
+        """Decode file_paths in the background, in order. Replaces any earlier request."""
+        with self._condition:
+            self._queue = [path for path in file_paths if path not in self._images]
+            self._condition.notify_all()
+
+    def clear(self):
+        with self._condition:
+            self._queue = []
+            self._images.clear()
+            self.total_bytes = 0
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._queue = []
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _insert(self, file_path, signature, image):
+        old = self._images.pop(file_path, None)
+        if old is not None:
+            self.total_bytes -= image_bytes(old[1])
+        size = image_bytes(image)
+        if signature is None or image.isNull() or size > self.max_bytes:
+            return
+        self._images[file_path] = (signature, image)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self._images.popitem(last=False)
+            self.total_bytes -= image_bytes(evicted)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                file_path = self._queue.pop(0)
+                if file_path in self._images:
+                    continue
+                self._loading = file_path
+            signature = self.signature(file_path)
+            try:
+                image = self.loader(file_path)
+            except Exception:
+                image = QImage()
+            with self._condition:
+                self._insert(file_path, signature, image)
+                self._loading = None
+                self._condition.notify_all()
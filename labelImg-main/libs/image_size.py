@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import os
+import struct
+from functools import lru_cache
+
+IMAGE_SIZE_CACHE_SIZE = 4096
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def _exif_orientation(data):
+    """The Orientation tag of an APP1 Exif segment, 1 (upright) if it has none."""
+    if not data.startswith(b'Exif\x00\x00'):
+        return 1
+    tiff = data[6:]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None:
+        return 1
+    try:
+        offset = struct.unpack(order + 'I', tiff[4:8])[0]
+        count = struct.unpack(order + 'H', tiff[offset:offset + 2])[0]
+        for i in range(count):
+            entry = tiff[offset + 2 + 12 * i:offset + 14 + 12 * i]
+            tag, field_type = struct.unpack(order + 'HH', entry[:4])
+            if tag == EXIF_ORIENTATION_TAG and field_type == 3:
+                return struct.unpack(order + 'H', entry[8:10])[0]
+    except struct.error:
+        # A broken Exif block does not hide the size
+        pass
+    return 1
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    orientation = 1
+    while True:
+        marker = f.read(2)
+        while marker and marker[0] != 0xFF:
+            marker = marker[1:] + f.read(1)
+        if len(marker) < 2:
+            return None
+        code = marker[1]
+        if code == 0xFF:
+            f.seek(-1, 1)
+            continue
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+            continue  # markers without a length
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack('>H', length)[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            data = f.read(6)
+            if len(data) < 6:
+                return None
+            _, height, width, components = struct.unpack('>BHHB', data)
+            if 5 <= orientation <= 8:
+                # Stored on its side, decoders that honour EXIF turn it upright
+                height, width = width, height
+            return [height, width, 1 if components == 1 else 3]
+        if code == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        f.seek(length - 2, 1)
+
+
+def _png_size(f):
+    f.seek(16)
+    data = f.read(10)
+    if len(data) < 10:
+        return None
+    width, height, _, color_type = struct.unpack('>IIBB', data)
+    # 0: grayscale, 4: grayscale with alpha
+    return [height, width, 1 if color_type in (0, 4) else 3]
+
+
+def _bmp_size(f):
+    f.seek(14)
+    header_size = struct.unpack('<I', f.read(4))[0]
+    if header_size == 12:
+        width, height, _, bit_count = struct.unpack('<HHHH', f.read(8))
+        colors_used = 0
+        entry_size = 3
+    else:
+        width, height, _, bit_count = struct.unpack('<iiHH', f.read(12))
+        f.seek(14 + 32)
+        colors_used = struct.unpack('<I', f.read(4))[0]
+        entry_size = 4
+    depth = 3
+    if bit_count <= 8:
+        f.seek(14 + header_size)
+        count = colors_used or (1 << bit_count)
+        palette = f.read(count * entry_size)
+        entries = [palette[i:i + 3] for i in range(0, len(palette) - 2, entry_size)]
+        if entries and all(b == g == r for b, g, r in entries):
+            depth = 1
+    return [abs(height), width, depth]
+
+
+def _webp_size(f):
+    f.seek(12)
+    chunk = f.read(4)
+    data = f.read(20)
+    if chunk == b'VP8 ' and len(data) >= 14 and data[7:10] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', data[10:14])
+        return [height & 0x3FFF, width & 0x3FFF, 3]
+    if chunk == b'VP8L' and len(data) >= 9 and data[4:5] == b'\x2f':
+        bits = struct.unpack('<I', data[5:9])[0]
+        return [((bits >> 14) & 0x3FFF) + 1, (bits & 0x3FFF) + 1, 3]
+    if chunk == b'VP8X' and len(data) >= 14:
+        width = struct.unpack('<I', data[8:11] + b'\x00')[0] + 1
+        height = struct.unpack('<I', data[11:14] + b'\x00')[0] + 1
+        return [height, width, 3]
+    return None
+
+
+_PROBES = (
+    (b'\xff\xd8', _jpeg_size),
+    (b'\x89PNG\r\n\x1a\n', _png_size),
+    (b'BM', _bmp_size),
+    (b'RIFF', _webp_size),
+)
+
+
+def read_image_size(file_path):
+    """
+        Return [height, width, depth] of an image by reading its file header only,
+        depth being 1 for grayscale images and 3 otherwise. The size is the one the
+        image is shown at, after the EXIF orientation of a JPEG is applied.
+        Return None if the format is not recognised or the header is truncated.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(12)
+        for magic, probe in _PROBES:
+            if head.startswith(magic):
+                if magic == b'RIFF' and head[8:12] != b'WEBP':
+                    return None
+                try:
+                    return probe(f)
+                except struct.error:
+                    return None
+    return None
+
+
+@lru_cache(maxsize=IMAGE_SIZE_CACHE_SIZE)
+def _cached_image_size(file_path, mtime_ns, file_size):
+    size = read_image_size(file_path)
+    return tuple(size) if size is not None else None
+
+
+def get_image_size(file_path):
+    """
+        Like read_image_size, but remembered per (path, mtime, file size) in an LRU cache
+        so repeated saves of the same image do not touch the file again.
+    """
+    stat = os.stat(file_path)
+    size = _cached_image_size(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    return list(size) if size is not None else None
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import hashlib
+import os
+
+
+class ImageSourceError(Exception):
+    pass
+
+
+def member_name(name):
+    """name as a relative '/' separated path, or None if it would point outside the source."""
+    name = name.replace('\\', '/').lstrip('/')
+    while name.startswith('./'):
+        name = name[2:]
+    parts = name.split('/')
+    if not name or '..' in parts:
+        return None
+    return name
+
+
+class ImageSource(object):
+    """
+    Images that are not plain local files, e.g. the members of an archive. The
+    paths a source hands out look like local paths under root, so the rest of
+    labelImg can split and join them as usual, but only the source can read them.
+    Sources are read only; annotations are saved to a local directory, labels_dir
+    unless the user picked one. read() and signature() may be called from worker threads.
+    """
+    labels_dir = None
+
+    def __init__(self, root, cache_dir=None):
+        self.root = os.path.abspath(root)
+        # Local copies of annotation files, see local_copy
+        self.cache_dir = cache_dir and os.path.join(
+            cache_dir, 'sources', hashlib.sha1(self.root.encode('utf-8', 'surrogateescape')).hexdigest())
+
+    def owns(self, path):
+        return path.startswith(self.root + os.sep)
+
+    def list_images(self, extensions):
+        """Paths of the images whose lower case extension is in extensions, in no particular order."""
+        raise NotImplementedError
+
+    def exists(self, path):
+        raise NotImplementedError
+
+    def read(self, path):
+        """The bytes of path. Raises ImageSourceError if it cannot be read."""
+        raise NotImplementedError
+
+    def signature(self, path):
+        """A value that changes when the content of path does, or None if it does not exist."""
+        raise NotImplementedError
+
+    def prefetch(self, paths):
+        """Start fetching paths in the background, for sources where reads are slow."""
+        pass
+
+    def local_copy(self, path):
+        """
+        Copy path to a local file and return its name, or None if the source does
+        not have it. For readers that need a file, like the annotation readers.
+        """
+        if self.cache_dir is None or not self.exists(path):
+            return None
+        target = os.path.join(self.cache_dir, os.path.relpath(path, self.root))
+        try:
+            data = self.read(path)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            with open(target + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(target + '.tmp', target)
+        except (ImageSourceError, OSError):
+            return None
+        return target
+
+    def close(self):
+        pass
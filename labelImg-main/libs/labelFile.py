@@ -2,16 +2,18 @@
 # Create by TzuTaLin <tzu.ta.lin@gmail.com>
 
 try:
-    from PyQt5.QtGui import QImage
+    from PyQt5.QtGui import QImage, QImageReader
 except ImportError:
-    from PyQt4.QtGui import QImage
+    from PyQt4.QtGui import QImage, QImageReader
 
 import os.path
 from enum import Enum
 
-from libs.create_ml_io import CreateMLWriter
+from libs.create_ml_io import CreateMLWriter, CreateMLStore, is_shared_dataset
+from libs.image_size import get_image_size
 from libs.pascal_voc_io import PascalVocWriter
 from libs.pascal_voc_io import XML_EXT
+from libs.sqlite_io import AnnotationDatabase
 from libs.yolo_io import YOLOWriter
 
 
@@ -19,6 +21,7 @@ class LabelFileFormat(Enum):
     PASCAL_VOC = 1
     YOLO = 2
     CREATE_ML = 3
+    SQLITE = 4
 
 
 class LabelFileError(Exception):
@@ -40,13 +43,14 @@ class LabelFile(object):
         img_folder_name = os.path.basename(os.path.dirname(image_path))
         img_file_name = os.path.basename(image_path)
 
-        image = QImage()
-        image.load(image_path)
-        image_shape = [image.height(), image.width(),
-                       1 if image.isGrayscale() else 3]
+        image_shape = LabelFile.get_image_shape(image_path, image_data)
         writer = CreateMLWriter(img_folder_name, img_file_name,
                                 image_shape, shapes, filename, local_img_path=image_path)
         writer.verified = self.verified
+        # A dataset file shared with other images stays open so saves only append to its
+        # journal, a file of its own is rewritten and not kept in memory
+        if CreateMLStore.get_open(filename) is None and is_shared_dataset(filename, img_file_name):
+            CreateMLStore.open(filename)
         writer.write()
         return
 
@@ -57,15 +61,7 @@ class LabelFile(object):
         img_folder_name = os.path.split(img_folder_path)[-1]
         img_file_name = os.path.basename(image_path)
         # imgFileNameWithoutExt = os.path.splitext(img_file_name)[0]
-        # Read from file path because self.imageData might be empty if saving to
-        # Pascal format
-        if isinstance(image_data, QImage):
-            image = image_data
-        else:
-            image = QImage()
-            image.load(image_path)
-        image_shape = [image.height(), image.width(),
-                       1 if image.isGrayscale() else 3]
+        image_shape = LabelFile.get_image_shape(image_path, image_data)
         writer = PascalVocWriter(img_folder_name, img_file_name,
                                  image_shape, local_img_path=image_path)
         writer.verified = self.verified
@@ -87,15 +83,7 @@ class LabelFile(object):
         img_folder_name = os.path.split(img_folder_path)[-1]
         img_file_name = os.path.basename(image_path)
         # imgFileNameWithoutExt = os.path.splitext(img_file_name)[0]
-        # Read from file path because self.imageData might be empty if saving to
-        # Pascal format
-        if isinstance(image_data, QImage):
-            image = image_data
-        else:
-            image = QImage()
-            image.load(image_path)
-        image_shape = [image.height(), image.width(),
-                       1 if image.isGrayscale() else 3]
+        image_shape = LabelFile.get_image_shape(image_path, image_data)
         writer = YOLOWriter(img_folder_name, img_file_name,
                             image_shape, local_img_path=image_path)
         writer.verified = self.verified
@@ -111,6 +99,17 @@ class LabelFile(object):
         writer.save(target_file=filename, class_list=class_list)
         return
 
+    def save_sqlite_format(self, filename, shapes, image_path, image_data):
+        image_shape = LabelFile.get_image_shape(image_path, image_data)
+        boxes = []
+        for shape in shapes:
+            xs = [p[0] for p in shape['points']]
+            ys = [p[1] for p in shape['points']]
+            # Unrounded, the exporters round like the other writers do
+            boxes.append((shape['label'], min(xs), min(ys), max(xs), max(ys), shape['difficult']))
+        AnnotationDatabase.open(filename).put(os.path.basename(image_path), boxes, self.verified, image_shape,
+                                              os.path.basename(os.path.dirname(image_path)), image_path)
+
     def toggle_verify(self):
         self.verified = not self.verified
 
@@ -143,6 +142,28 @@ class LabelFile(object):
                     f, ensure_ascii=True, indent=2)
     '''
 
+    @staticmethod
+    def get_image_shape(image_path, image_data=None):
+        """
+        Return [height, width, depth] of the image without decoding pixels: the size
+        comes from an already decoded QImage (which honours EXIF orientation) or from
+        the file header, the depth from the file header.
+        """
+        header_shape = get_image_size(image_path) if os.path.isfile(image_path) else None
+        if isinstance(image_data, QImage):
+            image = image_data
+            if header_shape is not None:
+                return [image.height(), image.width(), header_shape[2]]
+        elif header_shape is not None:
+            return header_shape
+        else:
+            # Unknown header format, fall back to decoding the file as the GUI does
+            reader = QImageReader(image_path)
+            reader.setAutoTransform(True)
+            image = reader.read()
+        return [image.height(), image.width(),
+                1 if image.isGrayscale() else 3]
+
     @staticmethod
     def is_label_file(filename):
         file_suffix = os.path.splitext(filename)[1].lower()
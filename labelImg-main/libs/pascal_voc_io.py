@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 import sys
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
 from lxml import etree
 import codecs
 from libs.constants import DEFAULT_ENCODING
@@ -12,6 +10,21 @@ from libs.ustr import ustr
 XML_EXT = '.xml'
 ENCODE_METHOD = DEFAULT_ENCODING
 
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _element(indent, tag, text):
+    text = _escape(ustr(text))
+    if not text:
+        return '%s<%s/>\n' % (indent, tag)
+    return '%s<%s>%s</%s>\n' % (indent, tag, text, tag)
+
+
+def _to_int(value):
+    return value if type(value) is int else int(float(value))
+
+
 class PascalVocWriter:
 
     def __init__(self, folder_name, filename, img_size, database_src='Unknown', local_img_path=None):
@@ -23,20 +36,10 @@ class PascalVocWriter:
         self.local_img_path = local_img_path
         self.verified = False
 
-    def prettify(self, elem):
-        """
-            Return a pretty-printed XML string for the Element.
-        """
-        rough_string = ElementTree.tostring(elem, 'utf8')
-        root = etree.fromstring(rough_string)
-        return etree.tostring(root, pretty_print=True, encoding=ENCODE_METHOD).replace("  ".encode(), "\t".encode())
-        # minidom does not support UTF-8
-        # reparsed = minidom.parseString(rough_string)
-        # return reparsed.toprettyxml(indent="\t", encoding=ENCODE_METHOD)
-
     def gen_xml(self):
         """
-            Return XML root
+            Return the tab-indented annotation XML as a string, in a single pass.
+            The layout is the one lxml's pretty printer used to produce.
         """
         # Check conditions
         if self.filename is None or \
@@ -44,38 +47,23 @@ class PascalVocWriter:
                 self.img_size is None:
             return None
 
-        top = Element('annotation')
-        if self.verified:
-            top.set('verified', 'yes')
-
-        folder = SubElement(top, 'folder')
-        folder.text = self.folder_name
-
-        filename = SubElement(top, 'filename')
-        filename.text = self.filename
-
+        parts = ['<annotation verified="yes">\n' if self.verified else '<annotation>\n',
+                 _element('\t', 'folder', self.folder_name),
+                 _element('\t', 'filename', self.filename)]
         if self.local_img_path is not None:
-            local_img_path = SubElement(top, 'path')
-            local_img_path.text = self.local_img_path
-
-        source = SubElement(top, 'source')
-        database = SubElement(source, 'database')
-        database.text = self.database_src
-
-        size_part = SubElement(top, 'size')
-        width = SubElement(size_part, 'width')
-        height = SubElement(size_part, 'height')
-        depth = SubElement(size_part, 'depth')
-        width.text = str(self.img_size[1])
-        height.text = str(self.img_size[0])
-        if len(self.img_size) == 3:
-            depth.text = str(self.img_size[2])
-        else:
-            depth.text = '1'
-
-        segmented = SubElement(top, 'segmented')
-        segmented.text = '0'
-        return top
+            parts.append(_element('\t', 'path', self.local_img_path))
+        parts.append('\t<source>\n')
+        parts.append(_element('\t\t', 'database', self.database_src))
+        parts.append('\t</source>\n'
+                     '\t<size>\n')
+        parts.append(_element('\t\t', 'width', str(self.img_size[1])))
+        parts.append(_element('\t\t', 'height', str(self.img_size[0])))
+        parts.append(_element('\t\t', 'depth', str(self.img_size[2]) if len(self.img_size) == 3 else '1'))
+        parts.append('\t</size>\n'
+                     '\t<segmented>0</segmented>\n')
+        parts.extend(self.gen_objects())
+        parts.append('</annotation>\n')
+        return ''.join(parts)
 
     def add_bnd_box(self, x_min, y_min, x_max, y_max, name, difficult):
         bnd_box = {'xmin': x_min, 'ymin': y_min, 'xmax': x_max, 'ymax': y_max}
@@ -83,45 +71,110 @@ class PascalVocWriter:
         bnd_box['difficult'] = difficult
         self.box_list.append(bnd_box)
 
-    def append_objects(self, top):
+    def gen_objects(self):
+        img_height = _to_int(self.img_size[0])
+        img_width = _to_int(self.img_size[1])
         for each_object in self.box_list:
-            object_item = SubElement(top, 'object')
-            name = SubElement(object_item, 'name')
-            name.text = ustr(each_object['name'])
-            pose = SubElement(object_item, 'pose')
-            pose.text = "Unspecified"
-            truncated = SubElement(object_item, 'truncated')
-            if int(float(each_object['ymax'])) == int(float(self.img_size[0])) or (int(float(each_object['ymin'])) == 1):
-                truncated.text = "1"  # max == height or min
-            elif (int(float(each_object['xmax'])) == int(float(self.img_size[1]))) or (int(float(each_object['xmin'])) == 1):
-                truncated.text = "1"  # max == width or min
-            else:
-                truncated.text = "0"
-            difficult = SubElement(object_item, 'difficult')
-            difficult.text = str(bool(each_object['difficult']) & 1)
-            bnd_box = SubElement(object_item, 'bndbox')
-            x_min = SubElement(bnd_box, 'xmin')
-            x_min.text = str(each_object['xmin'])
-            y_min = SubElement(bnd_box, 'ymin')
-            y_min.text = str(each_object['ymin'])
-            x_max = SubElement(bnd_box, 'xmax')
-            x_max.text = str(each_object['xmax'])
-            y_max = SubElement(bnd_box, 'ymax')
-            y_max.text = str(each_object['ymax'])
+            x_min, y_min = each_object['xmin'], each_object['ymin']
+            x_max, y_max = each_object['xmax'], each_object['ymax']
+            # max == height or width, or min == 1
+            truncated = _to_int(y_max) == img_height or _to_int(y_min) == 1 or \
+                _to_int(x_max) == img_width or _to_int(x_min) == 1
+            yield ('\t<object>\n' +
+                   _element('\t\t', 'name', each_object['name']) +
+                   '\t\t<pose>Unspecified</pose>\n'
+                   '\t\t<truncated>%d</truncated>\n'
+                   '\t\t<difficult>%d</difficult>\n'
+                   '\t\t<bndbox>\n' % (truncated, bool(each_object['difficult'])) +
+                   _element('\t\t\t', 'xmin', str(x_min)) +
+                   _element('\t\t\t', 'ymin', str(y_min)) +
+                   _element('\t\t\t', 'xmax', str(x_max)) +
+                   _element('\t\t\t', 'ymax', str(y_max)) +
+                   '\t\t</bndbox>\n'
+                   '\t</object>\n')
 
     def save(self, target_file=None):
-        root = self.gen_xml()
-        self.append_objects(root)
-        out_file = None
+        xml = self.gen_xml()
+        if xml is None:
+            raise ValueError('folder name, filename and image size are required')
         if target_file is None:
-            out_file = codecs.open(
-                self.filename + XML_EXT, 'w', encoding=ENCODE_METHOD)
-        else:
-            out_file = codecs.open(target_file, 'w', encoding=ENCODE_METHOD)
-
-        prettify_result = self.prettify(root)
-        out_file.write(prettify_result.decode('utf8'))
-        out_file.close()
+            target_file = self.filename + XML_EXT
+        with codecs.open(target_file, 'w', encoding=ENCODE_METHOD) as out_file:
+            out_file.write(xml)
+
+
+class PascalVocParseError(ValueError):
+    pass
+
+
+def _object_to_box(object_elem):
+    label = object_elem.findtext('name')
+    bnd_box = object_elem.find('bndbox')
+    if label is None or bnd_box is None:
+        raise PascalVocParseError('object without name or bndbox')
+    try:
+        x_min = int(float(bnd_box.findtext('xmin')))
+        y_min = int(float(bnd_box.findtext('ymin')))
+        x_max = int(float(bnd_box.findtext('xmax')))
+        y_max = int(float(bnd_box.findtext('ymax')))
+        # An empty <difficult/> means not difficult, like a missing one
+        difficult = bool(int((object_elem.findtext('difficult') or '').strip() or 0))
+    except (TypeError, ValueError) as e:
+        raise PascalVocParseError('invalid bndbox of %r: %s' % (label, e))
+    return label, x_min, y_min, x_max, y_max, difficult
+
+
+def parse_voc_file(file_path):
+    """
+        Stream a Pascal VOC file with iterparse and return (verified, boxes).
+        Each box is a compact (label, x_min, y_min, x_max, y_max, difficult) tuple.
+        Elements are cleared as soon as they are consumed so memory stays flat.
+        Raise PascalVocParseError if the file cannot be read or is malformed.
+    """
+    verified = False
+    boxes = []
+    try:
+        context = etree.iterparse(file_path, events=('start', 'end'))
+        for event, elem in context:
+            if event == 'start':
+                if elem.getparent() is None:
+                    if elem.tag != 'annotation':
+                        raise PascalVocParseError('root element is <%s>, not <annotation>' % elem.tag)
+                    verified = elem.get('verified') == 'yes'
+                continue
+            if elem.tag == 'object':
+                boxes.append(_object_to_box(elem))
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        del context
+    except (etree.XMLSyntaxError, OSError) as e:
+        raise PascalVocParseError('%s: %s' % (file_path, e))
+    except PascalVocParseError as e:
+        raise PascalVocParseError('%s: %s' % (file_path, e))
+    return verified, boxes
+
+
+def _parse_voc_file_safe(file_path):
+    try:
+        verified, boxes = parse_voc_file(file_path)
+        return file_path, verified, boxes, None
+    except PascalVocParseError as e:
+        return file_path, False, [], str(e)
+
+
+def parse_voc_files(file_paths, max_workers=None, chunk_size=64):
+    """
+        Parse many Pascal VOC files with a process pool.
+        Return a list of (file_path, verified, boxes, error) in input order,
+        where error is None or the message of the PascalVocParseError.
+    """
+    file_paths = list(file_paths)
+    if max_workers == 1 or len(file_paths) <= chunk_size:
+        return [_parse_voc_file_safe(path) for path in file_paths]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_parse_voc_file_safe, file_paths, chunksize=chunk_size))
 
 
 class PascalVocReader:
@@ -132,40 +185,18 @@ class PascalVocReader:
         self.shapes = []
         self.file_path = file_path
         self.verified = False
-        try:
-            self.parse_xml()
-        except:
-            pass
+        self.parse_xml()
 
     def get_shapes(self):
         return self.shapes
 
-    def add_shape(self, label, bnd_box, difficult):
-        x_min = int(float(bnd_box.find('xmin').text))
-        y_min = int(float(bnd_box.find('ymin').text))
-        x_max = int(float(bnd_box.find('xmax').text))
-        y_max = int(float(bnd_box.find('ymax').text))
+    def add_shape(self, label, x_min, y_min, x_max, y_max, difficult):
         points = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
         self.shapes.append((label, points, None, None, difficult))
 
     def parse_xml(self):
         assert self.file_path.endswith(XML_EXT), "Unsupported file format"
-        parser = etree.XMLParser(encoding=ENCODE_METHOD)
-        xml_tree = ElementTree.parse(self.file_path, parser=parser).getroot()
-        filename = xml_tree.find('filename').text
-        try:
-            verified = xml_tree.attrib['verified']
-            if verified == 'yes':
-                self.verified = True
-        except KeyError:
-            self.verified = False
-
-        for object_iter in xml_tree.findall('object'):
-            bnd_box = object_iter.find("bndbox")
-            label = object_iter.find('name').text
-            # Add chris
-            difficult = False
-            if object_iter.find('difficult') is not None:
-                difficult = bool(int(object_iter.find('difficult').text))
-            self.add_shape(label, bnd_box, difficult)
+        self.verified, boxes = parse_voc_file(self.file_path)
+        for label, x_min, y_min, x_max, y_max, difficult in boxes:
+            self.add_shape(label, x_min, y_min, x_max, y_max, difficult)
         return True
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+import http.client as httplib
+from urllib.parse import quote, unquote, urlencode, urlsplit
+
+from libs.image_source import ImageSource, ImageSourceError, member_name
+
+REMOTE_SCHEMES = ('http://', 'https://')
+POOL_SIZE = 8
+PREFETCH_WORKERS = 4
+TIMEOUT = 30
+CACHE_BYTES = 1 << 30
+
+
+def is_remote(path):
+    return path.lower().startswith(REMOTE_SCHEMES)
+
+
+def remote_root(netloc, base_path):
+    """The local looking directory the images under base_path on netloc are listed in."""
+    parts = [unquote(part) for part in base_path.split('/') if part]
+    return os.path.join(os.sep, 'remote', netloc.replace(':', '_'), *parts)
+
+
+def _tag(element):
+    # S3 answers in its own namespace, compatible servers not always
+    return element.tag.rsplit('}', 1)[-1]
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive HTTP connections to one host. A connection is taken for one
+    request at a time and put back afterwards, so several threads can download
+    at once without opening a new connection for every image.
+    """
+
+    def __init__(self, scheme, netloc, size=POOL_SIZE, timeout=TIMEOUT):
+        self.connection_class = httplib.HTTPSConnection if scheme == 'https' else httplib.HTTPConnection
+        self.netloc = netloc
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def request(self, method, path, headers=None):
+        """Send a request and return (status, body). Raises ImageSourceError on network errors."""
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            reused = connection is not None
+            if connection is None:
+                connection = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, OSError) as e:
+                connection.close()
+                if reused:
+                    # The server dropped an idle connection, try again on a fresh one
+                    continue
+                raise ImageSourceError('%s %s%s failed: %s' % (method, self.netloc, path, e))
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    if len(self._idle) < self.size:
+                        self._idle.append(connection)
+                        connection = None
+                if connection is not None:
+                    connection.close()
+            return response.status, body
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class DiskCache(object):
+    """
+    Files kept in a directory up to max_bytes in total, the least recently used
+    are removed first. The modification time of a file is its last use, so the
+    order survives restarts. Safe to use from several threads.
+    """
+
+    def __init__(self, directory, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        entries = []
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError:
+            pass
+        entries.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in entries)
+        self.total_bytes = sum(size for _, _, size in entries)
+        with self._lock:
+            self._evict()
+
+    def _name(self, key):
+        return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def __contains__(self, key):
+        return self._name(key) in self._entries
+
+    def get(self, key):
+        name = self._name(key)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(name, 0)
+            return None
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        tmp_path = '%s.%d.tmp' % (path, threading.current_thread().ident)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is only a cache
+            return
+        with self._lock:
+            self.total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class RemoteSource(ImageSource):
+    """
+    Images on an HTTP server or an S3 compatible object store. url is either a
+    bucket or prefix, http://host/bucket/prefix/, listed with ListObjectsV2, or a
+    .txt manifest with one path per line relative to the manifest. Downloads go
+    through a pool of keep-alive connections and are kept in a disk cache shared
+    by all remote sources; prefetch() downloads the next images concurrently.
+    Only anonymous access is supported, e.g. public buckets.
+    """
+
+    def __init__(self, url, cache_dir=None, cache_bytes=CACHE_BYTES,
+                 pool_size=POOL_SIZE, workers=PREFETCH_WORKERS):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ImageSourceError('%s is not an http or https url' % url)
+        self.url = url
+        self._pool = ConnectionPool(parts.scheme, parts.netloc, pool_size)
+        self._origin = '%s://%s' % (parts.scheme, parts.netloc)
+        path = unquote(parts.path) or '/'
+        try:
+            if path.lower().endswith('.txt'):
+                self.base_path = path.rsplit('/', 1)[0] + '/'
+                # Relative name -> (etag, size), unknown for a manifest
+                self.members = self._list_manifest(path)
+            else:
+                self.base_path = path.rstrip('/') + '/'
+                self.members = self._list_bucket()
+        except ImageSourceError:
+            self._pool.close()
+            raise
+        super(RemoteSource, self).__init__(remote_root(parts.netloc, self.base_path), cache_dir)
+        self.disk_cache = cache_dir and DiskCache(os.path.join(cache_dir, 'remote'), cache_bytes)
+        self._workers = workers
+        self._executor = None
+        # Relative name -> future of a prefetch that has not finished
+        self._pending = {}
+        # Reentrant, a finished future runs its done callback right away
+        self._lock = threading.RLock()
+
+    def _get(self, path, query=None):
+        target = quote(path)
+        if query:
+            target += '?' + urlencode(query)
+        return self._pool.request('GET', target)
+
+    def _list_manifest(self, path):
+        status, body = self._get(path)
+        if status != 200:
+            raise ImageSourceError('HTTP %d for %s' % (status, self.url))
+        members = {}
+        for line in body.decode('utf-8', 'replace').splitlines():
+            line = line.strip()
+            name = member_name(line) if line and not line.startswith('#') else None
+            if name is not None:
+                members[name] = (None, None)
+        return members
+
+    def _list_bucket(self):
+        bucket, _, prefix = self.base_path.strip('/').partition('/')
+        if not bucket:
+            raise ImageSourceError('%s names no bucket' % self.url)
+        prefix = prefix + '/' if prefix else ''
+        query = [('list-type', '2'), ('prefix', prefix)]
+        members = {}
+        token = None
+        while True:
+            status, body = self._get('/' + bucket, query + ([('continuation-token', token)] if token else []))
+            if status != 200:
+                raise ImageSourceError('HTTP %d listing %s' % (status, self.url))
+            try:
+                result = ElementTree.fromstring(body)
+            except ElementTree.ParseError:
+                result = None
+            if result is None or _tag(result) != 'ListBucketResult':
+                raise ImageSourceError('%s is neither a bucket listing nor a .txt manifest' % self.url)
+            fields = dict((_tag(child), child.text) for child in result if _tag(child) != 'Contents')
+            for contents in result:
+                if _tag(contents) != 'Contents':
+                    continue
+                values = dict((_tag(child), child.text or '') for child in contents)
+                name = member_name(values.get('Key', '')[len(prefix):])
+                if name is None or name.endswith('/'):
+                    continue
+                size = values.get('Size')
+                members[name] = (values.get('ETag'), int(size) if size and size.isdigit() else None)
+            token = fields.get('NextContinuationToken')
+            if fields.get('IsTruncated') != 'true' or not token:
+                return members
+
+    def _name(self, path):
+        if not self.owns(path):
+            return None
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def path_of(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def url_of(self, name):
+        return self._origin + quote(self.base_path + name)
+
+    def list_images(self, extensions):
+        return [self.path_of(name) for name in self.members if os.path.splitext(name)[1].lower() in extensions]
+
+    def exists(self, path):
+        return self._name(path) in self.members
+
+    def signature(self, path):
+        name = self._name(path)
+        if name not in self.members:
+            return None
+        return (name,) + tuple(self.members[name])
+
+    def _cache_key(self, name):
+        etag, size = self.members[name]
+        return '%s %s' % (self.url_of(name), etag or '')
+
+    def _download(self, name):
+        key = self._cache_key(name)
+        if self.disk_cache:
+            data = self.disk_cache.get(key)
+            if data is not None:
+                return data
+        status, data = self._get(self.base_path + name)
+        if status != 200:
+            raise ImageSourceError('HTTP %d for %s' % (status, self.url_of(name)))
+        size = self.members[name][1]
+        if size is not None and len(data) != size:
+            raise ImageSourceError('Truncated %s' % self.url_of(name))
+        if self.disk_cache:
+            self.disk_cache.put(key, data)
+        return data
+
+    def read(self, path):
+        name = self._name(path)
+        if name not in self.members:
+            raise ImageSourceError('%s is not in %s' % (path, self.url))
+        with self._lock:
+            future = self._pending.get(name)
+        if future is not None and not future.cancelled():
+            # Already on its way
+            try:
+                return future.result()
+            except Exception:
+                pass
+        return self._download(name)
+
+    def prefetch(self, paths):
+        """Download paths in the background, prefetches no longer asked for are dropped if not started."""
+        if not self.disk_cache:
+            return
+        names = [self._name(path) for path in paths]
+        names = [name for name in names if name in self.members and self._cache_key(name) not in self.disk_cache]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers)
+            for name, future in list(self._pending.items()):
+                if name not in names and future.cancel():
+                    del self._pending[name]
+            for name in names:
+                if name not in self._pending:
+                    future = self._executor.submit(self._download, name)
+                    self._pending[name] = future
+                    future.add_done_callback(lambda _future, name=name: self._done(name, _future))
+
+    def _done(self, name, future):
+        with self._lock:
+            if self._pending.get(name) is future:
+                del self._pending[name]
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self._pool.close()
@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+
+def write_atomically(target_file, write):
+    """
+    Call write(tmp_file) and move the result over target_file with a single rename,
+    so readers never see a half written annotation.
+    """
+    directory, name = os.path.split(os.path.abspath(target_file))
+    tmp_file = os.path.join(directory, '.%s.tmp' % name)
+    try:
+        write(tmp_file)
+        os.replace(tmp_file, target_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+class SaveQueue(QObject):
+    """
+    Runs annotation writes on a worker thread. Jobs are keyed by the file they
+    write: queuing a key that is still pending replaces the older job, so rapid
+    re-saves of the same file only hit the disk once.
+    """
+    saved = pyqtSignal(str)
+    saveFailed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super(SaveQueue, self).__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()
+        self._active = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='labelImg-save-queue')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, key, job):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('save queue is closed')
+            self._pending.pop(key, None)
+            self._pending[key] = job
+            self._condition.notify_all()
+
+    def is_pending(self, key=None):
+        with self._condition:
+            return self._is_pending(key)
+
+    def _is_pending(self, key):
+        if key is None:
+            return bool(self._pending) or self._active is not None
+        return key in self._pending or self._active == key
+
+    def wait(self, key=None):
+        """Block until the write of key, or every queued write, has finished."""
+        with self._condition:
+            while self._is_pending(key):
+                self._condition.wait()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                key, job = self._pending.popitem(last=False)
+                self._active = key
+            error = None
+            try:
+                job()
+            except Exception as e:
+                error = str(e) or repr(e)
+            with self._condition:
+                self._active = None
+                self._condition.notify_all()
+            if error is None:
+                self.saved.emit(key)
+            else:
+                self.saveFailed.emit(key, error)
@@ -10,7 +10,6 @@ except ImportError:
     from PyQt4.QtCore import *
 
 from libs.utils import distance
-import sys
 
 DEFAULT_LINE_COLOR = QColor(0, 255, 0, 128)
 DEFAULT_FILL_COLOR = QColor(255, 0, 0, 128)
@@ -40,7 +39,8 @@ class Shape(object):
 
     def __init__(self, label=None, line_color=None, difficult=False, paint_label=False):
         self.label = label
-        self.points = []
+        self._points = []
+        self.invalidate()
         self.fill = False
         self.selected = False
         self.difficult = difficult
@@ -61,8 +61,29 @@ class Shape(object):
             # is used for drawing the pending line a different color.
             self.line_color = line_color
 
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drop the cached paths and bounding rect. Anything that changes the points in
+        place other than through the Shape methods must call this.
+        """
+        self._path = None
+        self._bounding_rect = None
+        self._line_path = None
+        self._vertex_path = None
+        self._vertex_key = None
+
     def close(self):
         self._closed = True
+        self._line_path = None
 
     def reach_max_points(self):
         if len(self.points) >= 4:
@@ -72,9 +93,11 @@ class Shape(object):
     def add_point(self, point):
         if not self.reach_max_points():
             self.points.append(point)
+            self.invalidate()
 
     def pop_point(self):
         if self.points:
+            self.invalidate()
             return self.points.pop()
         return None
 
@@ -83,6 +106,7 @@ class Shape(object):
 
     def set_open(self):
         self._closed = False
+        self._line_path = None
 
     def paint(self, painter):
         if self.points:
@@ -92,20 +116,8 @@ class Shape(object):
             pen.setWidth(max(1, int(round(2.0 / self.scale))))
             painter.setPen(pen)
 
-            line_path = QPainterPath()
-            vertex_path = QPainterPath()
-
-            line_path.moveTo(self.points[0])
-            # Uncommenting the following line will draw 2 paths
-            # for the 1st vertex, and make it non-filled, which
-            # may be desirable.
-            # self.drawVertex(vertex_path, 0)
-
-            for i, p in enumerate(self.points):
-                line_path.lineTo(p)
-                self.draw_vertex(vertex_path, i)
-            if self.is_closed():
-                line_path.lineTo(self.points[0])
+            line_path = self.line_path()
+            vertex_path = self.vertex_path()
 
             painter.drawPath(line_path)
             painter.drawPath(vertex_path)
@@ -113,27 +125,76 @@ class Shape(object):
 
             # Draw text at the top-left
             if self.paint_label:
-                min_x = sys.maxsize
-                min_y = sys.maxsize
-                min_y_label = int(1.25 * self.label_font_size)
-                for point in self.points:
-                    min_x = min(min_x, point.x())
-                    min_y = min(min_y, point.y())
-                if min_x != sys.maxsize and min_y != sys.maxsize:
-                    font = QFont()
-                    font.setPointSize(self.label_font_size)
-                    font.setBold(True)
-                    painter.setFont(font)
-                    if self.label is None:
-                        self.label = ""
-                    if min_y < min_y_label:
-                        min_y += min_y_label
-                    painter.drawText(int(min_x), int(min_y), self.label)
+                painter.setFont(self.label_font())
+                if self.label is None:
+                    self.label = ""
+                painter.drawText(self.label_position(), self.label)
 
             if self.fill:
                 color = self.select_fill_color if self.selected else self.fill_color
                 painter.fillPath(line_path, color)
 
+    def label_font(self):
+        font = QFont()
+        font.setPointSize(self.label_font_size)
+        font.setBold(True)
+        return font
+
+    def label_position(self):
+        """Baseline origin of the label text, at the top-left of the shape."""
+        rect = self.bounding_rect()
+        min_x = rect.left()
+        min_y = rect.top()
+        min_y_label = int(1.25 * self.label_font_size)
+        if min_y < min_y_label:
+            min_y += min_y_label
+        return QPoint(int(min_x), int(min_y))
+
+    def paint_rect(self):
+        """
+        The area paint draws into, in image coordinates: the outline grown by the
+        largest vertex marker and the pen, plus the label text.
+        """
+        rect = self.bounding_rect()
+        largest = max(size for size, _ in self._highlight_settings.values())
+        margin = self.point_size * largest / (2.0 * self.scale) + max(1, int(round(2.0 / self.scale)))
+        rect.adjust(-margin, -margin, margin, margin)
+        if self.paint_label:
+            text = QFontMetricsF(self.label_font()).boundingRect(self.label or "")
+            rect = rect.united(text.translated(QPointF(self.label_position())).adjusted(-1, -1, 1, 1))
+        return rect
+
+    def line_path(self):
+        """The outline drawn by paint, built once until the points change."""
+        if self._line_path is None:
+            path = QPainterPath(self.points[0])
+            for p in self.points:
+                path.lineTo(p)
+            if self.is_closed():
+                path.lineTo(self.points[0])
+            self._line_path = path
+        return self._line_path
+
+    def vertex_path(self):
+        """
+        The vertex markers drawn by paint. Their size depends on the zoom and the
+        highlighted vertex, so those are part of the cache key.
+        """
+        key = (self.scale, self.point_size, self.point_type, self._highlight_index, self._highlight_mode)
+        if self._vertex_path is None or key != self._vertex_key:
+            path = QPainterPath()
+            # Drawing the 1st vertex twice would make it non-filled, which
+            # may be desirable.
+            for i in range(len(self.points)):
+                self.draw_vertex(path, i)
+            self._vertex_path = path
+            self._vertex_key = key
+        elif self._highlight_index is not None:
+            self.vertex_fill_color = self.h_vertex_fill_color
+        else:
+            self.vertex_fill_color = Shape.vertex_fill_color
+        return self._vertex_path
+
     def draw_vertex(self, path, i):
         d = self.point_size / self.scale
         shape = self.point_type
@@ -165,19 +226,24 @@ class Shape(object):
         return self.make_path().contains(point)
 
     def make_path(self):
-        path = QPainterPath(self.points[0])
-        for p in self.points[1:]:
-            path.lineTo(p)
-        return path
+        if self._path is None:
+            path = QPainterPath(self.points[0])
+            for p in self.points[1:]:
+                path.lineTo(p)
+            self._path = path
+        return self._path
 
     def bounding_rect(self):
-        return self.make_path().boundingRect()
+        if self._bounding_rect is None:
+            self._bounding_rect = self.make_path().boundingRect()
+        return QRectF(self._bounding_rect)
 
     def move_by(self, offset):
         self.points = [p + offset for p in self.points]
 
     def move_vertex_by(self, i, offset):
         self.points[i] = self.points[i] + offset
+        self.invalidate()
 
     def highlight_vertex(self, i, action):
         self._highlight_index = i
@@ -207,3 +273,4 @@ class Shape(object):
 
     def __setitem__(self, key, value):
         self.points[key] = value
+        self.invalidate()
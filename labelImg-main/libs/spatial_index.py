@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import math
+
+GRID_CELL_SIZE = 128
+
+
+class GridIndex(object):
+    """
+    Uniform grid over axis aligned rectangles. Every item is listed in the cells
+    its rectangle overlaps, so a query only looks at the items near the queried area.
+    Items must be hashable.
+    """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def _cell_range(self, x_min, y_min, x_max, y_max):
+        size = self.cell_size
+        return (int(math.floor(x_min / size)), int(math.floor(y_min / size)),
+                int(math.floor(x_max / size)), int(math.floor(y_max / size)))
+
+    def insert(self, item, x_min, y_min, x_max, y_max):
+        """Add item, or move it if it is already indexed."""
+        if item in self._items:
+            self.remove(item)
+        cells = self._cell_range(x_min, y_min, x_max, y_max)
+        self._items[item] = cells
+        col_min, row_min, col_max, row_max = cells
+        for col in range(col_min, col_max + 1):
+            for row in range(row_min, row_max + 1):
+                self._cells.setdefault((col, row), set()).add(item)
+
+    def remove(self, item):
+        cells = self._items.pop(item, None)
+        if cells is None:
+            return
+        col_min, row_min, col_max, row_max = cells
+        for col in range(col_min, col_max + 1):
+            for row in range(row_min, row_max + 1):
+                bucket = self._cells.get((col, row))
+                if bucket is not None:
+                    bucket.discard(item)
+                    if not bucket:
+                        del self._cells[(col, row)]
+
+    def query(self, x_min, y_min, x_max, y_max):
+        """Items whose cells overlap the rectangle, a superset of the items it intersects."""
+        col_min, row_min, col_max, row_max = self._cell_range(x_min, y_min, x_max, y_max)
+        found = set()
+        for col in range(col_min, col_max + 1):
+            for row in range(row_min, row_max + 1):
+                bucket = self._cells.get((col, row))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def clear(self):
+        self._cells.clear()
+        self._items.clear()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DB_EXT = '.db'
+DATABASE_FILE = 'annotations' + DB_EXT
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    folder TEXT,
+    path TEXT,
+    width INTEGER,
+    height INTEGER,
+    depth INTEGER,
+    verified INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS boxes (
+    id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    class_id INTEGER NOT NULL REFERENCES classes(id),
+    x_min REAL NOT NULL,
+    y_min REAL NOT NULL,
+    x_max REAL NOT NULL,
+    y_max REAL NOT NULL,
+    difficult INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS boxes_image ON boxes(image_id);
+CREATE INDEX IF NOT EXISTS boxes_class ON boxes(class_id);
+'''
+
+
+class AnnotationDatabaseError(Exception):
+    pass
+
+
+def database_path(annotation_dir):
+    return os.path.join(annotation_dir, DATABASE_FILE)
+
+
+class AnnotationDatabase(object):
+    """
+        The annotations of a whole directory in one SQLite file instead of one
+        file per image. Images are keyed by file name, like the other formats in
+        a save dir. Every put() is one transaction, so a crash leaves either the
+        old or the new boxes of an image. Open databases are shared through
+        open(), the connection is safe to use from several threads.
+    """
+    _open_databases = {}
+    _open_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, db_path):
+        key = os.path.abspath(db_path)
+        with cls._open_lock:
+            database = cls._open_databases.get(key)
+            if database is None:
+                database = cls._open_databases[key] = cls(db_path)
+        return database
+
+    @classmethod
+    def get_open(cls, db_path):
+        return cls._open_databases.get(os.path.abspath(db_path))
+
+    @classmethod
+    def close_all(cls):
+        for database in list(cls._open_databases.values()):
+            database.close()
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        self._lock = threading.Lock()
+        try:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute('PRAGMA foreign_keys = ON')
+            version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                self._connection.close()
+                raise AnnotationDatabaseError('%s was written by a newer labelImg' % db_path)
+            with self._connection:
+                self._connection.executescript(SCHEMA)
+                self._connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        except sqlite3.Error as e:
+            raise AnnotationDatabaseError('Cannot open %s: %s' % (db_path, e))
+
+    def put(self, filename, boxes, verified=False, size=None, folder=None, path=None):
+        """
+            Replace the annotation of filename. boxes are (label, x_min, y_min, x_max, y_max, difficult)
+            tuples, size is [height, width, depth].
+        """
+        self.put_many([(filename, boxes, verified, size, folder, path)])
+
+    def put_many(self, records):
+        """Write several put() records in a single transaction."""
+        with self._lock, self._connection:
+            cursor = self._connection.cursor()
+            class_ids = {}
+            for filename, boxes, verified, size, folder, path in records:
+                height, width, depth = size or (None, None, None)
+                cursor.execute(
+                    'INSERT INTO images (filename, folder, path, width, height, depth, verified) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(filename) DO UPDATE SET '
+                    'folder = excluded.folder, path = excluded.path, width = excluded.width, '
+                    'height = excluded.height, depth = excluded.depth, verified = excluded.verified',
+                    (filename, folder, path, width, height, depth, int(bool(verified))))
+                image_id = cursor.execute('SELECT id FROM images WHERE filename = ?', (filename,)).fetchone()[0]
+                cursor.execute('DELETE FROM boxes WHERE image_id = ?', (image_id,))
+                rows = []
+                for label, x_min, y_min, x_max, y_max, difficult in boxes:
+                    class_id = class_ids.get(label)
+                    if class_id is None:
+                        cursor.execute('INSERT OR IGNORE INTO classes (name) VALUES (?)', (label,))
+                        class_id = class_ids[label] = cursor.execute(
+                            'SELECT id FROM classes WHERE name = ?', (label,)).fetchone()[0]
+                    rows.append((image_id, class_id, x_min, y_min, x_max, y_max, int(bool(difficult))))
+                cursor.executemany('INSERT INTO boxes (image_id, class_id, x_min, y_min, x_max, y_max, difficult) '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def delete(self, filename):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM images WHERE filename = ?', (filename,))
+
+    def get(self, filename):
+        """Return (verified, boxes, size) of filename, or None if it is not in the database."""
+        with self._lock:
+            image = self._connection.execute(
+                'SELECT id, verified, height, width, depth FROM images WHERE filename = ?', (filename,)).fetchone()
+            if image is None:
+                return None
+            boxes = self._connection.execute(
+                'SELECT classes.name, x_min, y_min, x_max, y_max, difficult FROM boxes '
+                'JOIN classes ON classes.id = boxes.class_id WHERE image_id = ? ORDER BY boxes.id',
+                (image[0],)).fetchall()
+        size = list(image[2:]) if image[2] is not None else None
+        return bool(image[1]), [(label, x_min, y_min, x_max, y_max, bool(difficult))
+                                for label, x_min, y_min, x_max, y_max, difficult in boxes], size
+
+    def status(self, filename):
+        """Return (box count, verified) of filename, or None if it is not in the database."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT COUNT(boxes.id), verified FROM images LEFT JOIN boxes ON boxes.image_id = images.id '
+                'WHERE filename = ? GROUP BY images.id', (filename,)).fetchone()
+        return None if row is None else (row[0], bool(row[1]))
+
+    def statuses(self):
+        """Return {filename: (box count, verified)} of every image, in one query."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT filename, COUNT(boxes.id), verified FROM images '
+                'LEFT JOIN boxes ON boxes.image_id = images.id GROUP BY images.id').fetchall()
+        return dict((filename, (box_count, bool(verified))) for filename, box_count, verified in rows)
+
+    def filenames(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute('SELECT filename FROM images ORDER BY filename')]
+
+    def classes(self):
+        """Class names in the order they were first used."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute('SELECT name FROM classes ORDER BY id')]
+
+    def count(self, label):
+        """Number of boxes labelled label."""
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM boxes JOIN classes ON classes.id = boxes.class_id WHERE classes.name = ?',
+                (label,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        with self._open_lock:
+            if self._open_databases.get(self.db_path) is self:
+                del self._open_databases[self.db_path]
+
+
+_status_cache = OrderedDict()
+STATUS_CACHE_SIZE = 32
+
+
+def load_database_statuses(db_path):
+    """
+        Return AnnotationDatabase.statuses() of db_path, cached until the file
+        changes, so checking many images of one database is a single query.
+    """
+    key = os.path.abspath(db_path)
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _status_cache.get(key)
+    if cached is not None and cached[0] == signature:
+        _status_cache.move_to_end(key)
+        return cached[1]
+
+    statuses = AnnotationDatabase.open(key).statuses()
+    _status_cache[key] = (signature, statuses)
+    if len(_status_cache) > STATUS_CACHE_SIZE:
+        _status_cache.popitem(last=False)
+    return statuses
+
+
+class SQLiteReader:
+    def __init__(self, db_path, file_path):
+        self.db_path = db_path
+        self.shapes = []
+        self.verified = False
+        self.found = False
+        self.filename = os.path.basename(file_path)
+        try:
+            self.parse_database()
+        except sqlite3.Error as e:
+            raise AnnotationDatabaseError('Cannot read %s: %s' % (db_path, e))
+
+    def parse_database(self):
+        record = AnnotationDatabase.open(self.db_path).get(self.filename)
+        self.shapes = []
+        self.found = record is not None
+        if record is not None:
+            self.verified, boxes, _ = record
+            for label, x_min, y_min, x_max, y_max, difficult in boxes:
+                points = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
+                self.shapes.append((label, points, None, None, difficult))
+
+    def get_shapes(self):
+        return self.shapes
@@ -0,0 +1,241 @@
+import math
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtCore import QObject, QRect, QRectF, QSize, pyqtSignal
+    from PyQt5.QtGui import QImageIOHandler, QImageReader
+except ImportError:
+    from PyQt4.QtCore import QObject, QRect, QRectF, QSize, pyqtSignal
+    from PyQt4.QtGui import QImageIOHandler, QImageReader
+
+from libs.image_cache import image_bytes
+
+# Images with more pixels than this are decoded in tiles instead of as a whole
+TILED_IMAGE_PIXELS = 64 * 1024 * 1024
+TILE_SIZE = 512
+TILE_CACHE_BYTES = 256 * 1024 * 1024
+OVERVIEW_SIZE = 2048
+
+
+def _tile_reader(file_path):
+    reader = QImageReader(file_path)
+    if not reader.canRead():
+        return None
+    # Tiles need a decoder that can read a region and scale while decoding (JPEG
+    # does, by DCT scaling), and the image must not need an EXIF rotation, which
+    # such reads do not get.
+    if not (reader.supportsOption(QImageIOHandler.ClipRect) and reader.supportsOption(QImageIOHandler.ScaledSize)):
+        return None
+    if hasattr(reader, 'transformation') and reader.transformation() != QImageIOHandler.TransformationNone:
+        return None
+    return reader
+
+
+def use_tiles(file_path):
+    """True if file_path is too large to decode at once and its format can be read in tiles."""
+    reader = _tile_reader(file_path)
+    if reader is None:
+        return False
+    size = reader.size()
+    return size.width() * size.height() > TILED_IMAGE_PIXELS
+
+
+class TiledImage(QObject):
+    """
+    A very large image decoded in tiles on demand, with the QImage methods the
+    rest of labelImg uses for sizes. Tiles are decoded on a worker thread at the
+    resolution the zoom needs, halving it per level, and kept in an LRU cache
+    bounded by bytes. A level that fits in a quarter of the cache is decoded in
+    one pass and cut into tiles. Larger levels are never decoded whole: the
+    visible tiles of each tile row are read with one clip rect, since a JPEG
+    clip read decodes every row above the clip and per tile reads would pay
+    that again for every column. Until a tile is ready its area is drawn from a
+    small overview of the whole image. tileReady is emitted when tiles arrive.
+    """
+    tileReady = pyqtSignal()
+
+    def __init__(self, file_path, cache_bytes=TILE_CACHE_BYTES, parent=None):
+        super(TiledImage, self).__init__(parent)
+        self.file_path = file_path
+        self.cache_bytes = cache_bytes
+        reader = QImageReader(file_path)
+        self._size = reader.size()
+        factor = max(1.0, max(self._size.width(), self._size.height()) / float(OVERVIEW_SIZE))
+        reader.setScaledSize(QSize(max(1, int(self._size.width() / factor)), max(1, int(self._size.height() / factor))))
+        self.overview = reader.read()
+        self._tiles = OrderedDict()
+        self._tile_bytes = 0
+        self._queue = []
+        # Keys being decoded right now
+        self._loading = set()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='labelImg-tiles')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def open(cls, file_path):
+        """A TiledImage for file_path, or None if it should be decoded as a plain QImage."""
+        if not use_tiles(file_path):
+            return None
+        image = cls(file_path)
+        if image.overview.isNull():
+            image.close()
+            return None
+        return image
+
+    def width(self):
+        return self._size.width()
+
+    def height(self):
+        return self._size.height()
+
+    def size(self):
+        return QSize(self._size)
+
+    def rect(self):
+        return QRect(0, 0, self.width(), self.height())
+
+    def isNull(self):
+        return self.overview.isNull()
+
+    def isGrayscale(self):
+        return self.overview.isGrayscale()
+
+    def __bool__(self):
+        return not self.isNull()
+
+    __nonzero__ = __bool__
+
+    @staticmethod
+    def level_for(scale):
+        """Pyramid level for a zoom factor: level n is decoded at 1 / 2**n of full size."""
+        if scale >= 1:
+            return 0
+        return int(math.floor(math.log(1.0 / scale, 2)))
+
+    def paint(self, painter, rect, scale):
+        """Paint the part of the image inside rect, in image coordinates, at zoom scale."""
+        image_rect = QRectF(0, 0, self.width(), self.height())
+        rect = QRectF(rect).intersected(image_rect)
+        if rect.isEmpty():
+            return
+        overview_factor = self.overview.width() / float(self.width())
+        if scale <= overview_factor:
+            # The overview has all the detail this zoom can show
+            painter.drawImage(image_rect, self.overview)
+            return
+
+        level = self.level_for(scale)
+        span = TILE_SIZE << level
+        first_col, last_col = int(rect.left()) // span, int(math.ceil(rect.right())) // span
+        first_row, last_row = int(rect.top()) // span, int(math.ceil(rect.bottom())) // span
+        missing = []
+        with self._condition:
+            for row in range(first_row, last_row + 1):
+                for col in range(first_col, last_col + 1):
+                    target = QRectF(col * span, row * span, span, span).intersected(image_rect)
+                    if target.isEmpty():
+                        continue
+                    key = (level, col, row)
+                    tile = self._tiles.get(key)
+                    if tile is not None:
+                        self._tiles.move_to_end(key)
+                        painter.drawImage(target, tile)
+                    else:
+                        source = QRectF(target.x() * overview_factor, target.y() * overview_factor,
+                                        target.width() * overview_factor, target.height() * overview_factor)
+                        painter.drawImage(target, self.overview, source)
+                        missing.append(key)
+            # Only what is visible now is worth decoding, drop older requests
+            self._queue = [key for key in missing if key not in self._loading]
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._queue = []
+            self._tiles.clear()
+            self._condition.notify_all()
+
+    def _level_size(self, level):
+        factor = float(1 << level)
+        return (max(1, int(math.ceil(self.width() / factor))),
+                max(1, int(math.ceil(self.height() / factor))))
+
+    def _decode(self, level, keys):
+        """Decode the tiles keys of level, return {key: tile} with at least those that could be read."""
+        width, height = self._level_size(level)
+        if width * height * 4 <= self.cache_bytes // 4:
+            reader = QImageReader(self.file_path)
+            if level:
+                reader.setScaledSize(QSize(width, height))
+            image = reader.read()
+            if image.isNull():
+                return {}
+            return self._cut(image, level, 0, 0,
+                             int(math.ceil(width / float(TILE_SIZE))), int(math.ceil(height / float(TILE_SIZE))))
+
+        tiles = {}
+        span = TILE_SIZE << level
+        factor = float(1 << level)
+        for row in sorted(set(key[2] for key in keys)):
+            cols = [key[1] for key in keys if key[2] == row]
+            first_col, last_col = min(cols), max(cols)
+            clip = QRect(first_col * span, row * span, (last_col - first_col + 1) * span, span).intersected(self.rect())
+            reader = QImageReader(self.file_path)
+            reader.setClipRect(clip)
+            if level:
+                reader.setScaledSize(QSize(max(1, int(math.ceil(clip.width() / factor))),
+                                           max(1, int(math.ceil(clip.height() / factor)))))
+            image = reader.read()
+            if not image.isNull():
+                tiles.update(self._cut(image, level, first_col, row, last_col + 1, row + 1))
+        return tiles
+
+    @staticmethod
+    def _cut(image, level, first_col, first_row, end_col, end_row):
+        """Cut image, whose top left is tile (first_col, first_row) of level, into {key: tile}."""
+        tiles = {}
+        for row in range(first_row, end_row):
+            for col in range(first_col, end_col):
+                x, y = (col - first_col) * TILE_SIZE, (row - first_row) * TILE_SIZE
+                tiles[(level, col, row)] = image.copy(x, y, min(TILE_SIZE, image.width() - x),
+                                                      min(TILE_SIZE, image.height() - y))
+        return tiles
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                # The visible tiles of the level asked for first are decoded together
+                level = self._queue[0][0]
+                keys = [key for key in self._queue if key[0] == level and key not in self._tiles]
+                self._queue = [key for key in self._queue if key[0] != level]
+                if not keys:
+                    continue
+                self._loading = set(keys)
+            tiles = self._decode(level, keys)
+            with self._condition:
+                self._loading = set()
+                if self._closed or not tiles:
+                    continue
+                # Tiles still asked for go in last, so the cache keeps them over the rest of the level
+                wanted = set(self._queue)
+                wanted.update(keys)
+                for tile_key in sorted(tiles, key=lambda k: k in wanted):
+                    old = self._tiles.pop(tile_key, None)
+                    if old is not None:
+                        self._tile_bytes -= image_bytes(old)
+                    self._tiles[tile_key] = tiles[tile_key]
+                    self._tile_bytes += image_bytes(tiles[tile_key])
+                self._queue = [k for k in self._queue if k not in tiles]
+                while self._tile_bytes > self.cache_bytes and len(self._tiles) > 1:
+                    _, evicted = self._tiles.popitem(last=False)
+                    self._tile_bytes -= image_bytes(evicted)
+            self.tileReady.emit()
@@ -1,5 +1,7 @@
+from collections import OrderedDict
 from math import sqrt
 from libs.ustr import ustr
+import codecs
 import hashlib
 import re
 import sys
@@ -79,13 +81,98 @@ def format_shortcut(text):
     return '<b>%s</b>+<b>%s</b>' % (mod, key)
 
 
-def generate_color_by_text(text):
-    s = ustr(text)
-    hash_code = int(hashlib.sha256(s.encode('utf-8')).hexdigest(), 16)
+LABEL_COLOR_CACHE_SIZE = 1024
+LABEL_COLOR_ALPHA = 100
+
+# Label text -> QColor, most recently used last
+_label_colors = OrderedDict()
+# Fixed colors from a palette file, see load_label_palette
+_label_palette = {}
+
+
+def _hash_color(text):
+    hash_code = int(hashlib.sha256(text.encode('utf-8')).hexdigest(), 16)
     r = int((hash_code / 255) % 255)
     g = int((hash_code / 65025) % 255)
     b = int((hash_code / 16581375) % 255)
-    return QColor(r, g, b, 100)
+    return QColor(r, g, b, LABEL_COLOR_ALPHA)
+
+
+def generate_color_by_text(text):
+    """
+    The color of a label: from the palette if it has one, derived from a hash of
+    the text otherwise. Colors are cached, the caller gets its own copy.
+    """
+    s = ustr(text)
+    color = _label_colors.get(s)
+    if color is None:
+        color = _label_palette.get(s) or _hash_color(s)
+        _label_colors[s] = color
+        if len(_label_colors) > LABEL_COLOR_CACHE_SIZE:
+            _label_colors.popitem(last=False)
+    else:
+        _label_colors.move_to_end(s)
+    return QColor(color)
+
+
+def warm_label_colors(labels):
+    """Compute the colors of labels ahead of time, e.g. the predefined classes."""
+    for label in labels[:LABEL_COLOR_CACHE_SIZE]:
+        generate_color_by_text(label)
+
+
+def parse_label_color(text):
+    """
+    Color from '#rrggbb', '#aarrggbb' or 'r,g,b[,a]'. The alpha defaults to the
+    one of the generated colors. Returns None if text is not a color.
+    """
+    text = text.strip()
+    if text.startswith('#'):
+        color = QColor(text)
+        if not color.isValid() or len(text) not in (7, 9):
+            return None
+        if len(text) == 7:
+            color.setAlpha(LABEL_COLOR_ALPHA)
+        return color
+    try:
+        values = [int(v) for v in text.split(',')]
+    except ValueError:
+        return None
+    if len(values) == 3:
+        values.append(LABEL_COLOR_ALPHA)
+    if len(values) != 4 or not all(0 <= v <= 255 for v in values):
+        return None
+    return QColor(*values)
+
+
+def load_label_palette(path):
+    """
+    Load fixed label colors from path, one 'label color' per line, where color is
+    anything parse_label_color accepts. The label is everything before the last
+    space, so it may contain spaces. Blank lines and lines starting with '#' are
+    skipped. Returns the number of colors loaded.
+    """
+    palette = {}
+    with codecs.open(path, 'r', 'utf8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.rsplit(None, 1)
+            color = parse_label_color(parts[-1]) if len(parts) == 2 else None
+            if color is None:
+                print('Ignoring label color line: %s' % line)
+                continue
+            palette[parts[0].strip()] = color
+    set_label_palette(palette)
+    return len(palette)
+
+
+def set_label_palette(palette):
+    """Replace the fixed label colors, a dict of label text -> QColor."""
+    _label_palette.clear()
+    _label_palette.update((ustr(label), QColor(color)) for label, color in palette.items())
+    _label_colors.clear()
 
 
 def have_qstring():
@@ -97,15 +184,21 @@ def util_qt_strlistclass():
     return QStringList if have_qstring() else list
 
 
+_DIGITS = re.compile('([0-9]+)')
+
+
+def natural_sort_key(text):
+    """
+    Key for natural alphanumeric order: 'f3' < 'f11'.
+    """
+    return [int(c) if c.isdigit() else c for c in _DIGITS.split(text)]
+
+
 def natural_sort(list, key=lambda s:s):
     """
     Sort the list into natural alphanumeric order.
     """
-    def get_alphanum_key_func(key):
-        convert = lambda text: int(text) if text.isdigit() else text
-        return lambda s: [convert(c) for c in re.split('([0-9]+)', key(s))]
-    sort_key = get_alphanum_key_func(key)
-    list.sort(key=sort_key)
+    list.sort(key=lambda s: natural_sort_key(key(s)))
 
 
 # QT4 has a trimmed method, in QT5 this is called strip
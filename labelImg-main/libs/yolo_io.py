@@ -3,11 +3,122 @@
 import codecs
 import os
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from libs.constants import DEFAULT_ENCODING
 
 TXT_EXT = '.txt'
+CLASSES_FILE = 'classes.txt'
 ENCODE_METHOD = DEFAULT_ENCODING
 
+_classes_cache = {}
+
+
+def load_classes(class_list_path):
+    """
+        Return (classes, class_index) for a classes.txt file, where classes is a tuple
+        and class_index maps a class name to its line number. Cached until the file's mtime or size changes.
+    """
+    key = os.path.abspath(class_list_path)
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _classes_cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1], cached[2]
+
+    with open(key, 'r') as classes_file:
+        classes = tuple(classes_file.read().strip('\n').split('\n'))
+    return _cache_classes(key, signature, classes)
+
+
+def _cache_classes(key, signature, classes):
+    class_index = {}
+    for i, name in enumerate(classes):
+        class_index.setdefault(name, i)
+    _classes_cache[key] = (signature, classes, class_index)
+    return classes, class_index
+
+
+def save_classes(class_list_path, classes):
+    """
+        Write classes.txt only if its content differs from classes.
+        Return True if the file was written.
+    """
+    classes = tuple(classes)
+    try:
+        if load_classes(class_list_path)[0] == classes:
+            return False
+    except OSError:
+        pass
+    # Replace the file in one rename, readers may be loading it from another thread
+    tmp_path = class_list_path + '.tmp'
+    with open(tmp_path, 'w') as out_class_file:
+        for c in classes:
+            out_class_file.write(c + '\n')
+    os.replace(tmp_path, class_list_path)
+    stat = os.stat(class_list_path)
+    _cache_classes(os.path.abspath(class_list_path), (stat.st_mtime_ns, stat.st_size), classes)
+    return True
+
+
+def format_yolo_lines(class_indices, boxes, img_size):
+    """
+        Format boxes given as (x_min, y_min, x_max, y_max) in pixels as YOLO label lines.
+    """
+    if not boxes:
+        return ''
+    img_height, img_width = img_size[0], img_size[1]
+    if np is not None:
+        coords = np.asarray(boxes, dtype=float)
+        rows = np.empty((len(boxes), 4))
+        rows[:, 0] = (coords[:, 0] + coords[:, 2]) / 2 / img_width
+        rows[:, 1] = (coords[:, 1] + coords[:, 3]) / 2 / img_height
+        rows[:, 2] = (coords[:, 2] - coords[:, 0]) / img_width
+        rows[:, 3] = (coords[:, 3] - coords[:, 1]) / img_height
+        rows = rows.tolist()
+    else:
+        rows = [(float((x_min + x_max)) / 2 / img_width, float((y_min + y_max)) / 2 / img_height,
+                 float((x_max - x_min)) / img_width, float((y_max - y_min)) / img_height)
+                for x_min, y_min, x_max, y_max in boxes]
+    return ''.join('%d %.6f %.6f %.6f %.6f\n' % (class_index, x_center, y_center, w, h)
+                   for class_index, (x_center, y_center, w, h) in zip(class_indices, rows))
+
+
+def parse_yolo_lines(text, img_size):
+    """
+        Parse the content of a YOLO label file.
+        Return a list of (class_index, x_min, y_min, x_max, y_max) in pixels.
+    """
+    img_height, img_width = img_size[0], img_size[1]
+    rows = [line.split() for line in text.splitlines() if line.strip()]
+    for row in rows:
+        if len(row) != 5:
+            raise ValueError('YOLO label lines must have 5 fields, not %r' % ' '.join(row))
+    if np is not None:
+        values = np.array(rows, dtype=float).reshape(-1, 5)
+        x_center, y_center, w, h = values[:, 1], values[:, 2], values[:, 3], values[:, 4]
+        x_min = np.round(img_width * np.maximum(x_center - w / 2, 0))
+        x_max = np.round(img_width * np.minimum(x_center + w / 2, 1))
+        y_min = np.round(img_height * np.maximum(y_center - h / 2, 0))
+        y_max = np.round(img_height * np.minimum(y_center + h / 2, 1))
+        return list(zip(values[:, 0].astype(int).tolist(),
+                        x_min.astype(int).tolist(), y_min.astype(int).tolist(),
+                        x_max.astype(int).tolist(), y_max.astype(int).tolist()))
+
+    boxes = []
+    for class_index, x_center, y_center, w, h in rows:
+        x_center, y_center, w, h = float(x_center), float(y_center), float(w), float(h)
+        boxes.append((int(float(class_index)),
+                      round(img_width * max(x_center - w / 2, 0)),
+                      round(img_height * max(y_center - h / 2, 0)),
+                      round(img_width * min(x_center + w / 2, 1)),
+                      round(img_height * min(y_center + h / 2, 1))))
+    return boxes
+
+
 class YOLOWriter:
 
     def __init__(self, folder_name, filename, img_size, database_src='Unknown', local_img_path=None):
@@ -25,57 +136,28 @@ class YOLOWriter:
         bnd_box['difficult'] = difficult
         self.box_list.append(bnd_box)
 
-    def bnd_box_to_yolo_line(self, box, class_list=[]):
-        x_min = box['xmin']
-        x_max = box['xmax']
-        y_min = box['ymin']
-        y_max = box['ymax']
-
-        x_center = float((x_min + x_max)) / 2 / self.img_size[1]
-        y_center = float((y_min + y_max)) / 2 / self.img_size[0]
-
-        w = float((x_max - x_min)) / self.img_size[1]
-        h = float((y_max - y_min)) / self.img_size[0]
-
-        # PR387
-        box_name = box['name']
-        if box_name not in class_list:
-            class_list.append(box_name)
-
-        class_index = class_list.index(box_name)
-
-        return class_index, x_center, y_center, w, h
-
     def save(self, class_list=[], target_file=None):
-
-        out_file = None  # Update yolo .txt
-        out_class_file = None   # Update class list .txt
-
         if target_file is None:
-            out_file = open(
-            self.filename + TXT_EXT, 'w', encoding=ENCODE_METHOD)
-            classes_file = os.path.join(os.path.dirname(os.path.abspath(self.filename)), "classes.txt")
-            out_class_file = open(classes_file, 'w')
-
-        else:
-            out_file = codecs.open(target_file, 'w', encoding=ENCODE_METHOD)
-            classes_file = os.path.join(os.path.dirname(os.path.abspath(target_file)), "classes.txt")
-            out_class_file = open(classes_file, 'w')
-
-
+            target_file = self.filename + TXT_EXT
+        classes_file = os.path.join(os.path.dirname(os.path.abspath(target_file)), CLASSES_FILE)
+
+        # PR387: unknown names are appended to class_list
+        class_index = {}
+        for i, name in enumerate(class_list):
+            class_index.setdefault(name, i)
+        class_indices = []
         for box in self.box_list:
-            class_index, x_center, y_center, w, h = self.bnd_box_to_yolo_line(box, class_list)
-            # print (classIndex, x_center, y_center, w, h)
-            out_file.write("%d %.6f %.6f %.6f %.6f\n" % (class_index, x_center, y_center, w, h))
+            index = class_index.get(box['name'])
+            if index is None:
+                index = class_index[box['name']] = len(class_list)
+                class_list.append(box['name'])
+            class_indices.append(index)
 
-        # print (classList)
-        # print (out_class_file)
-        for c in class_list:
-            out_class_file.write(c+'\n')
-
-        out_class_file.close()
-        out_file.close()
+        boxes = [(box['xmin'], box['ymin'], box['xmax'], box['ymax']) for box in self.box_list]
+        with codecs.open(target_file, 'w', encoding=ENCODE_METHOD) as out_file:
+            out_file.write(format_yolo_lines(class_indices, boxes, self.img_size))
 
+        save_classes(classes_file, class_list)
 
 
 class YoloReader:
@@ -88,16 +170,11 @@ class YoloReader:
 
         if class_list_path is None:
             dir_path = os.path.dirname(os.path.realpath(self.file_path))
-            self.class_list_path = os.path.join(dir_path, "classes.txt")
+            self.class_list_path = os.path.join(dir_path, CLASSES_FILE)
         else:
             self.class_list_path = class_list_path
 
-        # print (file_path, self.class_list_path)
-
-        classes_file = open(self.class_list_path, 'r')
-        self.classes = classes_file.read().strip('\n').split('\n')
-
-        # print (self.classes)
+        self.classes = load_classes(self.class_list_path)[0]
 
         img_size = [image.height(), image.width(),
                     1 if image.isGrayscale() else 3]
@@ -105,10 +182,7 @@ class YoloReader:
         self.img_size = img_size
 
         self.verified = False
-        # try:
         self.parse_yolo_format()
-        # except:
-        #     pass
 
     def get_shapes(self):
         return self.shapes
@@ -118,26 +192,9 @@ class YoloReader:
         points = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
         self.shapes.append((label, points, None, None, difficult))
 
-    def yolo_line_to_shape(self, class_index, x_center, y_center, w, h):
-        label = self.classes[int(class_index)]
-
-        x_min = max(float(x_center) - float(w) / 2, 0)
-        x_max = min(float(x_center) + float(w) / 2, 1)
-        y_min = max(float(y_center) - float(h) / 2, 0)
-        y_max = min(float(y_center) + float(h) / 2, 1)
-
-        x_min = round(self.img_size[1] * x_min)
-        x_max = round(self.img_size[1] * x_max)
-        y_min = round(self.img_size[0] * y_min)
-        y_max = round(self.img_size[0] * y_max)
-
-        return label, x_min, y_min, x_max, y_max
-
     def parse_yolo_format(self):
-        bnd_box_file = open(self.file_path, 'r')
-        for bndBox in bnd_box_file:
-            class_index, x_center, y_center, w, h = bndBox.strip().split(' ')
-            label, x_min, y_min, x_max, y_max = self.yolo_line_to_shape(class_index, x_center, y_center, w, h)
-
+        with open(self.file_path, 'r') as bnd_box_file:
+            text = bnd_box_file.read()
+        for class_index, x_min, y_min, x_max, y_max in parse_yolo_lines(text, self.img_size):
             # Caveat: difficult flag is discarded when saved as yolo format.
-            self.add_shape(label, x_min, y_min, x_max, y_max, False)
+            self.add_shape(self.classes[class_index], x_min, y_min, x_max, y_max, False)
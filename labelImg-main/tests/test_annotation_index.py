@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from libs.annotation_index import AnnotationIndex
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_SQLITE
+from libs.pascal_voc_io import PascalVocWriter
+from libs.sqlite_io import AnnotationDatabase, database_path
+
+
+class TestAnnotationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.index_dir = os.path.join(self.root, 'cache')
+        self.images = [os.path.join(self.root, name) for name in ('a.jpg', 'b.jpg', 'c.jpg')]
+
+        writer = PascalVocWriter('root', 'a.jpg', [100, 100, 3], local_img_path=self.images[0])
+        writer.verified = True
+        writer.add_bnd_box(1, 1, 10, 10, 'cat', 0)
+        writer.add_bnd_box(5, 5, 20, 20, 'dog', 0)
+        writer.save(os.path.join(self.root, 'a.xml'))
+        open(os.path.join(self.root, 'b.txt'), 'w').close()
+
+    def test_refresh_and_persist(self):
+        index = AnnotationIndex(self.root, index_dir=self.index_dir)
+        changed = []
+        self.assertTrue(index.refresh(self.images, on_changed=changed.extend))
+        self.assertEqual(changed, self.images[:2])
+        self.assertEqual(index.get(self.images[0])[:3], (FORMAT_PASCALVOC, 2, True))
+        self.assertEqual(index.get(self.images[1])[:3], (FORMAT_YOLO, 0, False))
+        self.assertIsNone(index.get(self.images[2]))
+        self.assertEqual((index.labelled_count, index.verified_count), (1, 1))
+
+        # Unchanged files are not read again
+        self.assertFalse(index.update(self.images[0]))
+        with open(os.path.join(self.root, 'b.txt'), 'w') as f:
+            f.write('0 0.5 0.5 0.1 0.1\n')
+        stat = os.stat(os.path.join(self.root, 'b.txt'))
+        os.utime(os.path.join(self.root, 'b.txt'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertTrue(index.update(self.images[1]))
+        self.assertEqual(index.labelled_count, 2)
+        index.save()
+
+        reloaded = AnnotationIndex(self.root, index_dir=self.index_dir)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.get(self.images[1]), index.get(self.images[1]))
+        self.assertEqual((reloaded.labelled_count, reloaded.verified_count), (2, 1))
+
+        # Images that are gone are dropped
+        reloaded.refresh(self.images[1:])
+        self.assertIsNone(reloaded.get(self.images[0]))
+        self.assertEqual((reloaded.labelled_count, reloaded.verified_count), (1, 0))
+
+    def test_database(self):
+        database = AnnotationDatabase.open(database_path(self.root))
+        self.addCleanup(database.close)
+        database.put('c.jpg', [('cat', 1, 1, 5, 5, False)], verified=True)
+        index = AnnotationIndex(self.root, index_dir=self.index_dir)
+        index.refresh(self.images)
+        # The database comes first, images it does not hold fall back to their files
+        self.assertEqual(index.get(self.images[2])[:3], (FORMAT_SQLITE, 1, True))
+        self.assertEqual(index.get(self.images[0]).format, FORMAT_PASCALVOC)
+        self.assertEqual((index.labelled_count, index.verified_count), (2, 2))
+
+        database.put('a.jpg', [], verified=False)
+        self.assertTrue(index.update(self.images[0]))
+        self.assertEqual(index.get(self.images[0])[:3], (FORMAT_SQLITE, 0, False))
+        self.assertFalse(index.update(self.images[2]))
+
+    def test_paths_outside_image_dir(self):
+        # Image lists may reach out of the indexed dir, the reloaded keys must still match them
+        image_dir = os.path.join(self.root, 'sub')
+        index = AnnotationIndex(image_dir, self.root, index_dir=self.index_dir)
+        index.refresh(self.images)
+        index.save()
+        reloaded = AnnotationIndex(image_dir + os.sep, self.root, index_dir=self.index_dir)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.get(self.images[0]), index.get(self.images[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
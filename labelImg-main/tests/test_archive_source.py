@@ -0,0 +1,114 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from libs import archive_source
+from libs.archive_source import ArchiveSource, archive_labels_dir, is_archive
+from libs.image_source import ImageSourceError
+
+
+class TestArchiveSource(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.index_dir = os.path.join(self.dir, 'index')
+        self.files = {
+            'a.jpg': b'stored' * 10,
+            'sub/b.png': os.urandom(100) + b'x' * 1000,
+            'sub/b.xml': b'<annotation/>',
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_zip(self):
+        path = os.path.join(self.dir, 'images.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('a.jpg', self.files['a.jpg'], zipfile.ZIP_STORED)
+            archive.writestr('sub/', b'')
+            archive.writestr('sub/b.png', self.files['sub/b.png'], zipfile.ZIP_DEFLATED)
+            archive.writestr('sub/b.xml', self.files['sub/b.xml'], zipfile.ZIP_DEFLATED)
+        return path
+
+    def make_tar(self, mode='w'):
+        path = os.path.join(self.dir, 'images.tar' if mode == 'w' else 'images.tar.gz')
+        with tarfile.open(path, mode) as archive:
+            for name, data in self.files.items():
+                member = os.path.join(self.dir, 'src', name)
+                if not os.path.isdir(os.path.dirname(member)):
+                    os.makedirs(os.path.dirname(member))
+                with open(member, 'wb') as f:
+                    f.write(data)
+                archive.add(member, name)
+        return path
+
+    def check_source(self, source):
+        images = sorted(source.list_images(('.jpg', '.png')))
+        self.assertEqual(images, [source.path_of('a.jpg'), source.path_of('sub/b.png')])
+        for name, data in self.files.items():
+            path = source.path_of(name)
+            self.assertTrue(source.owns(path))
+            self.assertTrue(source.exists(path))
+            self.assertEqual(source.read(path), data)
+        missing = source.path_of('missing.jpg')
+        self.assertFalse(source.exists(missing))
+        self.assertIsNone(source.signature(missing))
+        self.assertRaises(ImageSourceError, source.read, missing)
+        self.assertFalse(source.owns(os.path.join(self.dir, 'a.jpg')))
+
+    def test_zip(self):
+        path = self.make_zip()
+        self.assertTrue(is_archive(path))
+        source = ArchiveSource(path, self.index_dir)
+        self.assertTrue(source.is_zip)
+        self.check_source(source)
+        self.assertNotEqual(source.signature(source.path_of('a.jpg')), source.signature(source.path_of('sub/b.png')))
+        source.close()
+        self.assertRaises(ImageSourceError, source.read, source.path_of('a.jpg'))
+
+    def test_tar(self):
+        source = ArchiveSource(self.make_tar(), self.index_dir)
+        self.assertFalse(source.is_zip)
+        self.check_source(source)
+        source.close()
+
+    def test_compressed_tar(self):
+        path = self.make_tar('w:gz')
+        self.assertFalse(is_archive(path))
+        self.assertRaises(ImageSourceError, ArchiveSource, path, self.index_dir)
+
+    def test_index_reused(self):
+        path = self.make_zip()
+        ArchiveSource(path, self.index_dir).close()
+
+        def fail(*args):
+            raise AssertionError('archive was parsed again')
+        zip_members = archive_source._zip_members
+        archive_source._zip_members = fail
+        try:
+            source = ArchiveSource(path, self.index_dir)
+            self.check_source(source)
+            source.close()
+            # A changed archive is parsed again
+            os.utime(path, ns=(0, 0))
+            self.assertRaises(AssertionError, ArchiveSource, path, self.index_dir)
+        finally:
+            archive_source._zip_members = zip_members
+
+    def test_local_copy(self):
+        path = self.make_zip()
+        source = ArchiveSource(path, self.index_dir)
+        copy = source.local_copy(source.path_of('sub/b.xml'))
+        self.assertTrue(copy.startswith(self.index_dir))
+        with open(copy, 'rb') as f:
+            self.assertEqual(f.read(), self.files['sub/b.xml'])
+        self.assertIsNone(source.local_copy(source.path_of('sub/missing.xml')))
+        source.close()
+        self.assertEqual(archive_labels_dir(path), os.path.join(self.dir, 'images_labels'))
+
+
+if __name__ == '__main__':
+    unittest.main()
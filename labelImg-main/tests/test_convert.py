@@ -0,0 +1,110 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.convert import convert_dataset, main
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_SQLITE
+from libs.image_size import read_image_size, get_image_size
+from libs.pascal_voc_io import PascalVocWriter, PascalVocReader
+from libs.sqlite_io import AnnotationDatabase
+
+
+class TestConvert(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.image_dir = os.path.join(self.tmp_dir, 'images')
+        os.makedirs(self.image_dir)
+        for name in ('a', 'b', 'c'):
+            shutil.copy(os.path.join(dir_name, 'test.512.512.bmp'), os.path.join(self.image_dir, name + '.bmp'))
+        for name, label in (('a', 'person'), ('b', 'face')):
+            writer = PascalVocWriter('images', name + '.bmp', (512, 512, 3))
+            writer.add_bnd_box(60, 40, 430, 504, label, 0)
+            writer.save(os.path.join(self.image_dir, name + '.xml'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_image_size(self):
+        self.assertEqual([512, 512, 3], read_image_size(os.path.join(dir_name, 'test.512.512.bmp')))
+        self.assertEqual([32, 33, 3], read_image_size(os.path.join(dir_name, u'\u81C9\u66F8.jpg')))
+
+        # Cached per path and mtime
+        image_path = os.path.join(self.image_dir, 'a.bmp')
+        self.assertEqual([512, 512, 3], get_image_size(image_path))
+        shutil.copy(os.path.join(dir_name, u'\u81C9\u66F8.jpg'), image_path)
+        os.utime(image_path, (0, 0))
+        self.assertEqual([32, 33, 3], get_image_size(image_path))
+
+    def test_exif_orientation(self):
+        from PyQt5.QtCore import QBuffer, QByteArray
+        from PyQt5.QtGui import QImage, QImageReader
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QBuffer.WriteOnly)
+        QImage(40, 20, QImage.Format_RGB32).save(buffer, 'JPEG')
+        # Orientation 6, stored on its side and shown turned 90 degrees
+        exif = (b'Exif\x00\x00MM\x00\x2a' + struct.pack('>IH', 8, 1) +
+                struct.pack('>HHIHH', 0x0112, 3, 1, 6, 0) + struct.pack('>I', 0))
+        image_path = os.path.join(self.image_dir, 'rotated.jpg')
+        with open(image_path, 'wb') as f:
+            f.write(bytes(data)[:2] + b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif + bytes(data)[2:])
+
+        reader = QImageReader(image_path)
+        reader.setAutoTransform(True)
+        shown = reader.read().size()
+        self.assertEqual([shown.height(), shown.width(), 3], read_image_size(image_path))
+        self.assertEqual([40, 20, 3], read_image_size(image_path))
+
+        writer = PascalVocWriter('images', 'rotated.jpg', (40, 20, 3))
+        writer.add_bnd_box(2, 4, 12, 24, 'person', 0)
+        writer.save(os.path.join(self.image_dir, 'rotated.xml'))
+        yolo_dir = os.path.join(self.tmp_dir, 'yolo')
+        convert_dataset(self.image_dir, FORMAT_PASCALVOC, FORMAT_YOLO, dst=yolo_dir, max_workers=1)
+        with open(os.path.join(yolo_dir, 'rotated.txt')) as f:
+            self.assertEqual('0 0.350000 0.350000 0.500000 0.500000\n', f.read())
+
+    def test_round_trip(self):
+        yolo_dir = os.path.join(self.tmp_dir, 'yolo')
+        result = convert_dataset(self.image_dir, FORMAT_PASCALVOC, FORMAT_YOLO, dst=yolo_dir, max_workers=1)
+        self.assertEqual({'converted': 2, 'skipped': 1, 'errors': []}, result)
+        with open(os.path.join(yolo_dir, 'classes.txt')) as f:
+            self.assertEqual('person\nface\n', f.read())
+
+        dataset = os.path.join(self.tmp_dir, 'dataset.json')
+        result = convert_dataset(self.image_dir, FORMAT_YOLO, FORMAT_CREATEML, src=yolo_dir, dst=dataset)
+        self.assertEqual(2, result['converted'])
+
+        voc_dir = os.path.join(self.tmp_dir, 'voc')
+        self.assertEqual(0, main([self.image_dir, '--from', 'createml', '--src', dataset,
+                                  '--to', 'voc', '--dst', voc_dir]))
+        shapes = PascalVocReader(os.path.join(voc_dir, 'a.xml')).get_shapes()
+        self.assertEqual([('person', [(60, 40), (430, 40), (430, 504), (60, 504)], None, None, False)], shapes)
+
+    def test_sqlite(self):
+        db_path = os.path.join(self.tmp_dir, 'labels.db')
+        result = convert_dataset(self.image_dir, FORMAT_PASCALVOC, FORMAT_SQLITE, dst=db_path)
+        self.assertEqual({'converted': 2, 'skipped': 1, 'errors': []}, result)
+        database = AnnotationDatabase.open(db_path)
+        self.addCleanup(database.close)
+        self.assertEqual(['person', 'face'], database.classes())
+        self.assertEqual((False, [('person', 60, 40, 430, 504, False)], [512, 512, 3]), database.get('a.bmp'))
+
+        # Exported without opening the images, the size is in the database
+        os.remove(os.path.join(self.image_dir, 'b.xml'))
+        with open(os.path.join(self.image_dir, 'b.bmp'), 'wb') as f:
+            f.write(b'not an image any more')
+        yolo_dir = os.path.join(self.tmp_dir, 'yolo')
+        self.assertEqual(0, main([self.image_dir, '--from', 'sqlite', '--src', db_path,
+                                  '--to', 'yolo', '--dst', yolo_dir]))
+        with open(os.path.join(yolo_dir, 'b.txt')) as f:
+            self.assertEqual('1 0.478516 0.531250 0.722656 0.906250\n', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
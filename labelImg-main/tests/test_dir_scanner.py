@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from libs.dir_scanner import load_manifest, manifest_path, scan_images
+from libs.utils import natural_sort
+
+EXTENSIONS = frozenset(['.jpg', '.png'])
+
+
+class TestDirScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.manifest_dir = os.path.join(self.root, 'cache')
+        self.images_dir = os.path.join(self.root, 'images')
+        for rel_path in ['f11.jpg', 'f3.PNG', 'f1.jpg', 'notes.txt', 'a/f2.jpg', 'a/b/f10.jpg', 'a10/x.png']:
+            path = os.path.join(self.images_dir, rel_path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def test_same_order_as_os_walk(self):
+        expected = []
+        for root, dirs, files in os.walk(self.images_dir):
+            expected.extend(os.path.join(root, f) for f in files if f.lower().endswith(tuple(EXTENSIONS)))
+        natural_sort(expected, key=lambda x: x.lower())
+        self.assertEqual(scan_images(self.images_dir, EXTENSIONS, max_workers=4), expected)
+
+    def test_manifest(self):
+        images = scan_images(self.images_dir, EXTENSIONS, self.manifest_dir)
+        self.assertTrue(os.path.isfile(manifest_path(self.images_dir, self.manifest_dir)))
+        self.assertEqual(load_manifest(self.images_dir, EXTENSIONS, self.manifest_dir), images)
+        self.assertIsNone(load_manifest(self.images_dir, frozenset(['.jpg']), self.manifest_dir))
+
+        # A new file changes the mtime of its directory and invalidates the manifest
+        sub_dir = os.path.join(self.images_dir, 'a', 'b')
+        open(os.path.join(sub_dir, 'f4.jpg'), 'w').close()
+        stat = os.stat(sub_dir)
+        os.utime(sub_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertIsNone(load_manifest(self.images_dir, EXTENSIONS, self.manifest_dir))
+        self.assertIn(os.path.join(sub_dir, 'f4.jpg'), scan_images(self.images_dir, EXTENSIONS, self.manifest_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
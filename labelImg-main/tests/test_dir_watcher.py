@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from PyQt5.QtCore import QCoreApplication
+
+import libs.dir_watcher as dir_watcher
+from libs.dir_watcher import DirWatcher
+
+EXTENSIONS = frozenset(['.jpg'])
+
+
+class TestDirWatcher(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The watcher reports changes through the event loop
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'a'))
+        self.images = [self.touch('f1.jpg'), self.touch('a/f2.jpg')]
+        old_debounce = dir_watcher.DEBOUNCE_MS
+        dir_watcher.DEBOUNCE_MS = 50
+        self.addCleanup(setattr, dir_watcher, 'DEBOUNCE_MS', old_debounce)
+
+        self.watcher = DirWatcher(self.root, EXTENSIONS, self.images)
+        self.addCleanup(self.watcher.close)
+        self.added = []
+        self.removed = []
+        self.watcher.imagesAdded.connect(self.added.append)
+        self.watcher.imagesRemoved.connect(self.removed.append)
+
+    def touch(self, rel_path):
+        path = os.path.join(self.root, rel_path)
+        open(path, 'w').close()
+        return path
+
+    def wait_for(self, events):
+        deadline = time.time() + 5
+        while not events and time.time() < deadline:
+            QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+    def test_burst_is_delivered_once(self):
+        new_images = [self.touch('f%d.jpg' % i) for i in range(10, 60)]
+        self.touch('notes.txt')
+        self.wait_for(self.added)
+        self.assertEqual(self.added, [new_images])
+
+    def test_new_and_removed_directories(self):
+        os.makedirs(os.path.join(self.root, 'b', 'c'))
+        image = self.touch('b/c/f3.jpg')
+        self.wait_for(self.added)
+        self.assertEqual(self.added, [[image]])
+        self.assertIn(os.path.join(self.root, 'b', 'c'), self.watcher.directories)
+
+        shutil.rmtree(os.path.join(self.root, 'a'))
+        self.wait_for(self.removed)
+        self.assertEqual(self.removed, [[self.images[1]]])
+
+
+if __name__ == '__main__':
+    unittest.main()
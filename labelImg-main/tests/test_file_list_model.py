@@ -0,0 +1,86 @@
+import unittest
+
+from PyQt5.QtCore import Qt
+
+import libs.file_list_model as file_list_model
+from libs.file_list_model import FileListModel
+
+
+class TestFileListModel(unittest.TestCase):
+
+    def test_rows(self):
+        model = FileListModel()
+        model.set_paths(['a.jpg', 'b.jpg'])
+        model.extend(['c.jpg', 'd.jpg'])
+        self.assertEqual(model.rowCount(), 4)
+        self.assertEqual(model.row_of('c.jpg'), 2)
+        self.assertEqual(model.data(model.index(3), Qt.DisplayRole), 'd.jpg')
+
+        self.assertEqual(model.remove('b.jpg'), 1)
+        self.assertIsNone(model.remove('b.jpg'))
+        self.assertEqual(model.paths, ['a.jpg', 'c.jpg', 'd.jpg'])
+        self.assertEqual([model.row_of(path) for path in model.paths], [0, 1, 2])
+
+        model.clear()
+        self.assertEqual(model.rowCount(), 0)
+        self.assertIsNone(model.row_of('a.jpg'))
+
+    def test_sorted_insert_remove_rename(self):
+        model = FileListModel()
+        model.set_paths(['img1.jpg', 'img2.jpg', 'img10.jpg', 'img20.jpg'], is_sorted=True)
+        self.assertTrue(model.is_sorted)
+        self.assertEqual(model.row_of('img10.jpg'), 2)
+        self.assertIsNone(model.row_of('img3.jpg'))
+
+        self.assertEqual(model.insert('img3.jpg'), 2)
+        self.assertEqual(model.insert('img3.jpg'), 2)
+        self.assertEqual(model.insert('IMG3.jpg'), 2)
+        self.assertEqual(model.paths, ['img1.jpg', 'img2.jpg', 'IMG3.jpg', 'img3.jpg', 'img10.jpg', 'img20.jpg'])
+        self.assertEqual(model.row_of('img3.jpg'), 3)
+
+        self.assertEqual(model.remove('img2.jpg'), 1)
+        self.assertEqual(model.row_of('img10.jpg'), 3)
+        self.assertEqual(model.rename('img1.jpg', 'img15.jpg'), 3)
+        self.assertEqual(model.paths, ['IMG3.jpg', 'img3.jpg', 'img10.jpg', 'img15.jpg', 'img20.jpg'])
+        self.assertEqual([model.row_of(path) for path in model.paths], [0, 1, 2, 3, 4])
+
+        # An out of order batch falls back to the row dict
+        model.extend(['img30.jpg', 'img25.jpg'])
+        self.assertTrue(model.is_sorted)
+        model.extend(['img0.jpg'])
+        self.assertFalse(model.is_sorted)
+        self.assertEqual([model.row_of(path) for path in model.paths], list(range(8)))
+
+    def test_bulk_insert_remove(self):
+        model = FileListModel()
+        model.set_paths(['img%d.jpg' % i for i in range(0, 200, 2)], is_sorted=True)
+        odd = ['img%d.jpg' % i for i in range(1, 200, 2)]
+        self.assertEqual(model.insert_paths(odd + ['img0.jpg']), odd)
+        self.assertEqual(model.paths, ['img%d.jpg' % i for i in range(200)])
+        self.assertTrue(model.is_sorted)
+        self.assertEqual(model.row_of('img150.jpg'), 150)
+
+        self.assertEqual(model.remove_paths(odd + ['missing.jpg']), odd)
+        self.assertEqual(model.paths, ['img%d.jpg' % i for i in range(0, 200, 2)])
+        self.assertEqual(model.row_of('img150.jpg'), 75)
+
+    def test_sorted_lookup_reuses_keys(self):
+        model = FileListModel()
+        model.set_paths(['img%d.jpg' % i for i in range(1000)], is_sorted=True)
+        calls = []
+        sort_key = file_list_model.image_sort_key
+
+        def count_keys(path):
+            calls.append(path)
+            return sort_key(path)
+        file_list_model.image_sort_key = count_keys
+        try:
+            self.assertEqual(model.row_of('img500.jpg'), 500)
+        finally:
+            file_list_model.image_sort_key = sort_key
+        # Only the key of the path looked up is computed
+        self.assertEqual(calls, ['img500.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
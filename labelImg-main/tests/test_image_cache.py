@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from PyQt5.QtGui import QImage
+
+from libs.image_cache import ImageCache, image_bytes
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.directory, '%d.png' % i)
+            with open(path, 'w') as f:
+                f.write('x')
+            self.paths.append(path)
+        self.loaded = []
+
+    def loader(self, path):
+        self.loaded.append(path)
+        image = QImage(100, 100, QImage.Format_RGB32)
+        image.fill(0)
+        return image
+
+    def make_cache(self, images):
+        cache = ImageCache(max_bytes=images * 100 * 100 * 4, loader=self.loader)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_lru_bounded_by_bytes(self):
+        cache = self.make_cache(2)
+        for path in self.paths[:3]:
+            self.assertFalse(cache.get(path).isNull())
+        self.assertNotIn(self.paths[0], cache)
+        self.assertIn(self.paths[2], cache)
+        self.assertEqual(cache.total_bytes, 2 * image_bytes(cache.get(self.paths[2])))
+
+    def test_prefetch(self):
+        cache = self.make_cache(4)
+        cache.prefetch(self.paths[1:3])
+        for _ in range(500):
+            if self.paths[2] in cache:
+                break
+            time.sleep(0.01)
+        cache.get(self.paths[1])
+        cache.get(self.paths[2])
+        self.assertEqual(self.loaded, self.paths[1:3])
+
+    def test_reload_modified_file(self):
+        cache = self.make_cache(4)
+        cache.get(self.paths[0])
+        with open(self.paths[0], 'w') as f:
+            f.write('changed')
+        cache.get(self.paths[0])
+        self.assertEqual(self.loaded, [self.paths[0]] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,6 +28,127 @@ class TestPascalVocRW(unittest.TestCase):
         self.assertEqual(face[0], 'face')
         self.assertEqual(face[1], [(113, 40), (450, 40), (450, 403), (113, 403)])
 
+    def test_write_layout(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from pascal_voc_io import PascalVocWriter
+
+        writer = PascalVocWriter('tests', 'test', (512, 512, 1))
+        writer.verified = True
+        writer.add_bnd_box(1, 40, 430, 504, 'cat & dog', 0)
+        expected = '\n'.join([
+            '<annotation verified="yes">',
+            '\t<folder>tests</folder>',
+            '\t<filename>test</filename>',
+            '\t<source>',
+            '\t\t<database>Unknown</database>',
+            '\t</source>',
+            '\t<size>',
+            '\t\t<width>512</width>',
+            '\t\t<height>512</height>',
+            '\t\t<depth>1</depth>',
+            '\t</size>',
+            '\t<segmented>0</segmented>',
+            '\t<object>',
+            '\t\t<name>cat &amp; dog</name>',
+            '\t\t<pose>Unspecified</pose>',
+            '\t\t<truncated>1</truncated>',
+            '\t\t<difficult>0</difficult>',
+            '\t\t<bndbox>',
+            '\t\t\t<xmin>1</xmin>',
+            '\t\t\t<ymin>40</ymin>',
+            '\t\t\t<xmax>430</xmax>',
+            '\t\t\t<ymax>504</ymax>',
+            '\t\t</bndbox>',
+            '\t</object>',
+            '</annotation>',
+            ''])
+        self.assertEqual(writer.gen_xml(), expected)
+
+    def test_malformed_and_batch(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from pascal_voc_io import PascalVocWriter
+        from pascal_voc_io import PascalVocReader, PascalVocParseError, parse_voc_files
+
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        good_path = os.path.join(tmp_dir, 'good.xml')
+        bad_path = os.path.join(tmp_dir, 'bad.xml')
+        writer = PascalVocWriter('tests', 'good', (512, 512, 3))
+        writer.verified = True
+        writer.add_bnd_box(10, 20, 30, 40, 'cat', 0)
+        writer.save(good_path)
+        with open(bad_path, 'w') as f:
+            f.write('<annotation><object><name>cat</name>')
+
+        with self.assertRaises(PascalVocParseError):
+            PascalVocReader(bad_path)
+
+        results = parse_voc_files([good_path, bad_path], max_workers=1)
+        self.assertEqual(results[0], (good_path, True, [('cat', 10, 20, 30, 40, False)], None))
+        self.assertEqual(results[1][0], bad_path)
+        self.assertIsNotNone(results[1][3])
+
+        # An empty difficult tag still loads
+        empty_path = os.path.join(tmp_dir, 'empty.xml')
+        with open(empty_path, 'w') as f:
+            f.write('<annotation><object><name>dog</name><difficult/><bndbox>'
+                    '<xmin>1</xmin><ymin>2</ymin><xmax>3</xmax><ymax>4</ymax></bndbox></object></annotation>')
+        self.assertEqual(PascalVocReader(empty_path).get_shapes()[0][4], False)
+
+
+class TestYoloRW(unittest.TestCase):
+
+    def test_write_read(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        import yolo_io
+        from yolo_io import YOLOWriter, YoloReader
+
+        class Image(object):
+            def height(self):
+                return 512
+
+            def width(self):
+                return 256
+
+            def isGrayscale(self):
+                return True
+
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        target_file = os.path.join(tmp_dir, 'test.txt')
+        classes_file = os.path.join(tmp_dir, 'classes.txt')
+        numpy_module = yolo_io.np
+        self.addCleanup(setattr, yolo_io, 'np', numpy_module)
+        for yolo_io.np in (numpy_module, None):
+            writer = YOLOWriter('tests', 'test', (512, 256, 1))
+            writer.add_bnd_box(60, 40, 200, 504, 'person', 0)
+            writer.add_bnd_box(10, 20, 30, 40, 'face', 0)
+            class_list = ['face']
+            writer.save(class_list=class_list, target_file=target_file)
+            self.assertEqual(['face', 'person'], class_list)
+            with open(target_file) as f:
+                self.assertEqual('1 0.507812 0.531250 0.546875 0.906250\n'
+                                 '0 0.078125 0.058594 0.078125 0.039062\n', f.read())
+
+            shapes = YoloReader(target_file, Image()).get_shapes()
+            self.assertEqual(('person', [(60, 40), (200, 40), (200, 504), (60, 504)], None, None, False), shapes[0])
+            self.assertEqual('face', shapes[1][0])
+
+            # An unchanged class list leaves classes.txt alone
+            os.utime(classes_file, (0, 0))
+            writer.save(class_list=class_list, target_file=target_file)
+            self.assertEqual(0, os.stat(classes_file).st_mtime)
+
+            # Fields are counted per line, a long line can not make up for a short one
+            self.assertRaises(ValueError, yolo_io.parse_yolo_lines,
+                              '0 0.5 0.5 0.1 0.1 0.1\n1 0.5 0.5 0.1\n', (512, 256, 1))
+
 
 class TestCreateMLRW(unittest.TestCase):
 
@@ -96,6 +217,132 @@ class TestCreateMLRW(unittest.TestCase):
         self.assertEqual(250, y_min, 'ymin is wrong')
         self.assertEqual(365, y_max, 'ymax is wrong')
 
+    def test_c_store_journal(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from create_ml_io import CreateMLStore, CreateMLReader, JOURNAL_EXT
+
+        import json
+        import tempfile
+        output_file = os.path.join(tempfile.mkdtemp(), 'dataset.json')
+        store = CreateMLStore.open(output_file)
+        store.put({'image': 'a.jpg', 'verified': False, 'annotations': []})
+        store.put({'image': 'b.jpg', 'verified': False, 'annotations': []})
+        store.put({'image': 'a.jpg', 'verified': True, 'annotations': [
+            {'label': 'cat', 'coordinates': {'x': 20, 'y': 20, 'width': 10, 'height': 10}}]})
+        # The first save creates the dataset file, later ones only hit the journal
+        with open(output_file) as f:
+            self.assertEqual([{'image': 'a.jpg', 'verified': False, 'annotations': []}], json.load(f))
+        self.assertTrue(os.path.exists(output_file + JOURNAL_EXT))
+
+        reader = CreateMLReader(output_file, 'a.jpg')
+        self.assertEqual(1, len(reader.get_shapes()))
+
+        # Simulate a crash: drop the store and leave a torn journal line behind
+        del CreateMLStore._open_stores[os.path.abspath(output_file)]
+        with open(output_file + JOURNAL_EXT, 'a') as f:
+            f.write('{"image": "c.jp')
+        recovered = CreateMLStore.open(output_file)
+        self.assertEqual(['a.jpg', 'b.jpg'], [image['image'] for image in recovered.images])
+        self.assertFalse(os.path.exists(output_file + JOURNAL_EXT))
+        recovered.close()
+
+        with open(output_file) as f:
+            data = json.load(f)
+        self.assertEqual(True, data[0]['verified'])
+        self.assertEqual('b.jpg', data[1]['image'])
+
+    def test_d_index_cache(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from create_ml_io import CreateMLReader, load_create_ml_index
+
+        import json
+        import tempfile
+        output_file = os.path.join(tempfile.mkdtemp(), 'dataset.json')
+        images = [{'image': '%d.jpg' % i, 'verified': i == 7, 'annotations': []} for i in range(10)]
+        with open(output_file, 'w') as f:
+            json.dump(images, f)
+        index = load_create_ml_index(output_file)
+        self.assertIs(index, load_create_ml_index(output_file))
+        self.assertTrue(CreateMLReader(output_file, '7.jpg').verified)
+        self.assertFalse(CreateMLReader(output_file, '3.jpg').verified)
+
+        images[3]['annotations'].append({'label': 'cat', 'coordinates': {'x': 5, 'y': 5, 'width': 2, 'height': 2}})
+        with open(output_file, 'w') as f:
+            json.dump(images, f)
+        self.assertEqual(1, len(CreateMLReader(output_file, '3.jpg').get_shapes()))
+
+    def test_e_open_stores(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from create_ml_io import CreateMLStore, JOURNAL_EXT, is_shared_dataset, load_create_ml_index
+
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        paths = [os.path.join(tmp_dir, '%d.json' % i) for i in range(3)]
+        self.addCleanup(setattr, CreateMLStore, 'max_open_stores', CreateMLStore.max_open_stores)
+        CreateMLStore.max_open_stores = 2
+        for path in paths:
+            store = CreateMLStore.open(path)
+            store.put({'image': 'a.jpg', 'verified': False, 'annotations': []})
+            store.put({'image': 'b.jpg', 'verified': True, 'annotations': []})
+        # Journaled updates are seen before the store is compacted
+        self.assertTrue(os.path.exists(paths[2] + JOURNAL_EXT))
+        self.assertTrue(load_create_ml_index(paths[2])['b.jpg']['verified'])
+        self.assertTrue(is_shared_dataset(paths[2], 'a.jpg'))
+        self.assertFalse(is_shared_dataset(os.path.join(tmp_dir, 'missing.json'), 'a.jpg'))
+
+        # Opening a third store closed the least recently used one
+        self.assertIsNone(CreateMLStore.get_open(paths[0]))
+        self.assertFalse(os.path.exists(paths[0] + JOURNAL_EXT))
+        CreateMLStore.close_all()
+        self.assertEqual(sorted(load_create_ml_index(paths[2])), ['a.jpg', 'b.jpg'])
+
+
+class TestSQLiteRW(unittest.TestCase):
+
+    def test_write_read(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from sqlite_io import AnnotationDatabase, SQLiteReader, database_path
+
+        import tempfile
+        db_path = database_path(tempfile.mkdtemp())
+        database = AnnotationDatabase.open(db_path)
+        self.assertIs(database, AnnotationDatabase.open(db_path))
+        database.put('a.jpg', [('person', 60.5, 40, 430, 504, True), ('face', 113, 40, 450, 403, False)],
+                     verified=True, size=[512, 512, 3])
+        database.put('b.jpg', [('face', 1, 2, 3, 4, False)])
+        # A save replaces the boxes of the image
+        database.put('b.jpg', [('dog', 1, 2, 3, 4, False)])
+
+        reader = SQLiteReader(db_path, '/images/a.jpg')
+        self.assertTrue(reader.found)
+        self.assertTrue(reader.verified)
+        self.assertEqual(('person', [(60.5, 40), (430, 40), (430, 504), (60.5, 504)], None, None, True),
+                         reader.get_shapes()[0])
+        self.assertEqual(['person', 'face', 'dog'], database.classes())
+        self.assertEqual({'a.jpg': (2, True), 'b.jpg': (1, False)}, database.statuses())
+        self.assertEqual(1, database.count('face'))
+        self.assertFalse(SQLiteReader(db_path, 'c.jpg').found)
+
+        # A failing save leaves the previous boxes
+        self.assertRaises(ValueError, database.put, 'b.jpg', [('cat', 1, 2, 3, 4, False), ('broken',)])
+        self.assertEqual([('dog', 1, 2, 3, 4, False)], database.get('b.jpg')[1])
+
+        database.delete('a.jpg')
+        database.close()
+        self.assertIsNone(AnnotationDatabase.get_open(db_path))
+        database = AnnotationDatabase.open(db_path)
+        self.assertEqual(['b.jpg'], database.filenames())
+        self.assertEqual(0, database.count('face'))
+        database.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,19 @@
 
+import os
+import shutil
+import tempfile
+import zipfile
 from unittest import TestCase
 
+from PyQt5.QtCore import Qt
+
 from labelImg import get_main_app
+from libs.archive_source import ArchiveSource
+from libs.constants import FORMAT_PASCALVOC, FORMAT_SQLITE
+from libs.pascal_voc_io import PascalVocWriter
+from libs.sqlite_io import AnnotationDatabase
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
 
 
 class TestMainWindow(TestCase):
@@ -18,3 +30,101 @@ class TestMainWindow(TestCase):
 
     def test_noop(self):
         pass
+
+    def test_load_labels(self):
+        points = [(1, 1), (5, 1), (5, 5), (1, 5)]
+        self.win.load_labels([(label, points, None, None, False) for label in ['dog', 'cat', 'dog']])
+        self.assertEqual(self.win.label_list.count(), 3)
+        self.assertEqual(dict((label, len(shapes)) for label, shapes in self.win.label_shapes.items()),
+                         {'dog': 2, 'cat': 1})
+        self.assertEqual(self.win.combo_box.items, ['', 'cat', 'dog'])
+
+        # Filtering by a class hides the other shapes and unchecks their items
+        self.win.combo_box.cb.setCurrentIndex(2)
+        cat = self.win.canvas.shapes[1]
+        self.assertFalse(self.win.canvas.isVisible(cat))
+        self.assertEqual(self.win.shapes_to_items[cat].checkState(), Qt.Unchecked)
+        self.assertTrue(self.win.canvas.isVisible(self.win.canvas.shapes[0]))
+        self.win.combo_box.cb.setCurrentIndex(0)
+        self.assertTrue(self.win.canvas.isVisible(cat))
+
+        self.win.remove_label(self.win.canvas.shapes[1])
+        self.assertEqual(self.win.combo_box.items, ['', 'dog'])
+        # Points outside the (empty) canvas were snapped, which marks the image dirty
+        self.win.set_clean()
+
+    def test_failed_save_stays_dirty(self):
+        self.win.load_file(os.path.join(dir_name, 'test.512.512.bmp'))
+        points = [(10, 10), (50, 10), (50, 50), (10, 50)]
+        self.win.load_labels([('dog', points, None, None, False)])
+        self.win.set_dirty()
+        errors = []
+        self.win.error_message = lambda title, message: errors.append(title)
+
+        # The write fails on the save queue's thread, after the image was marked clean
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, tmp_dir)
+        missing_dir = os.path.join(tmp_dir, 'missing')
+        self.win._save_file(os.path.join(missing_dir, 'test'))
+        self.assertFalse(self.win.dirty)
+        self.win.save_queue.wait()
+        self.app.processEvents()
+        self.assertEqual(errors, ['Error saving label data'])
+        self.assertTrue(self.win.dirty)
+        self.win.set_clean()
+
+    def test_sqlite_save_and_load_order(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.addCleanup(AnnotationDatabase.close_all)
+        image_path = os.path.join(dir_name, 'test.512.512.bmp')
+        self.win.default_save_dir = tmp_dir
+        self.win.load_file(image_path)
+        self.win.set_format(FORMAT_SQLITE)
+        points = [(10, 10), (50, 10), (50, 50), (10, 50)]
+        self.win.load_labels([('dog', points, None, None, False)])
+
+        # Saves of several images are queued under the database they go to, none is lost
+        db_path = os.path.join(tmp_dir, 'annotations.db')
+        self.win.save_labels(os.path.join(tmp_dir, 'test.512.512'))
+        self.win.file_path = os.path.join(dir_name, 'other.bmp')
+        self.win.save_labels(os.path.join(tmp_dir, 'other'))
+        self.win.file_path = image_path
+        picked_path = os.path.join(tmp_dir, 'picked.db')
+        self.win.save_labels(picked_path)
+        self.assertEqual(sorted(self.win.saving_images), [db_path, picked_path])
+        self.win.save_queue.wait()
+        self.app.processEvents()
+        self.assertEqual(AnnotationDatabase.open(db_path).filenames(), ['other.bmp', 'test.512.512.bmp'])
+        self.assertEqual(AnnotationDatabase.open(picked_path).filenames(), ['test.512.512.bmp'])
+        self.win.set_clean()
+
+        # Outside SQLite mode a newer file of another format is not hidden by the database
+        writer = PascalVocWriter('tests', 'test.512.512', (512, 512, 1), local_img_path=image_path)
+        writer.add_bnd_box(1, 1, 20, 20, 'cat', 0)
+        writer.save(os.path.join(tmp_dir, 'test.512.512.xml'))
+        self.win.set_format(FORMAT_PASCALVOC)
+        self.win.load_file(image_path)
+        self.assertEqual([shape.label for shape in self.win.canvas.shapes], ['cat'])
+        self.win.set_format(FORMAT_SQLITE)
+        self.win.load_file(image_path)
+        self.assertEqual([shape.label for shape in self.win.canvas.shapes], ['dog'])
+        self.win.set_clean()
+
+    def test_source_read_error_is_reported(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        archive_path = os.path.join(tmp_dir, 'images.zip')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.write(os.path.join(dir_name, 'test.512.512.bmp'), 'test.bmp')
+        source = ArchiveSource(archive_path, os.path.join(tmp_dir, 'index'))
+        self.win.image_source = source
+        errors = []
+        self.win.error_message = lambda title, message: errors.append(message)
+
+        # The archive went away under the source, the reason reaches the user
+        source.close()
+        self.assertFalse(self.win.load_file(source.path_of('test.bmp')))
+        self.assertEqual(len(errors), 1)
+        self.assertIn(archive_path, errors[0])
+        self.assertEqual(self.win.image_errors, {})
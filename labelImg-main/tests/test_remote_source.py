@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+from libs.image_source import ImageSourceError
+from libs.remote_source import DiskCache, RemoteSource, is_remote
+
+OBJECTS = {
+    'bucket/set/a.jpg': b'a' * 100,
+    'bucket/set/b.png': b'b' * 200,
+    'bucket/set/sub dir/c.jpg': b'c' * 300,
+    'bucket/set/notes.txt': b'not an image',
+    'bucket/other/d.jpg': b'd',
+    'bucket/list.txt': b'# images\nset/a.jpg\n\nset/sub dir/c.jpg\n../escape.jpg\n',
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like S3
+    protocol_version = 'HTTP/1.1'
+    page_size = 2
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+        url = urlsplit(self.path)
+        path = unquote(url.path).lstrip('/')
+        query = parse_qs(url.query)
+        if query.get('list-type') == ['2']:
+            self.send(200, self.listing(path, query))
+        elif path in OBJECTS:
+            if server.delay:
+                time.sleep(server.delay)
+            self.send(200, OBJECTS[path])
+        else:
+            self.send(404, b'missing')
+
+    def listing(self, bucket, query):
+        prefix = bucket + '/' + query.get('prefix', [''])[0]
+        keys = sorted(key for key in OBJECTS if key.startswith(prefix))
+        start = int(query.get('continuation-token', ['0'])[0])
+        page = keys[start:start + self.page_size]
+        truncated = start + self.page_size < len(keys)
+        xml = '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+        xml += '<IsTruncated>%s</IsTruncated>' % ('true' if truncated else 'false')
+        if truncated:
+            xml += '<NextContinuationToken>%d</NextContinuationToken>' % (start + self.page_size)
+        for key in page:
+            xml += '<Contents><Key>%s</Key><ETag>"%s"</ETag><Size>%d</Size></Contents>' % (
+                escape(key[len(bucket) + 1:]), hash(OBJECTS[key]), len(OBJECTS[key]))
+        return (xml + '</ListBucketResult>').encode('utf-8')
+
+    def send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestRemoteSource(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.clients = set()
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.cache_dir)
+
+    def downloads(self):
+        return [path for path in self.server.requests if '?' not in path]
+
+    def test_bucket(self):
+        self.assertTrue(is_remote(self.base + '/bucket/set/'))
+        source = RemoteSource(self.base + '/bucket/set/', self.cache_dir)
+        images = sorted(source.list_images(('.jpg', '.png')))
+        self.assertEqual(images, [source.path_of('a.jpg'), source.path_of('b.png'), source.path_of('sub dir/c.jpg')])
+        # The listing came in pages
+        self.assertEqual(len(self.server.requests), 2)
+        for name in ('a.jpg', 'sub dir/c.jpg'):
+            self.assertEqual(source.read(source.path_of(name)), OBJECTS['bucket/set/' + name])
+        self.assertNotEqual(source.signature(source.path_of('a.jpg')), source.signature(source.path_of('b.png')))
+        self.assertIsNone(source.signature(source.path_of('d.jpg')))
+        self.assertRaises(ImageSourceError, source.read, source.path_of('d.jpg'))
+        # Every request went over the same keep-alive connection
+        self.assertEqual(len(self.server.clients), 1)
+        source.close()
+
+    def test_manifest(self):
+        source = RemoteSource(self.base + '/bucket/list.txt', self.cache_dir)
+        self.assertEqual(sorted(source.members), ['set/a.jpg', 'set/sub dir/c.jpg'])
+        self.assertEqual(source.read(source.path_of('set/sub dir/c.jpg')), OBJECTS['bucket/set/sub dir/c.jpg'])
+        source.close()
+
+    def test_errors(self):
+        self.assertRaises(ImageSourceError, RemoteSource, 'ftp://127.0.0.1/bucket/')
+        self.assertRaises(ImageSourceError, RemoteSource, self.base + '/missing.txt')
+        source = RemoteSource(self.base + '/bucket/set/')
+        del OBJECTS['bucket/set/b.png']
+        try:
+            self.assertRaises(ImageSourceError, source.read, source.path_of('b.png'))
+        finally:
+            OBJECTS['bucket/set/b.png'] = b'b' * 200
+        source.close()
+
+    def test_disk_cache(self):
+        source = RemoteSource(self.base + '/bucket/set/', self.cache_dir)
+        path = source.path_of('a.jpg')
+        source.read(path)
+        source.close()
+        source = RemoteSource(self.base + '/bucket/set/', self.cache_dir)
+        self.assertEqual(source.read(path), OBJECTS['bucket/set/a.jpg'])
+        self.assertEqual(len(self.downloads()), 1)
+        source.close()
+
+    def test_prefetch(self):
+        self.server.delay = 0.2
+        source = RemoteSource(self.base + '/bucket/set/', self.cache_dir)
+        paths = [source.path_of(name) for name in ('a.jpg', 'b.png', 'sub dir/c.jpg')]
+        start = time.time()
+        source.prefetch(paths)
+        for path in paths:
+            source.read(path)
+        # Downloaded side by side, each once
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(len(self.downloads()), 3)
+        source.prefetch(paths)
+        self.assertEqual(source._pending, {})
+        source.close()
+
+    def test_lru(self):
+        cache = DiskCache(os.path.join(self.cache_dir, 'lru'), max_bytes=25)
+        cache.put('a', b'a' * 10)
+        cache.put('b', b'b' * 10)
+        self.assertEqual(cache.get('a'), b'a' * 10)
+        cache.put('c', b'c' * 10)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.total_bytes, 20)
+        cache.put('huge', b'h' * 30)
+        self.assertNotIn('huge', cache)
+        # The order survives reopening
+        time.sleep(0.01)
+        cache.get('a')
+        cache = DiskCache(os.path.join(self.cache_dir, 'lru'), max_bytes=15)
+        self.assertIn('a', cache)
+        self.assertNotIn('c', cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
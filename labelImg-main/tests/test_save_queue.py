@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from libs.save_queue import SaveQueue, write_atomically
+
+
+class TestSaveQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = SaveQueue()
+        self.addCleanup(self.queue.close)
+
+    def test_coalesce_pending_saves(self):
+        started = threading.Event()
+        release = threading.Event()
+        written = []
+
+        def blocking_job():
+            started.set()
+            release.wait(5)
+            written.append('busy')
+
+        self.queue.put('busy.xml', blocking_job)
+        started.wait(5)
+        for i in range(5):
+            self.queue.put('a.xml', lambda i=i: written.append(i))
+        self.assertTrue(self.queue.is_pending('a.xml'))
+        release.set()
+        self.queue.wait()
+        # Only the last of the queued saves of a.xml ran
+        self.assertEqual(written, ['busy', 4])
+        self.assertFalse(self.queue.is_pending())
+
+    def test_write_atomically(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        target = os.path.join(directory, 'a.xml')
+        with open(target, 'w') as f:
+            f.write('old')
+
+        def failing_write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                f.write('partial')
+            raise OSError('disk full')
+
+        with self.assertRaises(OSError):
+            write_atomically(target, failing_write)
+        with open(target) as f:
+            self.assertEqual(f.read(), 'old')
+        self.assertEqual(os.listdir(directory), ['a.xml'])
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                f.write('new')
+
+        write_atomically(target, write)
+        with open(target) as f:
+            self.assertEqual(f.read(), 'new')
+        self.assertEqual(os.listdir(directory), ['a.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from PyQt5.QtCore import QPointF
+from PyQt5.QtWidgets import QApplication
+
+from libs.shape import Shape
+
+
+class TestShape(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Font metrics for the label need an application
+        cls.app = QApplication.instance() or QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+
+    def setUp(self):
+        self.shape = Shape(label='dog')
+        for x, y in [(10, 10), (50, 10), (50, 30), (10, 30)]:
+            self.shape.add_point(QPointF(x, y))
+        self.shape.close()
+
+    def test_paths_are_cached(self):
+        self.assertIs(self.shape.make_path(), self.shape.make_path())
+        self.assertIs(self.shape.line_path(), self.shape.line_path())
+        self.assertIs(self.shape.vertex_path(), self.shape.vertex_path())
+
+        old_scale = Shape.scale
+        self.addCleanup(setattr, Shape, 'scale', old_scale)
+        vertex_path = self.shape.vertex_path()
+        Shape.scale = 2.0
+        self.assertIsNot(self.shape.vertex_path(), vertex_path)
+
+    def test_moves_invalidate_geometry(self):
+        self.assertEqual(self.shape.bounding_rect().topLeft(), QPointF(10, 10))
+        self.shape.move_by(QPointF(5, 5))
+        self.assertEqual(self.shape.bounding_rect().topLeft(), QPointF(15, 15))
+        self.assertTrue(self.shape.contains_point(QPointF(52, 32)))
+
+        self.shape.move_vertex_by(0, QPointF(-10, 0))
+        self.assertEqual(self.shape.bounding_rect().left(), 5)
+        self.shape[2] = QPointF(80, 80)
+        self.assertEqual(self.shape.bounding_rect().bottomRight(), QPointF(80, 80))
+        self.shape.points = [QPointF(0, 0), QPointF(1, 1)]
+        self.assertEqual(self.shape.bounding_rect().bottomRight(), QPointF(1, 1))
+
+    def test_paint_rect_covers_vertices_and_label(self):
+        rect = self.shape.paint_rect()
+        self.assertTrue(rect.contains(self.shape.bounding_rect()))
+        self.assertTrue(rect.contains(QPointF(10 - Shape.point_size / 2.0, 10)))
+        self.shape.paint_label = True
+        self.assertTrue(self.shape.paint_rect().contains(rect))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from libs.spatial_index import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def test_query_insert_remove(self):
+        index = GridIndex(cell_size=10)
+        index.insert('a', 0, 0, 5, 5)
+        index.insert('b', 12, 8, 35, 12)
+        index.insert('c', 100, 100, 110, 110)
+        self.assertEqual(index.query(1, 1, 2, 2), set(['a']))
+        self.assertEqual(index.query(30, 10, 30, 10), set(['b']))
+        self.assertEqual(index.query(0, 0, 50, 50), set(['a', 'b']))
+
+        # Inserting again moves the item
+        index.insert('a', 100, 100, 101, 101)
+        self.assertEqual(index.query(1, 1, 2, 2), set())
+        self.assertEqual(index.query(100, 100, 100, 100), set(['a', 'c']))
+
+        index.remove('c')
+        index.remove('missing')
+        self.assertEqual(index.query(110, 110, 110, 110), set())
+        self.assertEqual(len(index), 2)
+
+    def test_negative_coordinates(self):
+        index = GridIndex(cell_size=10)
+        index.insert('a', -15, -15, -11, -11)
+        self.assertEqual(index.query(-12, -12, -12, -12), set(['a']))
+        self.assertEqual(index.query(1, 1, 1, 1), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
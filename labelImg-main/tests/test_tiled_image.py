@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+import libs.tiled_image as tiled_image
+from libs.tiled_image import TiledImage
+
+
+class TestTiledImage(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'big.jpg')
+        image = QImage(1200, 800, QImage.Format_RGB32)
+        image.fill(QColor(200, 30, 30))
+        painter = QPainter(image)
+        painter.fillRect(600, 400, 300, 200, QColor(20, 200, 20))
+        painter.end()
+        image.save(self.path, 'JPEG', 95)
+
+        old_pixels, old_overview = tiled_image.TILED_IMAGE_PIXELS, tiled_image.OVERVIEW_SIZE
+        tiled_image.TILED_IMAGE_PIXELS, tiled_image.OVERVIEW_SIZE = 500 * 500, 64
+        self.addCleanup(setattr, tiled_image, 'TILED_IMAGE_PIXELS', old_pixels)
+        self.addCleanup(setattr, tiled_image, 'OVERVIEW_SIZE', old_overview)
+
+    def test_small_images_are_not_tiled(self):
+        tiled_image.TILED_IMAGE_PIXELS = 2000 * 2000
+        self.assertIsNone(TiledImage.open(self.path))
+
+    def paint(self, image, wanted):
+        """Paint the green rect at full size until the tile wanted is decoded, return the painted image."""
+        decodes = []
+        decode = image._decode
+
+        def count_decodes(level, keys):
+            decodes.append((level, sorted(keys)))
+            return decode(level, keys)
+        image._decode = count_decodes
+
+        target = QImage(300, 200, QImage.Format_RGB32)
+        for _ in range(100):
+            painter = QPainter(target)
+            painter.translate(-600, -400)
+            image.paint(painter, QRectF(600, 400, 300, 200), 1.0)
+            painter.end()
+            if wanted in image._tiles:
+                break
+            time.sleep(0.01)
+        painter = QPainter(target)
+        painter.translate(-600, -400)
+        image.paint(painter, QRectF(600, 400, 300, 200), 1.0)
+        painter.end()
+        red, green, blue, _ = QColor(target.pixel(150, 100)).getRgb()
+        self.assertTrue(green > 150 and red < 80)
+        return decodes
+
+    def test_paint_visible_tiles(self):
+        image = TiledImage.open(self.path)
+        self.assertIsNotNone(image)
+        self.addCleanup(image.close)
+        self.assertEqual((image.width(), image.height()), (1200, 800))
+        self.assertEqual(TiledImage.level_for(0.3), 1)
+
+        decodes = self.paint(image, (0, 1, 1))
+        # The level fits in the cache, both tiles under the painted rect came from one decode of it
+        self.assertEqual(decodes, [(0, [(0, 1, 0), (0, 1, 1)])])
+        self.assertEqual(sorted(image._tiles), [(0, col, row) for col in range(3) for row in range(2)])
+
+    def test_large_level_is_read_in_regions(self):
+        image = TiledImage(self.path, cache_bytes=4 * 1024 * 1024)
+        self.addCleanup(image.close)
+        self.paint(image, (0, 1, 1))
+        # Too large for the cache, only the tiles under the painted rect were decoded
+        self.assertEqual(sorted(image._tiles), [(0, 1, 0), (0, 1, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
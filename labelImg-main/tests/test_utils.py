@@ -1,7 +1,10 @@
 import os
+import shutil
 import sys
+import tempfile
 import unittest
 from libs.utils import Struct, new_action, new_icon, add_actions, format_shortcut, generate_color_by_text, natural_sort
+from libs.utils import load_label_palette, set_label_palette
 
 class TestUtils(unittest.TestCase):
 
@@ -18,5 +21,27 @@ class TestUtils(unittest.TestCase):
         for idx, val in enumerate(l1):
             self.assertTrue(val == expected_l1[idx])
 
+    def test_generateColorByText_cachedCopies(self):
+        color = generate_color_by_text('dog')
+        color.setRed(0 if color.red() else 1)
+        # Changing the returned color does not change the cached one
+        self.assertNotEqual(generate_color_by_text('dog'), color)
+        self.assertEqual(generate_color_by_text('dog'), generate_color_by_text(u'dog'))
+
+    def test_loadLabelPalette(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(set_label_palette, {})
+        path = os.path.join(directory, 'label_colors.txt')
+        with open(path, 'w') as f:
+            f.write('# comment\n\ndog #ff8000\ntraffic light 0,128,255,120\nbad line\n')
+        hashed = generate_color_by_text('dog')
+        self.assertEqual(load_label_palette(path), 2)
+        self.assertEqual(generate_color_by_text('dog').getRgb(), (255, 128, 0, 100))
+        self.assertEqual(generate_color_by_text('traffic light').getRgb(), (0, 128, 255, 120))
+        set_label_palette({})
+        self.assertEqual(generate_color_by_text('dog'), hashed)
+
+
 if __name__ == '__main__':
     unittest.main()